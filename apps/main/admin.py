@@ -1,12 +1,18 @@
+from collections import defaultdict
+from typing import Optional
+
 from django.contrib import admin, messages
+from django.contrib.admin.utils import quote
+from django.contrib.contenttypes.models import ContentType
 from django.http import HttpResponseRedirect
-from django.urls import reverse
+from django.urls import NoReverseMatch, reverse
 from django.utils import timezone
 from django.utils.html import format_html
 
-from .consts import ContactStatus
+from .consts import BroadcastStatus, ContactStatus
 from .forms import (
     NotificationAdminForm,
+    NotificationBroadcastAdminForm,
     TermsAndConditionsAdminForm,
     PrivacyPolicyAdminForm,
     ContactAdminForm,
@@ -14,7 +20,9 @@ from .forms import (
     FAQForm,
 )
 from .models import (
+    ArchivedNotification,
     Notification,
+    NotificationBroadcast,
     TermsAndConditions,
     PrivacyPolicy,
     Contact,
@@ -22,11 +30,104 @@ from .models import (
     SocialMediaLink,
     FAQ,
     Report,
+    ReportSummary,
     MediaLibrary,
     Comment,
 )
 
 
+def prefetch_generic_objects(objs, name: str = "content_object") -> list:
+    """
+    Fetch the objects of a GenericForeignKey for many rows, with one query per content type.
+
+    Each object is cached on its row, so reading the GenericForeignKey runs no
+    query; rows whose object was deleted get None.
+
+    Args:
+        objs: The rows, e.g. the page of a changelist.
+        name: The name of the GenericForeignKey.
+
+    Returns:
+        list: The rows.
+    """
+    objs = list(objs)
+    if not objs:
+        return objs
+    field = objs[0]._meta.get_field(name)
+    ct_attname = objs[0]._meta.get_field(field.ct_field).get_attname()
+
+    ids_by_content_type = defaultdict(set)
+    for obj in objs:
+        ids_by_content_type[getattr(obj, ct_attname)].add(getattr(obj, field.fk_field))
+
+    targets = {}
+    for content_type_id, ids in ids_by_content_type.items():
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+        # The model of a stale content type no longer exists
+        if model is not None:
+            for pk, target in model._base_manager.in_bulk(ids).items():
+                targets[(content_type_id, str(pk))] = target
+
+    for obj in objs:
+        key = (getattr(obj, ct_attname), str(getattr(obj, field.fk_field)))
+        field.set_cached_value(obj, targets.get(key))
+    return objs
+
+
+def get_admin_change_url(obj) -> Optional[str]:
+    """
+    Return the URL of the admin change page of an object, or None if its model has none.
+    """
+    view_name = f"admin:{obj._meta.app_label}_{obj._meta.model_name}_change"
+    try:
+        return reverse(view_name, args=[quote(obj.pk)])
+    except NoReverseMatch:
+        return None
+
+
+class GenericObjectLinkMixin:
+    """
+    Admin mixin showing a link to the admin page of the object of a GenericForeignKey.
+
+    The objects of a changelist page are fetched together, with one query per
+    content type, and their links computed once, so a page costs the same
+    number of queries whatever its length.
+    """
+
+    generic_object_field = "content_object"
+
+    def get_changelist_instance(self, request):
+        changelist = super().get_changelist_instance(request)
+        for obj in prefetch_generic_objects(
+            changelist.result_list, self.generic_object_field
+        ):
+            obj.content_object_link_html = self.content_object_link(obj)
+        return changelist
+
+    def content_object_link(self, obj):
+        """
+        Returns an HTML link to the admin page for the content_object, if it exists.
+
+        Args:
+            obj: The instance with the GenericForeignKey.
+
+        Returns:
+            SafeString: An HTML string that represents a link to the content_object's admin page.
+        """
+        if hasattr(obj, "content_object_link_html"):
+            return obj.content_object_link_html
+        content_object = getattr(obj, self.generic_object_field)
+        if not content_object:
+            return "Object does not exist"
+
+        link_url = get_admin_change_url(content_object)
+        if link_url is None:
+            return str(content_object)
+        return format_html('<a href="{}">{}</a>', link_url, str(content_object))
+
+    content_object_link.short_description = "Object Link"
+
+
 @admin.register(PrivacyPolicy)
 class PrivacyPolicyAdmin(admin.ModelAdmin):
     """
@@ -71,6 +172,92 @@ class NotificationAdmin(admin.ModelAdmin):
     list_per_page = 25
 
 
+@admin.register(ArchivedNotification)
+class ArchivedNotificationAdmin(admin.ModelAdmin):
+    """
+    The Admin View for the ArchivedNotification Model. Archived notifications are read only.
+    """
+
+    list_display = ("user", "title", "is_read", "created_at", "archived_at")
+    list_filter = ("is_read", "created_at", "archived_at")
+    search_fields = ("user__username", "title")
+    list_per_page = 25
+
+    def has_add_permission(self, request) -> bool:
+        return False
+
+    def has_change_permission(self, request, obj=None) -> bool:
+        return False
+
+
+@admin.register(NotificationBroadcast)
+class NotificationBroadcastAdmin(admin.ModelAdmin):
+    """
+    The Admin View for the NotificationBroadcast Model.
+
+    Saving a new broadcast queues its delivery; the list shows its progress.
+    """
+
+    form = NotificationBroadcastAdminForm
+    list_display = ("title", "status", "delivery_progress", "created")
+    list_filter = ("status", "created")
+    search_fields = ("title",)
+    readonly_fields = (
+        "status",
+        "total",
+        "sent",
+        "last_user_id",
+        "started_at",
+        "finished_at",
+        "error",
+    )
+    actions = ["resume_broadcasts"]
+    list_per_page = 25
+
+    def delivery_progress(self, obj) -> str:
+        """
+        Display how many users were notified so far.
+        :param obj:
+        :return:
+        """
+        if obj.total is None:
+            return "-"
+        return f"{obj.sent} / {obj.total} ({obj.progress:.0%})"
+
+    delivery_progress.short_description = "Progress"
+
+    def get_readonly_fields(self, request, obj=None) -> tuple:
+        """
+        Make the content read-only once the broadcast exists, since it may already be delivered.
+        """
+        if obj:
+            return self.form.Meta.fields + list(self.readonly_fields)
+        return self.readonly_fields
+
+    def save_model(self, request, obj, form, change):
+        """
+        Queue the delivery of new broadcasts.
+        """
+        super().save_model(request, obj, form, change)
+        if not change:
+            obj.start()
+
+    def resume_broadcasts(self, request, queryset):
+        """
+        Queue the delivery of the selected broadcasts again, from where they stopped.
+        """
+        resumable = queryset.exclude(status=BroadcastStatus.COMPLETED.value)
+        for broadcast in resumable:
+            if broadcast.status == BroadcastStatus.FAILED.value:
+                broadcast.status = BroadcastStatus.RUNNING.value
+                broadcast.error = ""
+                broadcast.save(update_fields=["status", "error", "modified"])
+            broadcast.start()
+        self.message_user(request, f"{len(resumable)} broadcasts queued.")
+
+    resume_broadcasts.short_description = "Resume selected broadcasts"
+
+
 @admin.register(Contact)
 class ContactAdmin(admin.ModelAdmin):
     """
@@ -155,71 +342,73 @@ class FAQAdmin(admin.ModelAdmin):
 
 
 @admin.register(Report)
-class ReportAdmin(admin.ModelAdmin):
+class ReportAdmin(GenericObjectLinkMixin, admin.ModelAdmin):
     """
     The Admin View for the Report Model, including a link to the referenced object in the admin.
     """
 
     readonly_fields = ["content_object_link"]
     list_display = ["reporter", "content_object_link", "created_at"]
+    list_select_related = ["reporter"]
 
-    def content_object_link(self, obj):
+
+@admin.register(ReportSummary)
+class ReportSummaryAdmin(GenericObjectLinkMixin, admin.ModelAdmin):
+    """
+    The Admin View for the ReportSummary Model, listing the most reported objects first.
+
+    The summaries are kept by apps.main.reports, so they are read only.
+    """
+
+    list_display = [
+        "content_object_link",
+        "report_count",
+        "reporter_count",
+        "last_reported_at",
+        "reports_link",
+    ]
+    list_filter = ["content_type", "last_reported_at"]
+    ordering = ["-report_count"]
+    readonly_fields = list_display
+    fields = list_display
+    list_per_page = 50
+
+    def reports_link(self, obj):
         """
-        Returns an HTML link to the admin page for the content_object, if it exists.
+        Returns an HTML link to the reports of the summarized object.
 
         Args:
-            obj: The Report instance.
+            obj: The ReportSummary instance.
 
         Returns:
-            SafeString: An HTML string that represents a link to the content_object's admin page.
+            SafeString: A link to the Report changelist filtered on the object.
         """
-        content_object = obj.content_object
-        if not content_object:
-            return "Object does not exist"
+        url = reverse("admin:main_report_changelist")
+        return format_html(
+            '<a href="{}?content_type__id__exact={}&object_id={}">View reports</a>',
+            url,
+            obj.content_type_id,
+            obj.object_id,
+        )
 
-        # Get the admin URL for the content_object
-        app_label = content_object._meta.app_label
-        model_name = content_object._meta.model_name
-        view_name = f"admin:{app_label}_{model_name}_change"
-        link_url = reverse(view_name, args=[content_object.pk])
+    reports_link.short_description = "Reports"
 
-        return format_html('<a href="{}">{}</a>', link_url, str(content_object))
+    def has_add_permission(self, request) -> bool:
+        return False
 
-    content_object_link.short_description = "Object Link"
+    def has_change_permission(self, request, obj=None) -> bool:
+        return False
 
 
 @admin.register(Comment)
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(GenericObjectLinkMixin, admin.ModelAdmin):
     """
     The Admin view for the comment model
     """
 
     readonly_fields = ["content_object_link"]
     list_display = ["user", "content_object_link", "created"]
-
-    def content_object_link(self, obj):
-        """
-        Returns an HTML link to the admin page for the content_object, if it exists.
-
-        Args:
-            obj: The Comment instance.
-
-        Returns:
-            SafeString: An HTML string that represents a link to the content_object's admin page.
-        """
-        content_object = obj.content_object
-        if not content_object:
-            return "Object does not exist"
-
-        # Get the admin URL for the content_object
-        app_label = content_object._meta.app_label
-        model_name = content_object._meta.model_name
-        view_name = f"admin:{app_label}_{model_name}_change"
-        link_url = reverse(view_name, args=[content_object.pk])
-
-        return format_html('<a href="{}">{}</a>', link_url, str(content_object))
-
-    content_object_link.short_description = "Object Link"
+    list_select_related = ["user"]
 
 
 @admin.register(MediaLibrary)
@@ -8,3 +8,11 @@ class MainConfig(AppConfig):
 
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.main"
+
+    def ready(self):
+        """Connect the signal handlers and build the registry of reportable models"""
+        # pylint: disable=import-outside-toplevel,unused-import
+        from . import signals  # noqa: F401
+        from .reports import load_registry
+
+        load_registry()
@@ -0,0 +1,201 @@
+"""
+Delivery of notification broadcasts.
+
+A broadcast is delivered in chunks of users ordered by id. Each chunk is
+written in its own transaction, together with the broadcast's cursor
+(`last_user_id`) and progress, so a delivery that is interrupted resumes
+after the last committed chunk without notifying anyone twice. The broadcast
+row is locked for each chunk, so two workers delivering the same broadcast
+take turns instead of duplicating chunks.
+
+Notifications are created with bulk_create, or streamed with Postgres COPY
+when the audience reaches NOTIFICATION_BROADCAST_COPY_THRESHOLD users. The
+unread counters of each chunk's users are incremented with a single UPDATE.
+The notifications of users with an open notification stream are always
+created with bulk_create, whose rows carry their ids, and are published to
+the stream once the chunk commits.
+"""
+
+import io
+import logging
+from functools import partial
+from typing import List
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .consts import BroadcastStatus
+from .models import Notification, NotificationBroadcast
+from .notification_stream import (
+    notification_payload,
+    online_user_ids,
+    publish_notifications,
+)
+
+logger = logging.getLogger("celery")
+
+COPY_COLUMNS = (
+    "user_id",
+    "title",
+    "message",
+    "link",
+    "type",
+    "is_read",
+    "created_at",
+    "updated_at",
+)
+
+
+def copy_escape(value: str) -> str:
+    """
+    Escape a value for the text format of COPY.
+    """
+    return (
+        value.replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def copy_notifications(broadcast: NotificationBroadcast, user_ids: List[int]) -> None:
+    """
+    Create the notifications of a chunk of users with Postgres COPY.
+
+    Every row shares the same content, so it is escaped once and only the
+    user id changes from line to line.
+    """
+    now = timezone.now().isoformat()
+    suffix = "\t".join(
+        [
+            copy_escape(broadcast.title),
+            copy_escape(broadcast.message),
+            copy_escape(broadcast.link),
+            copy_escape(broadcast.type),
+            "f",
+            now,
+            now,
+        ]
+    )
+    data = io.StringIO("".join(f"{user_id}\t{suffix}\n" for user_id in user_ids))
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {Notification._meta.db_table} ({', '.join(COPY_COLUMNS)}) FROM STDIN",
+            data,
+        )
+
+
+def create_notifications(
+    broadcast: NotificationBroadcast, user_ids: List[int]
+) -> List[Notification]:
+    """
+    Create the notifications of a chunk of users with bulk_create.
+
+    :return: The created notifications, with their ids set.
+    """
+    return Notification.objects.bulk_create(
+        [
+            Notification(
+                user_id=user_id,
+                title=broadcast.title,
+                message=broadcast.message,
+                link=broadcast.link,
+                type=broadcast.type,
+            )
+            for user_id in user_ids
+        ]
+    )
+
+
+def deliver_chunk(broadcast_id: int, chunk_size: int, use_copy: bool) -> int:
+    """
+    Notify the next chunk of users of a broadcast and advance its cursor.
+
+    :return: The number of users notified, 0 when the broadcast is complete.
+    """
+    with transaction.atomic():
+        broadcast = NotificationBroadcast.objects.select_for_update().get(
+            pk=broadcast_id
+        )
+        if broadcast.status != BroadcastStatus.RUNNING.value:
+            return 0
+
+        user_ids = list(
+            broadcast.audience()
+            .filter(pk__gt=broadcast.last_user_id)
+            .values_list("pk", flat=True)[:chunk_size]
+        )
+        if not user_ids:
+            broadcast.status = BroadcastStatus.COMPLETED.value
+            broadcast.finished_at = timezone.now()
+            broadcast.save(update_fields=["status", "finished_at", "modified"])
+            return 0
+
+        # Only the notifications of online users are published, so only they
+        # need their ids back from the insert
+        online = set(online_user_ids(user_ids))
+        if use_copy:
+            copy_notifications(
+                broadcast, [user_id for user_id in user_ids if user_id not in online]
+            )
+            notifications = create_notifications(broadcast, sorted(online))
+        else:
+            notifications = create_notifications(broadcast, user_ids)
+        payloads = [
+            notification_payload(notification)
+            for notification in notifications
+            if notification.user_id in online
+        ]
+        if payloads:
+            transaction.on_commit(partial(publish_notifications, payloads))
+        get_user_model().objects.filter(pk__in=user_ids).update(
+            unread_notifications=F("unread_notifications") + 1
+        )
+
+        broadcast.last_user_id = user_ids[-1]
+        broadcast.sent += len(user_ids)
+        broadcast.save(update_fields=["last_user_id", "sent", "modified"])
+        return len(user_ids)
+
+
+def deliver_broadcast(broadcast_id: int) -> int:
+    """
+    Deliver a broadcast from where it stopped until every user is notified.
+
+    :return: The number of users notified by this call.
+    """
+    with transaction.atomic():
+        broadcast = NotificationBroadcast.objects.select_for_update().get(
+            pk=broadcast_id
+        )
+        if broadcast.status in (
+            BroadcastStatus.COMPLETED.value,
+            BroadcastStatus.FAILED.value,
+        ):
+            return 0
+        if broadcast.status == BroadcastStatus.PENDING.value:
+            broadcast.status = BroadcastStatus.RUNNING.value
+            broadcast.started_at = timezone.now()
+            broadcast.total = broadcast.audience().count()
+            broadcast.save(update_fields=["status", "started_at", "total", "modified"])
+
+    use_copy = broadcast.total >= settings.NOTIFICATION_BROADCAST_COPY_THRESHOLD
+    notified = 0
+    try:
+        while True:
+            count = deliver_chunk(
+                broadcast_id, settings.NOTIFICATION_BROADCAST_CHUNK_SIZE, use_copy
+            )
+            if not count:
+                break
+            notified += count
+            logger.info("Broadcast %s: notified %s users", broadcast_id, notified)
+    except Exception as e:
+        NotificationBroadcast.objects.filter(pk=broadcast_id).update(
+            status=BroadcastStatus.FAILED.value, error=str(e), modified=timezone.now()
+        )
+        raise
+    return notified
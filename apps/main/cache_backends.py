@@ -0,0 +1,406 @@
+"""
+A two-tier cache backend: a small LRU in the memory of each process in front of a shared cache.
+
+Reads are served from the local tier (L1) when possible and fall back to the
+shared tier (L2), usually Redis, whose hits are then kept locally for
+L1_TIMEOUT seconds, or less if the cache timeout is shorter. A value
+expiring from L2 may thus be served locally for up to L1_TIMEOUT seconds
+more. Writes go to both tiers.
+
+Without invalidation, another worker can serve a stale value from its L1 for
+up to L1_TIMEOUT seconds. When INVALIDATION_URL is set, every write also
+publishes the changed keys on a Redis channel, and a thread in each process
+evicts them from its L1 as the messages arrive. Keys that must never be read
+stale, such as version tokens and counters, are used through shared_cache().
+
+Configuration:
+
+    CACHES = {
+        "default": {
+            "BACKEND": "apps.main.cache_backends.TieredCache",
+            "LOCATION": "tiered",
+            "OPTIONS": {
+                "L2": "shared",
+                "L1_MAX_ENTRIES": 1000,
+                "L1_TIMEOUT": 5,
+                "INVALIDATION_URL": "redis://redis:6379/2",
+                "INVALIDATION_CHANNEL": "cache:invalidate",
+            },
+        },
+        "shared": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": "redis://redis:6379/2",
+        },
+    }
+"""
+
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional
+
+import redis
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait before resubscribing after the invalidation channel is lost
+RECONNECT_DELAY = 1
+
+# The local tiers of this process, by LOCATION, shared by its threads
+_stores: Dict[str, "LocalStore"] = {}
+_stores_lock = threading.Lock()
+
+# The sender id of each process that ran this module, by pid
+_senders: Dict[int, str] = {}
+
+
+@lru_cache(maxsize=None)
+def get_publisher(url: str) -> redis.Redis:
+    """
+    Return the Redis client invalidations are published with, shared by the whole process.
+    """
+    return redis.Redis.from_url(url)
+
+
+def process_sender() -> str:
+    """
+    Return the id of this process's invalidation messages.
+
+    A forked child gets its own, as it inherits the module of its parent.
+    """
+    pid = os.getpid()
+    sender = _senders.get(pid)
+    if sender is None:
+        sender = _senders.setdefault(pid, f"{pid}-{uuid.uuid4().hex}")
+    return sender
+
+
+def shared_cache() -> BaseCache:
+    """
+    Return the shared tier of the default cache, or the default cache itself if it has a single tier.
+    """
+    default = caches["default"]
+    return default.l2 if isinstance(default, TieredCache) else default
+
+
+class LocalStore:
+    """
+    An LRU of pickled values with expiry times, and the hit counters of both tiers.
+
+    Django creates a cache backend per thread, so the values are kept here,
+    shared by all the threads of the process.
+    """
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self.values = OrderedDict()
+        self.lock = threading.Lock()
+        self.counters = {"l1_hits": 0, "l1_misses": 0, "l2_hits": 0, "l2_misses": 0}
+        self.listener: Optional[InvalidationListener] = None
+        self.listener_pid: Optional[int] = None
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Return the pickled value of a key, or None if it is missing or expired.
+        """
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.values.move_to_end(key)
+                self.counters["l1_hits"] += 1
+                return entry[1]
+            if entry is not None:
+                del self.values[key]
+            self.counters["l1_misses"] += 1
+            return None
+
+    def set(self, key: str, pickled: bytes, expires_at: float) -> None:
+        with self.lock:
+            self.values[key] = (expires_at, pickled)
+            self.values.move_to_end(key)
+            while len(self.values) > self.max_entries:
+                self.values.popitem(last=False)
+
+    def delete(self, keys: Iterable[str]) -> None:
+        with self.lock:
+            for key in keys:
+                self.values.pop(key, None)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.values.clear()
+
+    def count(self, counter: str) -> None:
+        with self.lock:
+            self.counters[counter] += 1
+
+
+class InvalidationListener(threading.Thread):
+    """
+    Evict the keys published by the other processes from a local store.
+    """
+
+    def __init__(self, store: LocalStore, url: str, channel: str, sender: str):
+        super().__init__(name="cache-invalidation", daemon=True)
+        self.store = store
+        self.url = url
+        self.channel = channel
+        self.sender = sender
+
+    def run(self) -> None:
+        client = redis.Redis.from_url(self.url)
+        while True:
+            try:
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                # Messages may have been missed while unsubscribed
+                self.store.clear()
+                for message in pubsub.listen():
+                    self.handle(message["data"])
+            except redis.RedisError as e:
+                logger.warning("Cache invalidation channel lost: %s", e)
+                time.sleep(RECONNECT_DELAY)
+
+    def handle(self, data: bytes) -> None:
+        message = json.loads(data)
+        if message["sender"] == self.sender:
+            return
+        if message["keys"] is None:
+            self.store.clear()
+        else:
+            self.store.delete(message["keys"])
+
+
+class TieredCache(BaseCache):
+    """
+    A cache with a per-process LRU in front of a shared cache.
+
+    OPTIONS:
+        L2: The alias of the shared cache in CACHES.
+        L1_MAX_ENTRIES: The number of values kept in each process.
+        L1_TIMEOUT: The seconds a value is kept in each process.
+        INVALIDATION_URL: The Redis URL to publish changed keys on, or None.
+        INVALIDATION_CHANNEL: The Redis channel of the changed keys.
+    """
+
+    # Tells a value missing from L2 apart from a cached None
+    _MISSING = object()
+
+    def __init__(self, location: str, params: dict) -> None:
+        options = params.get("OPTIONS", {})
+        super().__init__(params)
+        self.l2_alias = options["L2"]
+        self.l1_timeout = options.get("L1_TIMEOUT", 5)
+        self.invalidation_url = options.get("INVALIDATION_URL")
+        self.invalidation_channel = options.get(
+            "INVALIDATION_CHANNEL", "cache:invalidate"
+        )
+        with _stores_lock:
+            self.store = _stores.setdefault(
+                location, LocalStore(options.get("L1_MAX_ENTRIES", 1000))
+            )
+
+    @property
+    def sender(self) -> str:
+        # Identifies the messages of this process, which has already updated its own L1
+        return process_sender()
+
+    @property
+    def l2(self) -> BaseCache:
+        return caches[self.l2_alias]
+
+    def _local_key(self, key: str, version: Optional[int]) -> str:
+        return self.make_and_validate_key(key, version=version)
+
+    def _l1_expiry(self, timeout) -> Optional[float]:
+        """
+        Return when a value stored with `timeout` leaves the local tier, or None if it is not kept.
+        """
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is not None and timeout <= 0:
+            return None
+        l1_timeout = (
+            self.l1_timeout if timeout is None else min(timeout, self.l1_timeout)
+        )
+        return time.monotonic() + l1_timeout
+
+    def _l2_timeout(self, timeout):
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    def _keep(self, key: str, value: Any, timeout=DEFAULT_TIMEOUT) -> None:
+        expires_at = self._l1_expiry(timeout)
+        if expires_at is not None:
+            self.store.set(
+                key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires_at
+            )
+
+    def _ensure_listener(self) -> None:
+        """
+        Start listening for the keys changed by other processes, once per process.
+        """
+        if not self.invalidation_url or self.store.listener_pid == os.getpid():
+            return
+        with _stores_lock:
+            # Threads do not survive a fork, so a forked worker starts its own
+            if self.store.listener_pid != os.getpid():
+                self.store.listener = InvalidationListener(
+                    self.store,
+                    self.invalidation_url,
+                    self.invalidation_channel,
+                    self.sender,
+                )
+                self.store.listener.start()
+                self.store.listener_pid = os.getpid()
+
+    def _publish(self, keys: Optional[List[str]]) -> None:
+        """
+        Tell the other processes to evict keys from their local tier, or all of them if keys is None.
+        """
+        if not self.invalidation_url:
+            return
+        message = json.dumps({"sender": self.sender, "keys": keys})
+        try:
+            get_publisher(self.invalidation_url).publish(
+                self.invalidation_channel, message
+            )
+        except redis.RedisError as e:
+            logger.warning("Could not publish cache invalidation: %s", e)
+
+    def get(self, key, default=None, version=None):
+        self._ensure_listener()
+        local_key = self._local_key(key, version)
+        pickled = self.store.get(local_key)
+        if pickled is not None:
+            return pickle.loads(pickled)
+
+        value = self.l2.get(key, self._MISSING, version=version)
+        if value is self._MISSING:
+            self.store.count("l2_misses")
+            return default
+        self.store.count("l2_hits")
+        self._keep(local_key, value)
+        return value
+
+    def get_many(self, keys, version=None):
+        self._ensure_listener()
+        found = {}
+        missing = []
+        for key in keys:
+            pickled = self.store.get(self._local_key(key, version))
+            if pickled is None:
+                missing.append(key)
+            else:
+                found[key] = pickle.loads(pickled)
+        if missing:
+            from_l2 = self.l2.get_many(missing, version=version)
+            for key in missing:
+                if key in from_l2:
+                    self.store.count("l2_hits")
+                    self._keep(self._local_key(key, version), from_l2[key])
+                else:
+                    self.store.count("l2_misses")
+            found.update(from_l2)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._ensure_listener()
+        self.l2.set(key, value, self._l2_timeout(timeout), version=version)
+        local_key = self._local_key(key, version)
+        self.store.delete([local_key])
+        self._keep(local_key, value, timeout)
+        self._publish([local_key])
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._ensure_listener()
+        added = self.l2.add(key, value, self._l2_timeout(timeout), version=version)
+        if added:
+            local_key = self._local_key(key, version)
+            self._keep(local_key, value, timeout)
+            self._publish([local_key])
+        return added
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        self._ensure_listener()
+        failed = self.l2.set_many(data, self._l2_timeout(timeout), version=version)
+        local_keys = [self._local_key(key, version) for key in data]
+        self.store.delete(local_keys)
+        for key, value in data.items():
+            if key not in failed:
+                self._keep(self._local_key(key, version), value, timeout)
+        self._publish(local_keys)
+        return failed
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        touched = self.l2.touch(key, self._l2_timeout(timeout), version=version)
+        # The local copy may outlive the new timeout, so it is read again from L2
+        local_key = self._local_key(key, version)
+        self.store.delete([local_key])
+        self._publish([local_key])
+        return touched
+
+    def delete(self, key, version=None):
+        deleted = self.l2.delete(key, version=version)
+        local_key = self._local_key(key, version)
+        self.store.delete([local_key])
+        self._publish([local_key])
+        return deleted
+
+    def delete_many(self, keys, version=None):
+        self.l2.delete_many(keys, version=version)
+        local_keys = [self._local_key(key, version) for key in keys]
+        self.store.delete(local_keys)
+        self._publish(local_keys)
+
+    def has_key(self, key, version=None):
+        if self.store.get(self._local_key(key, version)) is not None:
+            return True
+        return self.l2.has_key(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        # Counters change too often to be worth keeping locally
+        value = self.l2.incr(key, delta, version=version)
+        local_key = self._local_key(key, version)
+        self.store.delete([local_key])
+        self._publish([local_key])
+        return value
+
+    def clear(self):
+        self.l2.clear()
+        self.store.clear()
+        self._publish(None)
+
+    def close(self, **kwargs):
+        self.l2.close(**kwargs)
+
+    def stats(self) -> dict:
+        """
+        Return the hits, misses and hit rate of each tier in this process.
+
+        L2 is only read on an L1 miss, so its rates are of those misses.
+        """
+        with self.store.lock:
+            counters = dict(self.store.counters)
+            size = len(self.store.values)
+        stats = {"l1_size": size}
+        for tier in ("l1", "l2"):
+            hits, misses = counters[f"{tier}_hits"], counters[f"{tier}_misses"]
+            stats[tier] = {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            }
+        return stats
+
+    def reset_stats(self) -> None:
+        with self.store.lock:
+            for counter in self.store.counters:
+                self.store.counters[counter] = 0
@@ -44,5 +44,26 @@ class ContactType(Enum):
         return [(key.value, key.value) for key in cls]
 
 
+class BroadcastStatus(Enum):
+    """
+    Enum representing the delivery statuses of notification broadcasts.
+    """
+
+    PENDING = "Pending"
+    RUNNING = "Running"
+    COMPLETED = "Completed"
+    FAILED = "Failed"
+
+    @classmethod
+    def choices(cls) -> list:
+        """
+        Return choices for model field.
+
+        Returns:
+            A list of tuple containing the enum's items.
+        """
+        return [(key.value, key.value) for key in cls]
+
+
 # Classes for attaching to fields in any form that uses our normal styles
 FORM_CLASSES = "shadow appearance-none border rounded w-full py-2 px-3 text-gray-700 leading-tight focus:outline-none focus:shadow-outline"
@@ -1,21 +1,48 @@
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+
 from .forms import ReportForm
+from .models import Notification
 
 
 def report_form(request):
     """
     Adds the report form to the context of each template.
 
+    The form is only built when a template uses it, which only the pages
+    with a report_button tag do.
+
     Args:
         request: The HttpRequest object.
 
     Returns:
-        dict: A dictionary with the report form instance.
+        dict: A dictionary with the lazy report form instance.
     """
-    return {"report_form": ReportForm()}
+    return {"report_form": SimpleLazyObject(ReportForm)}
 
 
 def notifications(request):
-    """A context processor that provides the user's notifications to all templates."""
+    """
+    A context processor that provides the user's notifications to all templates.
+
+    The unread count is a column of the user row, which is already loaded,
+    so the badge costs no query. The latest unread notifications are a lazy
+    queryset that is only evaluated if a template uses it; the dropdown loads
+    them separately, on first open.
+
+    Args:
+        request: The HttpRequest object.
+
+    Returns:
+        dict: The unread notification count, the latest unread notifications and
+        whether the live notification stream is offered.
+    """
     if request.user.is_authenticated:
-        return {"notifications": request.user.notifications.filter(is_read=False)}
+        return {
+            "unread_notification_count": request.user.unread_notifications,
+            "notification_stream_enabled": settings.NOTIFICATION_STREAM_ENABLED,
+            "notifications": Notification.objects.filter(user=request.user)
+            .unread()
+            .for_dropdown()[: settings.NOTIFICATION_DROPDOWN_LIMIT],
+        }
     return {}
@@ -9,6 +9,7 @@ from django_recaptcha.widgets import ReCaptchaV2Invisible
 from .consts import ContactType, ContactStatus, FORM_CLASSES
 from .models import (
     Notification,
+    NotificationBroadcast,
     TermsAndConditions,
     PrivacyPolicy,
     Contact,
@@ -32,6 +33,21 @@ class NotificationAdminForm(forms.ModelForm):
         }
 
 
+class NotificationBroadcastAdminForm(forms.ModelForm):
+    """
+    The form for the NotificationBroadcast Model specifically in the admin.
+    """
+
+    link = forms.URLField(assume_scheme="https")
+
+    class Meta:
+        model = NotificationBroadcast
+        fields = ["title", "message", "link", "type", "group", "user_filter"]
+        widgets = {
+            "message": CKEditorWidget(),
+        }
+
+
 class TermsAndConditionsAdminForm(forms.ModelForm):
     """The form for the TermsAndConditions Model specifically in the admin."""
 
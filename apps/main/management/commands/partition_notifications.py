@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db import connection, transaction
+
+from apps.main.partitions import partition_notifications, unpartition_notifications
+
+
+class Command(BaseCommand):
+    """
+    A management command to partition the notifications table by month, or to undo it.
+
+    The table is copied while holding a lock on it, so run it in a
+    maintenance window. See apps.main.partitions.
+    """
+
+    help = "Partition the notifications table by month of created_at."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months-ahead",
+            type=int,
+            default=settings.NOTIFICATION_PARTITIONS_AHEAD,
+            help="Number of future months to create partitions for.",
+        )
+        parser.add_argument(
+            "--undo",
+            action="store_true",
+            help="Turn the partitioned table back into a plain table.",
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options["undo"]:
+                changed = unpartition_notifications(connection)
+                message = "The notifications table is no longer partitioned."
+            else:
+                changed = partition_notifications(connection, options["months_ahead"])
+                message = "The notifications table is partitioned by month."
+
+        if changed:
+            self.stdout.write(self.style.SUCCESS(message))
+        else:
+            self.stdout.write("Nothing to do.")
@@ -0,0 +1,57 @@
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from apps.main.models import Notification
+
+
+class Command(BaseCommand):
+    """
+    A management command to fix drift between the users' unread notification counters and their notifications.
+
+    Users are processed in chunks of consecutive ids, each reconciled with a
+    single UPDATE that only rewrites counters that are wrong.
+    """
+
+    help = (
+        "Recount the unread notifications of every user and fix counters that drifted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Number of user ids reconciled per UPDATE.",
+        )
+
+    def handle(self, *args, **options):
+        user_model = get_user_model()
+        chunk_size = options["chunk_size"]
+        unread = Coalesce(
+            Subquery(
+                Notification.objects.filter(user=OuterRef("pk"), is_read=False)
+                .order_by()
+                .values("user")
+                .annotate(count=Count("pk"))
+                .values("count")
+            ),
+            0,
+        )
+
+        ids = user_model.objects.order_by("pk").values_list("pk", flat=True)
+        start, last_id = ids.first(), ids.last()
+        fixed = 0
+        while start is not None and start <= last_id:
+            end = start + chunk_size
+            fixed += (
+                user_model.objects.filter(pk__gte=start, pk__lt=end)
+                .exclude(unread_notifications=unread)
+                .update(unread_notifications=unread)
+            )
+            start = end
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Fixed {fixed} unread notification counters.")
+        )
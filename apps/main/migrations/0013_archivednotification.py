@@ -0,0 +1,80 @@
+# Generated by Django 5.0.14 on 2026-10-16 20:57
+
+import auto_prefetch
+import django.db.models.deletion
+import django.db.models.manager
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0012_notificationbroadcast"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedNotification",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("notification_id", models.BigIntegerField()),
+                ("title", models.CharField(max_length=255)),
+                ("message", models.TextField()),
+                ("link", models.URLField()),
+                (
+                    "type",
+                    models.CharField(
+                        choices=[
+                            ("info", "Info"),
+                            ("warning", "Warning"),
+                            ("danger", "Danger"),
+                            ("success", "Success"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("is_read", models.BooleanField()),
+                ("created_at", models.DateTimeField()),
+                (
+                    "archived_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+            ],
+            options={
+                "abstract": False,
+                "base_manager_name": "prefetch_manager",
+            },
+            managers=[
+                ("objects", django.db.models.manager.Manager()),
+                ("prefetch_manager", django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                condition=models.Q(("is_read", True)),
+                fields=["created_at"],
+                name="notification_read_created_idx",
+            ),
+        ),
+        migrations.AddField(
+            model_name="archivednotification",
+            name="user",
+            field=auto_prefetch.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="archived_notifications",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+    ]
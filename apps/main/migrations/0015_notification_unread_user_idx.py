@@ -0,0 +1,24 @@
+# Generated by Django 5.0.14 on 2026-10-16 20:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0013_archivednotification"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                models.F("user"),
+                models.OrderBy(models.F("created_at"), descending=True),
+                condition=models.Q(("is_read", False)),
+                name="notification_unread_user_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.0.14 on 2026-10-16 21:11
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+# Strips the tags and entities of the CKEditor HTML before indexing its words
+STRIP_HTML = "regexp_replace(coalesce({}, ''), '<[^>]*>|&[#a-zA-Z0-9]+;', ' ', 'g')"
+
+# Hardcodes FAQ.SEARCH_CONFIG as it was when this migration was written
+CREATE_TRIGGER = f"""
+CREATE FUNCTION main_faq_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', {STRIP_HTML.format("NEW.question")}), 'A')
+        || setweight(to_tsvector('english', {STRIP_HTML.format("NEW.answer")}), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER main_faq_search_vector
+BEFORE INSERT OR UPDATE OF question, answer ON main_faq
+FOR EACH ROW EXECUTE FUNCTION main_faq_search_vector();
+
+UPDATE main_faq SET question = question;
+"""
+
+DROP_TRIGGER = """
+DROP TRIGGER main_faq_search_vector ON main_faq;
+DROP FUNCTION main_faq_search_vector();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0015_notification_unread_user_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="faq",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="faq",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="faq_search_vector_idx"
+            ),
+        ),
+        migrations.RunSQL(CREATE_TRIGGER, DROP_TRIGGER),
+    ]
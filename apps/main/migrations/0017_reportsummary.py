@@ -0,0 +1,73 @@
+# Generated by Django 5.0.14 on 2026-10-16 21:17
+
+import auto_prefetch
+import django.db.models.deletion
+import django.db.models.manager
+from django.db import migrations, models
+
+# Summarizes the reports made before the table existed
+BACKFILL = """
+INSERT INTO main_reportsummary
+    (content_type_id, object_id, report_count, reporter_count, last_reported_at)
+SELECT content_type_id, object_id, count(*), count(DISTINCT reporter_id), max(created_at)
+FROM main_report
+GROUP BY content_type_id, object_id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("main", "0016_faq_search_vector"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReportSummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("object_id", models.PositiveIntegerField()),
+                ("report_count", models.PositiveIntegerField(default=0)),
+                ("reporter_count", models.PositiveIntegerField(default=0)),
+                ("last_reported_at", models.DateTimeField()),
+                (
+                    "content_type",
+                    auto_prefetch.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="contenttypes.contenttype",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "Report summaries",
+                "abstract": False,
+                "base_manager_name": "prefetch_manager",
+                "indexes": [
+                    models.Index(
+                        models.OrderBy(models.F("report_count"), descending=True),
+                        name="report_summary_count_idx",
+                    )
+                ],
+            },
+            managers=[
+                ("objects", django.db.models.manager.Manager()),
+                ("prefetch_manager", django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="reportsummary",
+            constraint=models.UniqueConstraint(
+                fields=("content_type", "object_id"), name="report_summary_object_uniq"
+            ),
+        ),
+        migrations.RunSQL(BACKFILL, migrations.RunSQL.noop),
+    ]
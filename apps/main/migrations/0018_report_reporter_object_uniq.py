@@ -0,0 +1,80 @@
+# Generated by Django 5.0.14 on 2026-10-16 21:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+# The reporters whose duplicate reports are deleted per statement
+CHUNK_SIZE = 1000
+
+# Keeps the latest report of each reporter and object, with the latest reason
+DELETE_DUPLICATES = """
+DELETE FROM main_report WHERE id IN (
+    SELECT id FROM (
+        SELECT id, row_number() OVER (
+            PARTITION BY reporter_id, content_type_id, object_id
+            ORDER BY created_at DESC, id DESC
+        ) AS position
+        FROM main_report
+        WHERE reporter_id >= %s AND reporter_id < %s
+    ) AS reports
+    WHERE position > 1
+)
+"""
+
+# The deleted duplicates were counted in the summaries. Each reporter now has one
+# report per object, so both counts are the number of reports.
+RECOUNT_SUMMARIES = """
+UPDATE main_reportsummary AS summary
+SET report_count = counts.report_count, reporter_count = counts.report_count
+FROM (
+    SELECT content_type_id, object_id, count(*) AS report_count
+    FROM main_report
+    GROUP BY content_type_id, object_id
+) AS counts
+WHERE summary.content_type_id = counts.content_type_id
+    AND summary.object_id = counts.object_id
+    AND (
+        summary.report_count <> counts.report_count
+        OR summary.reporter_count <> counts.report_count
+    )
+"""
+
+
+def delete_duplicates(apps, schema_editor):
+    """
+    Delete the duplicate reports in chunks of reporters, each committed on its own.
+
+    Reports duplicated while this runs make adding the constraint fail; the
+    migration can then be run again.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT min(reporter_id), max(reporter_id) FROM main_report")
+        first, last = cursor.fetchone()
+        if first is None:
+            return
+        for start in range(first, last + 1, CHUNK_SIZE):
+            cursor.execute(DELETE_DUPLICATES, [start, start + CHUNK_SIZE])
+        cursor.execute(RECOUNT_SUMMARIES)
+
+
+class Migration(migrations.Migration):
+
+    # Each chunk is committed as it is done, rather than locking every report at once
+    atomic = False
+
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("main", "0017_reportsummary"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="report",
+            constraint=models.UniqueConstraint(
+                fields=("reporter", "content_type", "object_id"),
+                name="report_reporter_object_uniq",
+            ),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.0.14 on 2026-10-16 21:40
+
+import django.contrib.postgres.fields
+from django.conf import settings
+from django.db import migrations, models
+
+# Records the actions whose threshold the summaries already reached as queued
+MARK_FIRED = """
+UPDATE main_reportsummary
+SET fired_actions = array_append(fired_actions, %s)
+WHERE reporter_count >= %s
+"""
+
+
+def mark_fired_actions(apps, schema_editor):
+    """
+    Keep the actions queued before they were recorded from being queued again.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        for action, threshold in settings.REPORT_MODERATION_THRESHOLDS.items():
+            cursor.execute(MARK_FIRED, [action, threshold])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0018_report_reporter_object_uniq"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="reportsummary",
+            name="fired_actions",
+            field=django.contrib.postgres.fields.ArrayField(
+                base_field=models.CharField(max_length=50),
+                blank=True,
+                default=list,
+                editable=False,
+                size=None,
+            ),
+        ),
+        migrations.RunPython(mark_fired_actions, migrations.RunPython.noop),
+    ]
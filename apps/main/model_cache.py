@@ -0,0 +1,165 @@
+"""
+A cache for values computed from rarely changing models.
+
+Each registered model has a version token in the cache, replaced by its
+post_save and post_delete signals. Cached values are stored under keys that
+contain the versions of the models they were computed from, so a change to
+any of them makes the old keys unreachable: values can be cached without
+expiry and edits are still visible on the next request. Unreachable keys
+are left for the cache to evict.
+
+Values read often can also be kept in the memory of each process. Versions
+are still read from the shared cache, so edits are seen as quickly, but the
+value itself is not fetched and unpickled again.
+
+Bulk changes that send no signals, such as QuerySet.update(), must call
+invalidate() themselves.
+
+fragment_version() and user_fragment_version() turn these versions into
+versions of rendered pages, for {% cache %} fragments and ETags.
+"""
+
+import hashlib
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Iterable
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save
+from django.middleware.csrf import get_token
+
+VERSION_KEY = "model_cache:version:{}"
+VALUE_KEY = "model_cache:{}:{}"
+# The number of values each process keeps in memory; the least recently used go first
+LOCAL_MAX_SIZE = 128
+
+_local_values = OrderedDict()
+_local_lock = threading.Lock()
+# Tells a missing value apart from a cached None
+_MISSING = object()
+
+
+def get_version(model) -> str:
+    """
+    Return the version token of a model, creating one if the cache has none.
+    """
+    key = VERSION_KEY.format(model._meta.label_lower)
+    version = cache.get(key)
+    if version is None:
+        # Another worker may create it first, so read back whichever won
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(model) -> None:
+    """
+    Replace the version token of a model, making every value computed from it unreachable.
+    """
+    cache.set(VERSION_KEY.format(model._meta.label_lower), uuid.uuid4().hex, None)
+
+
+def invalidate(model) -> None:
+    """
+    Invalidate the cached values computed from a model.
+
+    The version is replaced right away and again once the current transaction
+    commits, so a value computed by another worker before the change was
+    visible is not kept.
+    """
+    bump_version(model)
+    transaction.on_commit(lambda: bump_version(model))
+
+
+def get_or_set(
+    name: str,
+    depends_on: Iterable[type[models.Model]],
+    compute: Callable[[], Any],
+    local: bool = False,
+    timeout=DEFAULT_TIMEOUT,
+) -> Any:
+    """
+    Return a cached value, computing and caching it on a miss.
+
+    :param name: The name of the value.
+    :param depends_on: The registered models the value is computed from.
+    :param compute: Computes the value. Querysets must be evaluated, e.g. with list().
+    :param local: Also keep the value in the memory of this process.
+    :param timeout: The seconds the value is cached, MODEL_CACHE_TIMEOUT by default.
+        Values with an unbounded number of names need a finite timeout.
+    :return: The value.
+    """
+    if timeout is DEFAULT_TIMEOUT:
+        timeout = settings.MODEL_CACHE_TIMEOUT
+    versions = ":".join(get_version(model) for model in depends_on)
+    key = VALUE_KEY.format(name, versions)
+    if not local:
+        return cache.get_or_set(key, compute, timeout)
+
+    with _local_lock:
+        value = _local_values.get(key, _MISSING)
+        if value is not _MISSING:
+            _local_values.move_to_end(key)
+            return value
+    value = cache.get_or_set(key, compute, timeout)
+    with _local_lock:
+        _local_values[key] = value
+        while len(_local_values) > LOCAL_MAX_SIZE:
+            _local_values.popitem(last=False)
+    return value
+
+
+def _invalidate_on_change(sender, **kwargs) -> None:
+    invalidate(sender)
+
+
+def register(model: type[models.Model]) -> type[models.Model]:
+    """
+    Invalidate the values computed from a model whenever one of its instances is saved or deleted.
+
+    Can be used as a class decorator.
+    """
+    dispatch_uid = f"model_cache:{model._meta.label_lower}"
+    post_save.connect(_invalidate_on_change, sender=model, dispatch_uid=dispatch_uid)
+    post_delete.connect(_invalidate_on_change, sender=model, dispatch_uid=dispatch_uid)
+    return model
+
+
+def fragment_version(*model_labels: str) -> str:
+    """
+    Return a version of a page fragment that changes on deploy and when the given models change.
+
+    :param model_labels: The "app_label.ModelName" labels of the registered models the fragment displays.
+    :return: SITE_VERSION followed by the version of each model.
+    """
+    versions = [get_version(apps.get_model(label)) for label in model_labels]
+    return ":".join([settings.SITE_VERSION, *versions])
+
+
+def user_fragment_version(request) -> str:
+    """
+    Return a version of a page fragment that changes with what it displays of the user.
+
+    The CSRF secret is part of it, so a cached {% csrf_token %} stays valid
+    for the user; it is hashed to keep it out of the cache keys. The secret is
+    created here when the request has none, so the CSRF cookie is still set
+    when the fragment comes from the cache.
+
+    :return: "anonymous", or the user's id, unread count and a digest of the rest.
+    """
+    user = request.user
+    if not user.is_authenticated:
+        return "anonymous"
+    get_token(request)
+    digest = hashlib.blake2b(
+        "\x1f".join(
+            [user.username, user.avatar_url, request.META["CSRF_COOKIE"]]
+        ).encode(),
+        digest_size=8,
+    ).hexdigest()
+    return f"{user.pk}:{user.unread_notifications}:{digest}"
@@ -1,16 +1,29 @@
 import os
+from collections import Counter
+from datetime import timedelta
+from typing import Dict
 
 import auto_prefetch
 
 from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import FieldError, ValidationError
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
-from django.db import models
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVectorField
+from django.db import models, transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Greatest, Left
 from django.urls import reverse
+from django.utils import timezone
 from auditlog.registry import auditlog
 from model_utils.models import TimeStampedModel
 
-from apps.main.consts import ContactStatus
+from apps.main.consts import BroadcastStatus, ContactStatus
 
 
 class TermsAndConditions(models.Model):
@@ -116,13 +129,45 @@ class SocialMediaLink(models.Model):
         return f"{self.platform_name} link"
 
 
+class FAQQuerySet(models.QuerySet):
+    """
+    A custom queryset for the FAQ model.
+    """
+
+    def search(self, text: str):
+        """
+        Return the FAQs matching a web search style query, best ranked first.
+
+        :param text: The search, e.g. `password -email` or `"two factor"`.
+        :return: The FAQs annotated with their `rank`.
+        """
+        query = SearchQuery(text, search_type="websearch", config=FAQ.SEARCH_CONFIG)
+        return (
+            self.filter(search_vector=query)
+            .annotate(rank=SearchRank(F("search_vector"), query))
+            .order_by("-rank", "pk")
+        )
+
+
 class FAQ(models.Model):
     """
     Model for the FAQ
+
+    `search_vector` holds the words of the question and answer, without their
+    HTML, and is kept current by the main_faq_search_vector trigger of
+    migration main.0016.
     """
 
+    # The text search configuration queries use. It must match the one the trigger
+    # of migration main.0016 hardcodes, so changing it needs a new migration
+    # that recreates the trigger and recomputes search_vector
+    SEARCH_CONFIG = "english"
+
     question = models.TextField()
     answer = models.TextField()
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = FAQQuerySet.as_manager()
 
     def __str__(self):
         return self.question
@@ -130,6 +175,7 @@ class FAQ(models.Model):
     class Meta:
         verbose_name = "FAQ"
         verbose_name_plural = "FAQs"
+        indexes = [GinIndex(fields=["search_vector"], name="faq_search_vector_idx")]
 
 
 class Report(auto_prefetch.Model):
@@ -143,6 +189,9 @@ class Report(auto_prefetch.Model):
         reporter (ForeignKey): The user who created the report.
         reason (TextField): The reason for the report.
         created_at (DateTimeField): The datetime when the report was created.
+
+    A user has one report per object; apps.main.reports.submit_report updates
+    its reason and date when they report the object again.
     """
 
     content_type = auto_prefetch.ForeignKey(ContentType, on_delete=models.CASCADE)
@@ -154,6 +203,172 @@ class Report(auto_prefetch.Model):
     reason = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta(auto_prefetch.Model.Meta):
+        constraints = [
+            models.UniqueConstraint(
+                fields=["reporter", "content_type", "object_id"],
+                name="report_reporter_object_uniq",
+            )
+        ]
+
+
+class ReportSummary(auto_prefetch.Model):
+    """
+    The reports of one object, kept current by apps.main.reports as reports are created and deleted.
+
+    Attributes:
+        content_type (ContentType): The type of the reported object.
+        object_id (int): The primary key of the reported object.
+        content_object (GenericForeignKey): The reported object.
+        report_count (int): The number of reports of the object.
+        reporter_count (int): The number of users who reported the object.
+        last_reported_at (DateTimeField): When the object was last reported.
+        fired_actions (list): The moderation actions already queued for the object.
+    """
+
+    content_type = auto_prefetch.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    content_object = GenericForeignKey("content_type", "object_id")
+    report_count = models.PositiveIntegerField(default=0)
+    reporter_count = models.PositiveIntegerField(default=0)
+    last_reported_at = models.DateTimeField()
+    fired_actions = ArrayField(
+        models.CharField(max_length=50), default=list, blank=True, editable=False
+    )
+
+    def __str__(self):
+        return (
+            f"{self.report_count} reports of {self.content_type.model} {self.object_id}"
+        )
+
+    class Meta(auto_prefetch.Model.Meta):
+        verbose_name_plural = "Report summaries"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["content_type", "object_id"], name="report_summary_object_uniq"
+            )
+        ]
+        indexes = [
+            models.Index(
+                models.OrderBy(F("report_count"), descending=True),
+                name="report_summary_count_idx",
+            )
+        ]
+
+
+class NotificationQuerySet(auto_prefetch.QuerySet):
+    """
+    A custom queryset for the Notification model.
+    """
+
+    def unread(self):
+        """
+        Filter the notifications that have not been read.
+        :return:
+        """
+        return self.filter(is_read=False)
+
+    def retained(self):
+        """
+        Leave out the notifications past NOTIFICATION_UNREAD_RETENTION_DAYS, which are about to be purged.
+
+        The lower bound on created_at also lets Postgres skip the old
+        partitions when the table is partitioned.
+        :return:
+        """
+        days = settings.NOTIFICATION_UNREAD_RETENTION_DAYS
+        if not days:
+            return self
+        return self.filter(created_at__gte=timezone.now() - timedelta(days=days))
+
+    def mark_as_read(self) -> int:
+        """
+        Mark the unread notifications of the queryset as read with a single UPDATE.
+
+        The rows are locked first so concurrent calls do not count the same
+        notification twice, then the unread counters of their users are
+        adjusted. Like QuerySet.update(), this does not send signals.
+
+        :return: The number of notifications marked as read.
+        """
+        with transaction.atomic():
+            unread = list(
+                self.filter(is_read=False)
+                .select_for_update()
+                .values_list("pk", "user_id")
+            )
+            if not unread:
+                return 0
+            self.model.objects.filter(pk__in=[pk for pk, _ in unread]).update(
+                is_read=True, updated_at=timezone.now()
+            )
+            self.model.objects.adjust_unread_counts(
+                Counter(user_id for _, user_id in unread), sign=-1
+            )
+        return len(unread)
+
+    def for_dropdown(self):
+        """
+        Load only what the notifications dropdown shows, newest first.
+
+        The message body is replaced by a short `preview` so long messages are
+        never read in full.
+        :return:
+        """
+        return (
+            self.retained()
+            .only("id", "user_id", "title", "link", "type", "created_at")
+            .annotate(preview=Left("message", 200))
+            .order_by("-created_at")
+        )
+
+
+class NotificationManager(models.Manager.from_queryset(NotificationQuerySet)):
+    """
+    A custom manager for the Notification model.
+    """
+
+    def unread_count(self, user_id) -> int:
+        """
+        Get a user's unread notification count from their counter column.
+        :param user_id:
+        :return:
+        """
+        count = (
+            get_user_model()
+            .objects.filter(pk=user_id)
+            .values_list("unread_notifications", flat=True)
+            .first()
+        )
+        return count or 0
+
+    def adjust_unread_count(self, user_id, delta: int) -> None:
+        """
+        Atomically add delta to a user's unread notification counter, never going below zero.
+        :param user_id:
+        :param delta:
+        :return:
+        """
+        self.adjust_unread_counts({user_id: delta})
+
+    def adjust_unread_counts(self, deltas: Dict[int, int], sign: int = 1) -> None:
+        """
+        Atomically adjust the unread notification counters of several users with one UPDATE.
+        :param deltas: The amount to add per user id.
+        :param sign: Multiplies every delta, e.g. -1 to subtract counts.
+        :return:
+        """
+        deltas = {user_id: delta * sign for user_id, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        delta = Case(
+            *[When(pk=user_id, then=Value(delta)) for user_id, delta in deltas.items()],
+            default=Value(0),
+        )
+        get_user_model().objects.filter(pk__in=deltas).update(
+            unread_notifications=Greatest(F("unread_notifications") + delta, 0)
+        )
+
 
 class Notification(auto_prefetch.Model):
     """
@@ -187,6 +402,36 @@ class Notification(auto_prefetch.Model):
     ]
     type = models.CharField(max_length=10, choices=TYPES, default="info")
 
+    objects = NotificationManager()
+
+    class Meta(auto_prefetch.Model.Meta):
+        # Most notifications are read, and pages only ever list the unread ones
+        # of one user newest first. Partial indexes keep the read rows out of
+        # the index that serves those queries.
+        indexes = [
+            # Lists a user's unread notifications newest first, for the dropdown
+            models.Index(
+                "user",
+                models.F("created_at").desc(),
+                condition=models.Q(is_read=False),
+                name="notification_unread_user_idx",
+            ),
+            # Finds the read notifications past their retention period
+            models.Index(
+                fields=["created_at"],
+                condition=models.Q(is_read=True),
+                name="notification_read_created_idx",
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored read state so saves can adjust the user's unread counter
+        if "is_read" in field_names:
+            instance._loaded_is_read = instance.is_read
+        return instance
+
     def get_absolute_url(self) -> str:
         """
         Get the URL that allows users to mark the notification as read
@@ -203,15 +448,134 @@ class Notification(auto_prefetch.Model):
 
     def mark_as_read(self) -> None:
         """
-        Mark the notification as read.
+        Mark the notification as read, saving only the fields that change.
         """
+        if self.is_read:
+            return
         self.is_read = True
-        self.save()
+        self.save(update_fields=["is_read", "updated_at"])
 
     def __str__(self) -> str:
         return self.title
 
 
+class ArchivedNotification(auto_prefetch.Model):
+    """
+    A notification moved out of the notifications table by the retention policy.
+
+    Attributes:
+        notification_id (int): The id the notification had.
+        user (User): The user to whom the notification belonged.
+        title, message, link, type, is_read: As on the notification.
+        created_at (DateTimeField): The time the notification was created.
+        archived_at (DateTimeField): The time the notification was archived.
+    """
+
+    notification_id = models.BigIntegerField()
+    user = auto_prefetch.ForeignKey(
+        "users.User", on_delete=models.CASCADE, related_name="archived_notifications"
+    )
+    title = models.CharField(max_length=255)
+    message = models.TextField()
+    link = models.URLField()
+    type = models.CharField(max_length=10, choices=Notification.TYPES)
+    is_read = models.BooleanField()
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self) -> str:
+        return self.title
+
+
+class NotificationBroadcast(TimeStampedModel, models.Model):
+    """
+    A notification sent to every user of an audience.
+
+    The audience is the active users, narrowed down to a group and/or by
+    `user_filter`, a dict of queryset lookups such as {"date_joined__year": 2024}.
+    Notifications are created in chunks of users ordered by id by the
+    send_notification_broadcast task; `last_user_id` records how far delivery
+    got, so an interrupted broadcast resumes where it stopped.
+
+    Attributes:
+        title, message, link, type: The content of the notifications.
+        group (Group): Only send to the members of this group.
+        user_filter (dict): Only send to the users matching these lookups.
+        status (str): Pending, Running, Completed or Failed.
+        total (int): The size of the audience when delivery started.
+        sent (int): The number of notifications created so far.
+        last_user_id (int): The id of the last user notified.
+        error (str): Why delivery failed.
+    """
+
+    title = models.CharField(max_length=255)
+    message = models.TextField()
+    link = models.URLField()
+    type = models.CharField(max_length=10, choices=Notification.TYPES, default="info")
+    group = models.ForeignKey(Group, on_delete=models.SET_NULL, null=True, blank=True)
+    user_filter = models.JSONField(default=dict, blank=True)
+    status = models.CharField(
+        max_length=15,
+        choices=BroadcastStatus.choices(),
+        default=BroadcastStatus.PENDING.value,
+    )
+    total = models.PositiveIntegerField(null=True, blank=True)
+    sent = models.PositiveIntegerField(default=0)
+    last_user_id = models.BigIntegerField(default=0)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        verbose_name = "Notification Broadcast"
+        verbose_name_plural = "Notification Broadcasts"
+        ordering = ["-created"]
+
+    def __str__(self) -> str:
+        return self.title
+
+    def clean(self):
+        """
+        Check that the user filter is a dict of valid lookups.
+        """
+        if not isinstance(self.user_filter, dict):
+            raise ValidationError({"user_filter": "The user filter must be an object."})
+        try:
+            str(self.audience().query)
+        except (FieldError, TypeError, ValueError) as e:
+            raise ValidationError({"user_filter": str(e)}) from e
+
+    def audience(self):
+        """
+        Get the users to notify, ordered by id.
+        :return: A queryset of users.
+        """
+        users = get_user_model().objects.filter(is_active=True, **self.user_filter)
+        if self.group_id:
+            users = users.filter(groups=self.group_id)
+        return users.order_by("pk")
+
+    @property
+    def progress(self) -> float:
+        """
+        The share of the audience notified so far, between 0 and 1.
+        """
+        if not self.total:
+            return 1.0 if self.status == BroadcastStatus.COMPLETED.value else 0.0
+        return min(self.sent / self.total, 1.0)
+
+    def start(self) -> None:
+        """
+        Queue the delivery of the broadcast once the current transaction commits.
+        """
+        # Imported here because the tasks module imports the models
+        from .tasks import (  # pylint: disable=import-outside-toplevel
+            send_notification_broadcast,
+        )
+
+        transaction.on_commit(lambda: send_notification_broadcast.delay(self.pk))
+
+
 class MediaLibrary(TimeStampedModel, models.Model):
     """
     MediaLibrary model to store images associated with any other model.
@@ -0,0 +1,289 @@
+"""
+Live delivery of new notifications over Server-Sent Events.
+
+New notifications are published, once committed, to a Redis pub/sub channel
+per user. The notification_stream view keeps an SSE connection open for each
+browser tab and forwards what is published on its user's channel.
+
+Each process holds a single Redis subscription, shared by all of its open
+streams through a NotificationHub: a stream only costs a small queue, so one
+ASGI worker can keep thousands of idle connections. The hub also records the
+online users in a Redis sorted set, scored by when they stop counting as
+online, so broadcasts only publish to users who can receive them. Each hub
+refreshes its users periodically, so the users of a process that died expire
+on their own.
+
+Under WSGI a stream would hold a worker thread forever without sending
+anything, so streams are only offered when NOTIFICATION_STREAM_ENABLED is set
+and the request is served by ASGI.
+"""
+
+import asyncio
+import json
+import logging
+import time
+import weakref
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Dict, Iterable, List, Set
+
+import redis
+import redis.asyncio
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.utils.dateparse import parse_datetime
+
+from apps.main.redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = "notifications:user:"
+ONLINE_KEY = "notifications:online-users"
+
+
+def user_channel(user_id) -> str:
+    """
+    Get the pub/sub channel of a user's notifications.
+    """
+    return f"{CHANNEL_PREFIX}{user_id}"
+
+
+def notification_payload(notification) -> dict:
+    """
+    Serialize what the notifications dropdown shows of a notification.
+
+    Uses the `preview` annotation of for_dropdown() when present, so the full
+    message is not loaded.
+    """
+    preview = getattr(notification, "preview", None)
+    if preview is None:
+        preview = notification.message[:200]
+    return {
+        "id": notification.pk,
+        "user_id": notification.user_id,
+        "title": notification.title,
+        "type": notification.type,
+        "preview": preview,
+        "get_absolute_url": notification.get_absolute_url(),
+        "created_at": notification.created_at.isoformat(),
+    }
+
+
+def publish_notifications(payloads: Iterable[dict]) -> None:
+    """
+    Publish notifications to the channels of their users.
+
+    Live delivery is best effort: if Redis is unavailable the notifications
+    are still shown on the next page load.
+    """
+    try:
+        pipeline = get_redis_client().pipeline(transaction=False)
+        for payload in payloads:
+            pipeline.publish(user_channel(payload["user_id"]), json.dumps(payload))
+        pipeline.execute()
+    except redis.RedisError as e:
+        logger.warning("Could not publish notifications: %s", e)
+
+
+def online_user_ids(user_ids: List[int]) -> List[int]:
+    """
+    Filter the users that have a notification stream open.
+    """
+    if not user_ids:
+        return []
+    try:
+        expiries = get_redis_client().zmscore(ONLINE_KEY, user_ids)
+    except redis.RedisError as e:
+        logger.warning("Could not read online users: %s", e)
+        return []
+    now = time.time()
+    return [
+        user_id
+        for user_id, expiry in zip(user_ids, expiries)
+        if expiry is not None and expiry > now
+    ]
+
+
+class NotificationHub:
+    """
+    Share one Redis subscription between every notification stream of the process.
+
+    A user's channel is subscribed while at least one of their streams is
+    open, and each message is copied to the queue of every such stream. When
+    the subscription fails, the hub subscribes again to the channels of every
+    listening user.
+    """
+
+    # Messages kept for a stream that does not keep up; later ones are dropped
+    QUEUE_SIZE = 100
+    # Seconds between refreshes of the process's online users, and seconds a
+    # refresh keeps them online
+    HEARTBEAT_INTERVAL = 30
+    ONLINE_TTL = 90
+    # Seconds to wait before subscribing again after a Redis error
+    RETRY_DELAY = 1
+
+    def __init__(self):
+        self._listeners: Dict[int, Set[asyncio.Queue]] = defaultdict(set)
+        self._client = None
+        self._pubsub = None
+        self._reader = None
+        self._stale = False
+        self._heartbeat_at = 0.0
+
+    @asynccontextmanager
+    async def listen(self, user_id: int):
+        """
+        Receive the notifications published for a user while the context is open.
+
+        :return: A queue of the raw messages.
+        """
+        queue = asyncio.Queue(maxsize=self.QUEUE_SIZE)
+        first = not self._listeners[user_id]
+        self._listeners[user_id].add(queue)
+        try:
+            if first:
+                await self._subscribe(user_id)
+            yield queue
+        finally:
+            self._listeners[user_id].discard(queue)
+            if not self._listeners[user_id]:
+                del self._listeners[user_id]
+                await self._unsubscribe(user_id)
+
+    async def _subscribe(self, user_id: int) -> None:
+        if self._pubsub is None:
+            self._client = redis.asyncio.Redis.from_url(settings.REDIS_URL)
+            self._pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        if not self._stale:
+            try:
+                await self._pubsub.subscribe(user_channel(user_id))
+                await self._mark_online([user_id])
+            except redis.RedisError as e:
+                # The reader subscribes again, this user included
+                logger.warning("Could not subscribe to notifications: %s", e)
+                self._stale = True
+        if self._reader is None or self._reader.done():
+            self._reader = asyncio.create_task(self._read())
+
+    async def _unsubscribe(self, user_id: int) -> None:
+        # The user stays in the online set until their last refresh expires
+        try:
+            await self._pubsub.unsubscribe(user_channel(user_id))
+        except redis.RedisError as e:
+            logger.warning("Could not unsubscribe from notifications: %s", e)
+            self._stale = True
+
+    async def _mark_online(self, user_ids: List[int]) -> None:
+        """
+        Keep users in the online set for ONLINE_TTL seconds, and drop the expired ones.
+        """
+        now = time.time()
+        async with self._client.pipeline(transaction=False) as pipeline:
+            pipeline.zadd(
+                ONLINE_KEY, {user_id: now + self.ONLINE_TTL for user_id in user_ids}
+            )
+            pipeline.zremrangebyscore(ONLINE_KEY, "-inf", now)
+            await pipeline.execute()
+
+    async def _resubscribe(self) -> None:
+        """
+        Replace the subscription with a new one to the channels of every listening user.
+        """
+        try:
+            await self._pubsub.reset()
+        except redis.RedisError:
+            pass
+        self._pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        await self._pubsub.subscribe(
+            *(user_channel(user_id) for user_id in self._listeners)
+        )
+        self._stale = False
+        self._heartbeat_at = 0.0
+
+    async def _read(self) -> None:
+        """
+        Dispatch published messages to the queues of the listening streams.
+
+        Also refreshes the online users every HEARTBEAT_INTERVAL seconds.
+        """
+        while self._listeners:
+            try:
+                if self._stale:
+                    await self._resubscribe()
+                if time.monotonic() >= self._heartbeat_at:
+                    await self._mark_online(list(self._listeners))
+                    self._heartbeat_at = time.monotonic() + self.HEARTBEAT_INTERVAL
+                message = await self._pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=1.0
+                )
+            except redis.RedisError as e:
+                logger.warning("Notification subscription failed, retrying: %s", e)
+                self._stale = True
+                await asyncio.sleep(self.RETRY_DELAY)
+                continue
+            if message is None:
+                continue
+            user_id = int(message["channel"].decode().removeprefix(CHANNEL_PREFIX))
+            for queue in self._listeners.get(user_id, ()):
+                if not queue.full():
+                    queue.put_nowait(message["data"])
+
+
+_hubs = weakref.WeakKeyDictionary()
+
+
+def get_notification_hub() -> NotificationHub:
+    """
+    Return the hub of the running event loop, creating it on first use.
+    """
+    loop = asyncio.get_running_loop()
+    if loop not in _hubs:
+        _hubs[loop] = NotificationHub()
+    return _hubs[loop]
+
+
+def format_event(event: str, data: str) -> str:
+    """
+    Format a Server-Sent Event, with one data line per line of the data.
+    """
+    lines = "".join(f"data: {line}\n" for line in data.splitlines())
+    return f"event: {event}\n{lines}\n"
+
+
+async def stream_notifications(user_id: int, unread_count: int, hub: NotificationHub):
+    """
+    Yield Server-Sent Events for the notifications published to a user.
+
+    Every notification is sent as a rendered dropdown item ("notification")
+    followed by the updated badge ("unread-count"). A comment is sent when
+    nothing happened for NOTIFICATION_STREAM_KEEPALIVE seconds so proxies keep
+    the connection open.
+    """
+    async with hub.listen(user_id) as queue:
+        while True:
+            try:
+                data = await asyncio.wait_for(
+                    queue.get(), timeout=settings.NOTIFICATION_STREAM_KEEPALIVE
+                )
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+
+            notification = json.loads(data)
+            notification["created_at"] = parse_datetime(notification["created_at"])
+            unread_count += 1
+            yield format_event(
+                "notification",
+                render_to_string(
+                    "components/notification_item.html",
+                    {"notification": notification},
+                ),
+            )
+            yield format_event(
+                "unread-count",
+                render_to_string(
+                    "components/notifications_badge.html",
+                    {"unread_notification_count": unread_count},
+                ),
+            )
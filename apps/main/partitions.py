@@ -0,0 +1,209 @@
+"""
+Optional monthly partitioning of the notifications table.
+
+The partition_notifications management command turns the notifications
+table into a table partitioned by range of created_at, with one partition per
+month (main_notification_y2024m05) and a default partition for rows outside
+every month created, and turns it back into a plain table with --undo.
+Queries with a lower bound on created_at, such as the dropdown's, only scan
+the partitions of the months they cover, and past partitions emptied by the
+retention policy are dropped instead of vacuumed.
+
+Postgres requires the primary key of a partitioned table to contain the
+partition key, so the primary key becomes (id, created_at). Ids stay unique
+as they all come from the same sequence. The migrations still describe the
+plain table, so undo the partitioning before migrating the primary key of
+Notification.
+"""
+
+import re
+from datetime import date
+from typing import Callable, List, Tuple
+
+from django.utils import timezone
+
+TABLE = "main_notification"
+DEFAULT_PARTITION = f"{TABLE}_default"
+PARTITION_NAME = re.compile(rf"^{TABLE}_y(\d{{4}})m(\d{{2}})$")
+
+
+def add_months(month: date, months: int) -> date:
+    """
+    Return the first day of the month `months` after the month of a date.
+    """
+    index = month.month - 1 + months
+    return date(month.year + index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    """
+    Get the name of the partition of a month.
+    """
+    return f"{TABLE}_y{month.year}m{month.month:02d}"
+
+
+def is_partitioned(connection) -> bool:
+    """
+    Check if the notifications table is partitioned.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [TABLE]
+        )
+        row = cursor.fetchone()
+    return row is not None and row[0] == "p"
+
+
+def create_partitions(cursor, first: date, last: date) -> List[str]:
+    """
+    Create the missing monthly partitions from the month of `first` to the month of `last`.
+
+    :return: The names of the partitions created.
+    """
+    created = []
+    month = first.replace(day=1)
+    while month <= last:
+        name = partition_name(month)
+        cursor.execute("SELECT to_regclass(%s)", [name])
+        if cursor.fetchone()[0] is None:
+            cursor.execute(
+                f"CREATE TABLE {name} PARTITION OF {TABLE} FOR VALUES FROM (%s) TO (%s)",
+                [month, add_months(month, 1)],
+            )
+            created.append(name)
+        month = add_months(month, 1)
+    return created
+
+
+def rebuild_table(
+    cursor, create_table: Callable[[str], None], primary_key: str
+) -> None:
+    """
+    Replace the notifications table by a new table with the same rows, ids, indexes and foreign keys.
+
+    :param create_table: Creates the new table, given the name the old one was renamed to.
+    :param primary_key: The columns of the primary key of the new table.
+    """
+    old_table = f"{TABLE}_old"
+    cursor.execute(
+        "SELECT indexdef FROM pg_indexes WHERE tablename = %s AND indexname <> %s",
+        [TABLE, f"{TABLE}_pkey"],
+    )
+    # The indexes of a partitioned table are defined ON ONLY the partitioned table
+    indexes = [row[0].replace(" ON ONLY ", " ON ") for row in cursor.fetchall()]
+    cursor.execute(
+        "SELECT pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = %s::regclass AND contype = 'f'",
+        [TABLE],
+    )
+    foreign_keys = [row[0] for row in cursor.fetchall()]
+
+    cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {old_table}")
+    create_table(old_table)
+    # A serial id copies the default of the old sequence, which is replaced below
+    cursor.execute(f"ALTER TABLE {TABLE} ALTER COLUMN id DROP DEFAULT")
+    cursor.execute(f"INSERT INTO {TABLE} SELECT * FROM {old_table}")
+    # Dropping the old table also drops its partitions and its id sequence
+    cursor.execute(f"DROP TABLE {old_table}")
+
+    cursor.execute(f"CREATE SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id")
+    cursor.execute(
+        f"SELECT setval('{TABLE}_id_seq', coalesce(max(id), 0) + 1, false) FROM {TABLE}"
+    )
+    cursor.execute(
+        f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{TABLE}_id_seq')"
+    )
+    cursor.execute(f"ALTER TABLE {TABLE} ADD PRIMARY KEY ({primary_key})")
+    for definition in foreign_keys:
+        cursor.execute(f"ALTER TABLE {TABLE} ADD {definition}")
+    for definition in indexes:
+        cursor.execute(definition)
+
+
+def partition_notifications(connection, months_ahead: int) -> bool:
+    """
+    Rebuild the notifications table as a table partitioned by month of created_at.
+
+    The rows are copied to the new table within the current transaction,
+    which locks the notifications table until it commits.
+
+    :param months_ahead: The number of future months to create partitions for.
+    :return: False if the table was already partitioned, True otherwise.
+    """
+    if is_partitioned(connection):
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT min(created_at) FROM {TABLE}")
+        oldest = cursor.fetchone()[0] or timezone.now()
+
+        def create_table(old_table):
+            cursor.execute(
+                f"CREATE TABLE {TABLE} (LIKE {old_table} INCLUDING DEFAULTS) "
+                "PARTITION BY RANGE (created_at)"
+            )
+            cursor.execute(
+                f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT"
+            )
+            today = timezone.now().date()
+            create_partitions(cursor, oldest.date(), add_months(today, months_ahead))
+
+        rebuild_table(cursor, create_table, "id, created_at")
+    return True
+
+
+def unpartition_notifications(connection) -> bool:
+    """
+    Rebuild the partitioned notifications table as the plain table the migrations describe.
+
+    Like partition_notifications, this locks the notifications table until
+    the current transaction commits.
+
+    :return: False if the table was not partitioned, True otherwise.
+    """
+    if not is_partitioned(connection):
+        return False
+    with connection.cursor() as cursor:
+
+        def create_table(old_table):
+            cursor.execute(
+                f"CREATE TABLE {TABLE} (LIKE {old_table} INCLUDING DEFAULTS)"
+            )
+
+        rebuild_table(cursor, create_table, "id")
+    return True
+
+
+def maintain_partitions(connection, months_ahead: int) -> Tuple[List[str], List[str]]:
+    """
+    Create the partitions of the coming months and drop the empty partitions of past months.
+
+    Does nothing if the table is not partitioned.
+
+    :param months_ahead: The number of future months to keep partitions for.
+    :return: The names of the partitions created and dropped.
+    """
+    if not is_partitioned(connection):
+        return [], []
+    this_month = timezone.now().date().replace(day=1)
+    dropped = []
+    with connection.cursor() as cursor:
+        created = create_partitions(
+            cursor, this_month, add_months(this_month, months_ahead)
+        )
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = %s::regclass",
+            [TABLE],
+        )
+        for (name,) in cursor.fetchall():
+            match = PARTITION_NAME.match(name)
+            if not match:
+                continue
+            month = date(int(match[1]), int(match[2]), 1)
+            if month >= this_month:
+                continue
+            cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {name})")
+            if not cursor.fetchone()[0]:
+                cursor.execute(f"DROP TABLE {name}")
+                dropped.append(name)
+    return created, dropped
@@ -0,0 +1,201 @@
+"""
+Token bucket rate limits for write endpoints.
+
+A view opts in with the rate_limit decorator, naming its limit in the
+RATELIMITS setting:
+
+    RATELIMITS = {"report": {"rate": "10/m", "burst": 5, "methods": ["POST"]}}
+
+Each client IP, and each signed in user, gets a bucket of `burst` tokens
+refilled at `rate`; a request takes one token. RateLimitMiddleware checks
+the buckets before the view runs, outside the transaction of the request.
+The IP bucket is checked first, so a request it rejects costs a Redis round
+trip and never touches the database. Only then is the user id read from the
+session, which the view would read anyway, without loading the user. A
+signed in user is thus limited across IP addresses and sessions. Requests
+whose IP is unknown share a single "unknown" IP bucket.
+
+The buckets live in Redis and are updated atomically by a Lua script. With
+RATELIMIT_STORAGE set to "local", or while Redis is unreachable, each
+process keeps its own buckets instead.
+"""
+
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional, Tuple
+
+import redis
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.http import HttpResponse
+from ipware import get_client_ip
+
+from .redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+KEY = "ratelimit:{}:{}:{}"
+PERIODS = {"s": 1, "m": 60, "h": 60 * 60, "d": 24 * 60 * 60}
+# The number of buckets each process keeps when it cannot use Redis
+LOCAL_MAX_BUCKETS = 10_000
+
+# Takes a token from the bucket KEYS[1], refilled at ARGV[1] tokens per second up
+# to ARGV[2] tokens. Returns whether a token was taken and, if not, the seconds
+# until one is available. The Redis clock is used so every worker agrees on it.
+TOKEN_BUCKET = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local clock = redis.call("TIME")
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call("HMGET", KEYS[1], "tokens", "updated")
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call("HSET", KEYS[1], "tokens", tokens, "updated", now)
+redis.call("EXPIRE", KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(retry_after)}
+"""
+
+_local_buckets = OrderedDict()
+_local_lock = threading.Lock()
+
+
+def parse_rate(rate: str) -> float:
+    """
+    Return the tokens per second of a rate like "10/m".
+    """
+    count, period = rate.split("/")
+    return int(count) / PERIODS[period[0]]
+
+
+def take_local_token(key: str, rate: float, capacity: int) -> Tuple[bool, float]:
+    """
+    Take a token from a bucket kept by this process.
+
+    :return: Whether a token was taken, and the seconds until one is available.
+    """
+    now = time.monotonic()
+    with _local_lock:
+        tokens, updated = _local_buckets.pop(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * rate)
+        allowed = tokens >= 1
+        retry_after = 0.0 if allowed else (1 - tokens) / rate
+        _local_buckets[key] = (tokens - 1 if allowed else tokens, now)
+        while len(_local_buckets) > LOCAL_MAX_BUCKETS:
+            _local_buckets.popitem(last=False)
+    return allowed, retry_after
+
+
+def reset_local_buckets() -> None:
+    """
+    Forget the buckets kept by this process.
+    """
+    with _local_lock:
+        _local_buckets.clear()
+
+
+@lru_cache(maxsize=None)
+def get_token_bucket_script():
+    """
+    Return the token bucket script, registered once per process.
+    """
+    return get_redis_client().register_script(TOKEN_BUCKET)
+
+
+def take_token(key: str, rate: float, capacity: int) -> Tuple[bool, float]:
+    """
+    Take a token from a bucket in Redis, or in this process if Redis is not used or unreachable.
+
+    :return: Whether a token was taken, and the seconds until one is available.
+    """
+    if settings.RATELIMIT_STORAGE == "local":
+        return take_local_token(key, rate, capacity)
+    try:
+        allowed, retry_after = get_token_bucket_script()(
+            keys=[key], args=[rate, capacity]
+        )
+    except redis.RedisError as e:
+        logger.warning("Rate limiting in process, Redis failed: %s", e)
+        return take_local_token(key, rate, capacity)
+    return bool(allowed), float(retry_after)
+
+
+def rate_limit(name: str):
+    """
+    Limit a view, function or class based, with the limit `name` of the RATELIMITS setting.
+
+    The limit is enforced by RateLimitMiddleware.
+    """
+
+    def decorator(view):
+        view.rate_limit = name
+        return view
+
+    return decorator
+
+
+def get_view_rate_limit(view) -> Optional[str]:
+    """
+    Return the name of the limit of a view, looking through the function as_view() returns.
+    """
+    view_class = getattr(view, "view_class", None)
+    return getattr(view, "rate_limit", None) or getattr(view_class, "rate_limit", None)
+
+
+def too_many_requests(retry_after: float) -> HttpResponse:
+    response = HttpResponse("Too many requests, try again later.", status=429)
+    response["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+class RateLimitMiddleware:
+    """
+    Reject the requests of clients over the limit of the view, with a 429 and a Retry-After header.
+
+    Rejected requests are marked with `request.rate_limited`, so other
+    middleware can skip their own database work.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        name = get_view_rate_limit(view_func)
+        if name is None:
+            return None
+        limit = settings.RATELIMITS[name]
+        if request.method not in limit.get("methods", ["POST"]):
+            return None
+        rate = parse_rate(limit["rate"])
+        capacity = limit.get("burst", 1)
+
+        client_ip, _ = get_client_ip(request)
+        allowed, retry_after = take_token(
+            KEY.format(name, "ip", client_ip or "unknown"), rate, capacity
+        )
+        if allowed:
+            user_id = request.session.get(SESSION_KEY)
+            if user_id is None:
+                return None
+            allowed, retry_after = take_token(
+                KEY.format(name, "user", user_id), rate, capacity
+            )
+            if allowed:
+                return None
+        request.rate_limited = True
+        return too_many_requests(retry_after)
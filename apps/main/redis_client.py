@@ -0,0 +1,14 @@
+from functools import lru_cache
+
+import redis
+from django.conf import settings
+
+
+@lru_cache(maxsize=None)
+def get_redis_client() -> redis.Redis:
+    """
+    Return a Redis client for application data, shared by the whole process.
+
+    The client keeps its own connection pool, so it is safe to share between threads.
+    """
+    return redis.Redis.from_url(settings.REDIS_URL)
@@ -0,0 +1,330 @@
+"""
+The models users can report, and the summaries of their reports.
+
+The models are listed in the REPORTABLE_MODELS setting and looked up by
+"app_label.model", so the report view neither queries ContentType by name
+nor fails when two apps have a model of the same name. A bare model name,
+as older report links use, also works while no other reportable model
+shares it.
+
+A user has one report per object: reporting it again through
+submit_report() updates the reason and date of that report. Each reported
+object has a ReportSummary, upserted as its reports are created, so the
+most reported objects are read from an index rather than counted over every
+report. When the number of users who reported an object reaches a threshold
+of REPORT_MODERATION_THRESHOLDS, the moderation action of that name is
+queued, once: the summary records the actions it queued.
+
+Deleted reports are counted again once their transaction commits, all
+together, so deleting a prolific reporter costs two statements rather than
+two per report.
+"""
+
+import threading
+from collections import Counter
+from functools import partial
+from types import MappingProxyType
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, models, transaction
+from django.db.models import Value
+from django.db.models.functions import Greatest
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Notification, Report, ReportSummary
+
+
+class ReportableModel(NamedTuple):
+    """
+    A model users can report.
+    """
+
+    model: type[models.Model]
+
+    @property
+    def content_type_id(self) -> int:
+        """
+        The id of the model's ContentType, read from the ContentType cache after the first use.
+
+        It is not read when the registry is built, since the app is ready
+        before the database may be.
+        """
+        return ContentType.objects.get_for_model(self.model).pk
+
+
+_registry: Mapping[str, ReportableModel] = MappingProxyType({})
+
+
+def build_registry() -> Mapping[str, ReportableModel]:
+    """
+    Return the read-only registry of REPORTABLE_MODELS, by label and unambiguous model name.
+    """
+    entries = {}
+    for label in settings.REPORTABLE_MODELS:
+        model = apps.get_model(label)
+        entries[model._meta.label_lower] = ReportableModel(model)
+
+    names = Counter(entry.model._meta.model_name for entry in entries.values())
+    for entry in list(entries.values()):
+        if names[entry.model._meta.model_name] == 1:
+            entries[entry.model._meta.model_name] = entry
+    return MappingProxyType(entries)
+
+
+def load_registry() -> None:
+    """
+    Build the registry of reportable models. Called when the app is ready.
+    """
+    global _registry  # pylint: disable=global-statement
+    _registry = build_registry()
+
+
+def get_reportable_model(name: str) -> Optional[ReportableModel]:
+    """
+    Return the reportable model of a label like "main.comment", or None if it cannot be reported.
+    """
+    return _registry.get(name.lower())
+
+
+# Creates the report of a reporter on an object, or updates the reason and date of
+# their existing one. xmax is 0 for inserted rows.
+SUBMIT_REPORT = """
+INSERT INTO main_report (content_type_id, object_id, reporter_id, reason, created_at)
+VALUES (
+    %(content_type_id)s, %(object_id)s, %(reporter_id)s, %(reason)s, %(created_at)s
+)
+ON CONFLICT (reporter_id, content_type_id, object_id) DO UPDATE SET
+    reason = EXCLUDED.reason,
+    created_at = EXCLUDED.created_at
+RETURNING id, xmax = 0
+"""
+
+# Counts a new report, whose reporter had not reported the object before, in the
+# summary of its object.
+UPSERT_SUMMARY = """
+INSERT INTO main_reportsummary (
+    content_type_id, object_id, report_count, reporter_count, last_reported_at,
+    fired_actions
+)
+VALUES (%(content_type_id)s, %(object_id)s, 1, 1, %(reported_at)s, '{}')
+ON CONFLICT (content_type_id, object_id) DO UPDATE SET
+    report_count = main_reportsummary.report_count + 1,
+    reporter_count = main_reportsummary.reporter_count + 1,
+    last_reported_at = GREATEST(
+        main_reportsummary.last_reported_at, EXCLUDED.last_reported_at
+    )
+RETURNING id, reporter_count, fired_actions
+"""
+
+# Counts the reports of the given objects again.
+REFRESH_SUMMARIES = """
+UPDATE main_reportsummary AS summary
+SET report_count = counts.report_count,
+    reporter_count = counts.reporter_count,
+    last_reported_at = counts.last_reported_at
+FROM (
+    SELECT content_type_id, object_id, count(*) AS report_count,
+        count(DISTINCT reporter_id) AS reporter_count,
+        max(created_at) AS last_reported_at
+    FROM main_report
+    WHERE (content_type_id, object_id) IN (
+        SELECT * FROM unnest(%(content_type_ids)s::integer[], %(object_ids)s::integer[])
+    )
+    GROUP BY content_type_id, object_id
+) AS counts
+WHERE summary.content_type_id = counts.content_type_id
+    AND summary.object_id = counts.object_id
+"""
+
+# Drops the summaries of the given objects that have no report left.
+DELETE_EMPTY_SUMMARIES = """
+DELETE FROM main_reportsummary AS summary
+USING unnest(%(content_type_ids)s::integer[], %(object_ids)s::integer[])
+    AS objects (content_type_id, object_id)
+WHERE summary.content_type_id = objects.content_type_id
+    AND summary.object_id = objects.object_id
+    AND NOT EXISTS (
+        SELECT 1 FROM main_report AS report
+        WHERE report.content_type_id = objects.content_type_id
+            AND report.object_id = objects.object_id
+    )
+"""
+
+MODERATION_ACTIONS: Dict[str, Callable[[ReportSummary], None]] = {}
+
+
+def moderation_action(name: str) -> Callable:
+    """
+    Register a function of a ReportSummary as the moderation action `name` of REPORT_MODERATION_THRESHOLDS.
+    """
+
+    def register(function: Callable[[ReportSummary], None]) -> Callable:
+        MODERATION_ACTIONS[name] = function
+        return function
+
+    return register
+
+
+def crossed_thresholds(
+    reporter_count: int, fired_actions: Iterable[str] = ()
+) -> List[str]:
+    """
+    Return the moderation actions whose threshold `reporter_count` reached, except those already queued.
+
+    The count can drop when reports are deleted, so an action is only queued
+    once per object by leaving out the summary's `fired_actions`.
+    """
+    return [
+        action
+        for action, threshold in settings.REPORT_MODERATION_THRESHOLDS.items()
+        if reporter_count >= threshold and action not in fired_actions
+    ]
+
+
+def submit_report(
+    content_type_id: int, object_id: int, reporter_id: int, reason: str
+) -> Tuple[Report, bool]:
+    """
+    Report an object, or update the reason and date of the reporter's report of it.
+
+    :return: The report, and whether it is new.
+    """
+    report = Report(
+        content_type_id=content_type_id,
+        object_id=object_id,
+        reporter_id=reporter_id,
+        reason=reason,
+        created_at=timezone.now(),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            SUBMIT_REPORT,
+            {
+                "content_type_id": content_type_id,
+                "object_id": object_id,
+                "reporter_id": reporter_id,
+                "reason": reason,
+                "created_at": report.created_at,
+            },
+        )
+        report.pk, created = cursor.fetchone()
+
+    if created:
+        record_report(report)
+    else:
+        ReportSummary.objects.filter(
+            content_type_id=content_type_id, object_id=object_id
+        ).update(
+            last_reported_at=Greatest("last_reported_at", Value(report.created_at))
+        )
+    return report, created
+
+
+def record_report(report: Report) -> None:
+    """
+    Count a new report in the summary of its object, and queue the moderation actions it triggers.
+    """
+    # Imported here because the tasks module imports this one
+    from .tasks import run_moderation_action  # pylint: disable=import-outside-toplevel
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            UPSERT_SUMMARY,
+            {
+                "content_type_id": report.content_type_id,
+                "object_id": report.object_id,
+                "reported_at": report.created_at,
+            },
+        )
+        summary_id, reporter_count, fired_actions = cursor.fetchone()
+
+    actions = crossed_thresholds(reporter_count, fired_actions)
+    if not actions:
+        return
+    # The upsert locked the summary until the transaction ends, so no other
+    # report of the object can queue the same actions meanwhile
+    ReportSummary.objects.filter(pk=summary_id).update(
+        fired_actions=[*fired_actions, *actions]
+    )
+    for action in actions:
+        transaction.on_commit(partial(run_moderation_action.delay, action, summary_id))
+
+
+def refresh_summaries(objects: Iterable[Tuple[int, int]]) -> None:
+    """
+    Count the reports of objects again, e.g. after some were deleted, and drop the summaries with none left.
+
+    :param objects: The (content_type_id, object_id) pairs of the objects.
+    """
+    objects = set(objects)
+    if not objects:
+        return
+    content_type_ids, object_ids = map(list, zip(*objects))
+    params = {"content_type_ids": content_type_ids, "object_ids": object_ids}
+    with connection.cursor() as cursor:
+        cursor.execute(REFRESH_SUMMARIES, params)
+        cursor.execute(DELETE_EMPTY_SUMMARIES, params)
+
+
+# The objects waiting for their summaries to be counted again, per thread
+_pending_refresh = threading.local()
+
+
+def refresh_pending_summaries() -> None:
+    """
+    Count the reports of every object scheduled by schedule_summary_refresh() again.
+    """
+    objects = getattr(_pending_refresh, "objects", None)
+    if objects:
+        _pending_refresh.objects = set()
+        refresh_summaries(objects)
+
+
+def schedule_summary_refresh(content_type_id: int, object_id: int) -> None:
+    """
+    Count the reports of an object again once the current transaction commits.
+
+    Each call queues its own callback, so a savepoint rolled back drops only
+    its callbacks, but every callback refreshes all the scheduled objects:
+    the first one to run counts the objects of every report deleted in the
+    transaction together, such as the reports deleted along with their
+    reporter, and the others find nothing left to do. Objects scheduled by a
+    rolled back transaction are counted again with the next ones, which
+    changes nothing.
+    """
+    objects = getattr(_pending_refresh, "objects", None)
+    if objects is None:
+        objects = _pending_refresh.objects = set()
+    objects.add((content_type_id, object_id))
+    transaction.on_commit(refresh_pending_summaries)
+
+
+@moderation_action("notify_moderators")
+def notify_moderators(summary: ReportSummary) -> None:
+    """
+    Notify the active staff users that an object was reported by many users.
+    """
+    link = reverse("admin:main_reportsummary_change", args=[summary.pk])
+    for user in get_user_model().objects.filter(is_staff=True, is_active=True):
+        Notification.objects.create(
+            user=user,
+            title="Content reported",
+            message=f"{summary.content_object or summary} was reported by "
+            f"{summary.reporter_count} users.",
+            link=link,
+            type="warning",
+        )
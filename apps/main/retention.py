@@ -0,0 +1,114 @@
+"""
+The retention policy of notifications.
+
+Read notifications older than NOTIFICATION_RETENTION_DAYS and unread ones
+older than NOTIFICATION_UNREAD_RETENTION_DAYS are moved to
+ArchivedNotification, or deleted when NOTIFICATION_ARCHIVE is off. Rows are
+purged oldest first in batches, each a single DELETE ... RETURNING statement
+in its own transaction, so locks are short and an interrupted run loses
+nothing. The unread counters of the users of purged unread notifications are
+decremented in the same transaction.
+"""
+
+import logging
+from collections import Counter
+from datetime import timedelta
+from typing import Dict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import ArchivedNotification, Notification
+from .partitions import maintain_partitions
+
+logger = logging.getLogger("celery")
+
+
+def purge_batch(is_read: bool, before, batch_size: int, archive: bool) -> int:
+    """
+    Purge one batch of the oldest notifications created before a date.
+
+    Rows locked by another transaction are skipped, so concurrent runs do not
+    wait on each other.
+
+    :param is_read: Whether to purge read or unread notifications.
+    :param before: Only purge notifications created before this datetime.
+    :param batch_size: The maximum number of notifications to purge.
+    :param archive: Copy the notifications to ArchivedNotification before deleting them.
+    :return: The number of notifications purged.
+    """
+    table = Notification._meta.db_table
+    archive_sql = ""
+    if archive:
+        archive_sql = f""",
+        archived AS (
+            INSERT INTO {ArchivedNotification._meta.db_table}
+                (notification_id, user_id, title, message, link, type, is_read,
+                 created_at, archived_at)
+            SELECT id, user_id, title, message, link, type, is_read, created_at, now()
+            FROM moved
+        )"""
+    sql = f"""
+        WITH moved AS (
+            DELETE FROM {table} WHERE (id, created_at) IN (
+                SELECT id, created_at FROM {table}
+                WHERE is_read = %s AND created_at < %s
+                ORDER BY created_at
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id, user_id, title, message, link, type, is_read, created_at
+        ){archive_sql}
+        SELECT user_id FROM moved
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [is_read, before, batch_size])
+            user_ids = [row[0] for row in cursor.fetchall()]
+        if not is_read:
+            Notification.objects.adjust_unread_counts(Counter(user_ids), sign=-1)
+    return len(user_ids)
+
+
+def purge_notifications(
+    batch_size: int = None, max_batches: int = None, archive: bool = None
+) -> Dict[str, int]:
+    """
+    Purge the notifications past their retention period.
+
+    Arguments default to the NOTIFICATION_RETENTION_BATCH_SIZE,
+    NOTIFICATION_RETENTION_MAX_BATCHES and NOTIFICATION_ARCHIVE settings.
+    What is left after max_batches batches of each kind is purged by the next
+    run. If the table is partitioned, the partitions of the coming months are
+    created and the emptied past ones dropped afterwards.
+
+    :return: The number of read and unread notifications purged.
+    """
+    batch_size = batch_size or settings.NOTIFICATION_RETENTION_BATCH_SIZE
+    max_batches = max_batches or settings.NOTIFICATION_RETENTION_MAX_BATCHES
+    archive = settings.NOTIFICATION_ARCHIVE if archive is None else archive
+    now = timezone.now()
+
+    purged = {}
+    for kind, is_read, days in (
+        ("read", True, settings.NOTIFICATION_RETENTION_DAYS),
+        ("unread", False, settings.NOTIFICATION_UNREAD_RETENTION_DAYS),
+    ):
+        purged[kind] = 0
+        if not days:
+            continue
+        before = now - timedelta(days=days)
+        for _ in range(max_batches):
+            count = purge_batch(is_read, before, batch_size, archive)
+            purged[kind] += count
+            if count < batch_size:
+                break
+        logger.info("Purged %s %s notifications", purged[kind], kind)
+
+    created, dropped = maintain_partitions(
+        connection, settings.NOTIFICATION_PARTITIONS_AHEAD
+    )
+    if created or dropped:
+        logger.info("Created partitions %s, dropped partitions %s", created, dropped)
+    return purged
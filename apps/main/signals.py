@@ -0,0 +1,103 @@
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import model_cache
+from .models import (
+    FAQ,
+    Notification,
+    PrivacyPolicy,
+    Report,
+    SocialMediaLink,
+    TermsAndConditions,
+)
+from .notification_stream import notification_payload, publish_notifications
+from .reports import record_report, schedule_summary_refresh
+
+# Rarely changing models whose values are cached by apps.main.model_cache
+for model in (FAQ, PrivacyPolicy, SocialMediaLink, TermsAndConditions):
+    model_cache.register(model)
+
+
+@receiver(post_save, sender=Notification)
+def update_unread_count_on_save(
+    sender, instance, created, update_fields=None, **kwargs
+):
+    """
+    Adjust the user's unread counter when a notification is created, read or unread.
+
+    The previous read state is only known for notifications loaded from the
+    database; changes the counter cannot see are fixed by the
+    reconcile_unread_notifications command.
+    :param sender:
+    :param instance:
+    :param created:
+    :param update_fields:
+    :param kwargs:
+    :return:
+    """
+    if created:
+        if not instance.is_read:
+            Notification.objects.adjust_unread_count(instance.user_id, 1)
+            # Push it to the user's open pages once it is visible to them
+            transaction.on_commit(
+                partial(publish_notifications, [notification_payload(instance)])
+            )
+    elif update_fields is None or "is_read" in update_fields:
+        was_read = getattr(instance, "_loaded_is_read", None)
+        if was_read is not None and was_read != instance.is_read:
+            Notification.objects.adjust_unread_count(
+                instance.user_id, -1 if instance.is_read else 1
+            )
+    instance._loaded_is_read = instance.is_read
+
+
+@receiver(post_delete, sender=Notification)
+def update_unread_count_on_delete(sender, instance, origin=None, **kwargs):
+    """
+    Decrement the user's unread counter when an unread notification is deleted.
+
+    Nothing is done when the notification is deleted along with its user.
+    :param sender:
+    :param instance:
+    :param origin:
+    :param kwargs:
+    :return:
+    """
+    user_model = get_user_model()
+    if isinstance(origin, user_model) or (
+        isinstance(origin, QuerySet) and origin.model is user_model
+    ):
+        return
+    if not instance.is_read:
+        Notification.objects.adjust_unread_count(instance.user_id, -1)
+
+
+@receiver(post_save, sender=Report)
+def summarize_report_on_save(sender, instance, created, **kwargs):
+    """
+    Count a new report in the summary of its object.
+    :param sender:
+    :param instance:
+    :param created:
+    :param kwargs:
+    :return:
+    """
+    if created:
+        record_report(instance)
+
+
+@receiver(post_delete, sender=Report)
+def summarize_report_on_delete(sender, instance, **kwargs):
+    """
+    Count the reports of the object of a deleted report again, once the transaction commits.
+    :param sender:
+    :param instance:
+    :param kwargs:
+    :return:
+    """
+    schedule_summary_refresh(instance.content_type_id, instance.object_id)
@@ -1,8 +1,13 @@
 import logging
 import smtplib
+from datetime import timedelta
 
 from celery import shared_task
+from django.conf import settings
 from django.core.mail import send_mail
+from django.utils import timezone
+
+from .consts import BroadcastStatus
 
 logger = logging.getLogger("celery")
 
@@ -26,3 +31,78 @@ def send_email_task(
     except smtplib.SMTPException as e:
         logger.error(e)
         return False
+
+
+@shared_task(acks_late=True)
+def send_notification_broadcast(broadcast_id: int) -> int:
+    """
+    A Celery task to deliver a notification broadcast, resuming where it stopped.
+
+    :param broadcast_id: The id of the NotificationBroadcast.
+    :return: The number of users notified by this run.
+    """
+    # Imported here because the models module enqueues tasks from this module
+    from .broadcasts import deliver_broadcast  # pylint: disable=import-outside-toplevel
+
+    return deliver_broadcast(broadcast_id)
+
+
+@shared_task
+def resume_notification_broadcasts() -> int:
+    """
+    A periodic Celery task to restart broadcasts whose delivery stalled.
+
+    Broadcasts still running with no progress for
+    NOTIFICATION_BROADCAST_STALL_TIMEOUT seconds, e.g. after a worker was
+    killed, are queued again.
+
+    :return: The number of broadcasts queued again.
+    """
+    # Imported here because the models module enqueues tasks from this module
+    from .models import NotificationBroadcast  # pylint: disable=import-outside-toplevel
+
+    stalled = list(
+        NotificationBroadcast.objects.filter(
+            status=BroadcastStatus.RUNNING.value,
+            modified__lt=timezone.now()
+            - timedelta(seconds=settings.NOTIFICATION_BROADCAST_STALL_TIMEOUT),
+        ).values_list("pk", flat=True)
+    )
+    for broadcast_id in stalled:
+        send_notification_broadcast.delay(broadcast_id)
+    return len(stalled)
+
+
+@shared_task
+def purge_notifications() -> dict:
+    """
+    A periodic Celery task to archive or delete the notifications past their retention period.
+
+    :return: The number of read and unread notifications purged.
+    """
+    # Imported here because the models module enqueues tasks from this module
+    from .retention import (  # pylint: disable=import-outside-toplevel
+        purge_notifications as purge,
+    )
+
+    return purge()
+
+
+@shared_task
+def run_moderation_action(action: str, summary_id: int) -> None:
+    """
+    A Celery task to run a moderation action on a reported object.
+
+    :param action: The name of the action in apps.main.reports.MODERATION_ACTIONS.
+    :param summary_id: The id of the ReportSummary of the object.
+    """
+    # Imported here because the reports module enqueues tasks from this module
+    # pylint: disable=import-outside-toplevel
+    from .models import ReportSummary
+    from .reports import MODERATION_ACTIONS
+
+    summary = ReportSummary.objects.filter(pk=summary_id).first()
+    if summary is None:
+        logger.info("Report summary %s is gone, skipping %s", summary_id, action)
+        return
+    MODERATION_ACTIONS[action](summary)
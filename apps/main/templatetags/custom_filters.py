@@ -1,6 +1,6 @@
 from django import template
-from django.core.cache import cache
 
+from apps.main import model_cache
 from apps.main.consts import ContactStatus
 from apps.main.models import SocialMediaLink
 
@@ -35,16 +35,48 @@ def contact_status_choices():
     return ContactStatus.choices()
 
 
+@register.simple_tag
+def fragment_version(*model_labels):
+    """
+    Return a version for {% cache %} fragments that changes on deploy and when the given models change.
+
+    Args:
+        model_labels (str): The "app_label.ModelName" labels of the models the
+            fragment displays. They must be registered with apps.main.model_cache.
+
+    Returns:
+        str: SITE_VERSION followed by the version of each model.
+    """
+    return model_cache.fragment_version(*model_labels)
+
+
+@register.simple_tag(takes_context=True)
+def user_fragment_version(context):
+    """
+    Return a version for {% cache %} fragments that changes with what they display of the user.
+
+    Args:
+        context (dict): The template context.
+
+    Returns:
+        str: "anonymous", or the user's id, unread count and a digest of the rest.
+    """
+    return model_cache.user_fragment_version(context["request"])
+
+
 @register.inclusion_tag("components/social_media_row.html")
 def social_media_row():
     """
     Grab social media links from the database and return them to the template.
+
+    The links are cached until a SocialMediaLink changes.
     :return: A dictionary containing the social media links.
     """
-    links = cache.get("social_media_links")
-    if links is None:
-        links = list(SocialMediaLink.objects.all())
-        cache.set("social_media_links", links, 3600)
+    links = model_cache.get_or_set(
+        "social_media_links",
+        [SocialMediaLink],
+        lambda: list(SocialMediaLink.objects.all()),
+    )
     return {"links": links}
 
 
@@ -57,7 +89,7 @@ def report_button(context, model_type, object_id):
 
     Args:
         context (dict): The template context.
-        model_type (str): The type of the model to report.
+        model_type (str): The label of the model to report, e.g. "main.comment", listed in REPORTABLE_MODELS.
         object_id (int): The ID of the object to report.
 
     Returns:
@@ -4,6 +4,9 @@ from django.urls import path
 from .views import (
     HomeView,
     MarkAsReadAndRedirectView,
+    MarkNotificationsAsReadView,
+    NotificationDropdownView,
+    NotificationStreamView,
     TermsAndConditionsView,
     PrivacyPolicyView,
     ContactUsView,
@@ -30,4 +33,24 @@ urlpatterns = [
         MarkAsReadAndRedirectView.as_view(),
         name="mark_as_read_and_redirect",
     ),
+    path(
+        "notifications/mark-as-read/",
+        MarkNotificationsAsReadView.as_view(),
+        name="mark_notifications_as_read",
+    ),
+    path(
+        "notifications/stream/",
+        NotificationStreamView.as_view(),
+        name="notification_stream",
+    ),
 ]
+
+htmx_urls = [
+    path(
+        "notifications/dropdown/",
+        NotificationDropdownView.as_view(),
+        name="notifications_dropdown",
+    ),
+]
+
+urlpatterns += htmx_urls
@@ -1,8 +1,16 @@
+import hashlib
+
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.admin.utils import unquote
-from django.contrib.contenttypes.models import ContentType
-from django.shortcuts import render, redirect, get_object_or_404
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.shortcuts import render, redirect
+from django.utils.decorators import method_decorator
+from django.utils.http import url_has_allowed_host_and_scheme
 from django.views import View
+from django.views.decorators.http import condition
 from django.views.generic import TemplateView, RedirectView, ListView
 from django.http import (
     HttpResponseBadRequest,
@@ -12,10 +20,15 @@ from django.http import (
     HttpRequest,
     Http404,
     HttpResponseNotFound,
+    StreamingHttpResponse,
 )
 
+from . import model_cache
 from .forms import ContactForm
-from .models import Notification, TermsAndConditions, PrivacyPolicy, FAQ, Report
+from .models import Notification, TermsAndConditions, PrivacyPolicy, FAQ
+from .notification_stream import get_notification_hub, stream_notifications
+from .ratelimit import rate_limit
+from .reports import get_reportable_model, submit_report
 
 
 class HomeView(TemplateView):
@@ -24,25 +37,79 @@ class HomeView(TemplateView):
     template_name = "main/home.html"
 
 
-class TermsAndConditionsView(TemplateView):
+class LegalDocumentView(TemplateView):
+    """
+    Base view of a legal document page, showing the latest document of `model`.
+
+    The document is cached in each process and in the shared cache until a
+    new one is saved. Responses carry an ETag, so browsers and CDNs
+    revalidating an unchanged page get a 304 without the page being rendered.
+    The ETag also covers the navbar and footer, which change with the user and
+    the social media links. There is no Last-Modified date, as it could only
+    reflect the document and would let If-Modified-Since revalidate a page
+    whose navbar changed. Pages showing flash messages get no ETag, as a 304
+    would consume the messages without showing them.
+    """
+
+    model = None
+
+    def get_document(self):
+        """
+        Return the latest document, or None if there is none.
+        """
+        return model_cache.get_or_set(
+            f"current_{self.model._meta.model_name}",
+            [self.model],
+            lambda: self.model.objects.order_by("-created_at").first(),
+            local=True,
+        )
+
+    def get_etag(self, request, *args, **kwargs):
+        document = self.get_document()
+        if document is None or messages.get_messages(request):
+            return None
+        page = ":".join(
+            [
+                model_cache.fragment_version("main.SocialMediaLink"),
+                model_cache.user_fragment_version(request),
+            ]
+        )
+        digest = hashlib.blake2b(page.encode(), digest_size=8).hexdigest()
+        return f"{self.model._meta.model_name}-{document.pk}-{digest}"
+
+    def dispatch(self, request, *args, **kwargs):
+        conditional = condition(etag_func=self.get_etag)
+        return conditional(super().dispatch)(request, *args, **kwargs)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["document"] = self.get_document()
+        if context["document"] is None:
+            raise Http404(f"No {self.model._meta.verbose_name} yet.")
+        return context
+
+
+class TermsAndConditionsView(LegalDocumentView):
     """View to the terms and conditions page."""
 
     template_name = "main/terms_and_conditions.html"
+    model = TermsAndConditions
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["terms"] = TermsAndConditions.objects.latest("created_at").terms
+        context["terms"] = context["document"].terms
         return context
 
 
-class PrivacyPolicyView(TemplateView):
+class PrivacyPolicyView(LegalDocumentView):
     """View to the privacy policy page."""
 
     template_name = "main/privacy_policy.html"
+    model = PrivacyPolicy
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["privacy_policy"] = PrivacyPolicy.objects.latest("created_at")
+        context["privacy_policy"] = context["document"]
         return context
 
 
@@ -106,6 +173,118 @@ class MarkAsReadAndRedirectView(RedirectView):
         return HttpResponseRedirect(decoded_url)  # Redirect to the decoded URL
 
 
+class NotificationDropdownView(LoginRequiredMixin, TemplateView):
+    """
+    HTMX view that renders the latest unread notifications of the navbar dropdown.
+
+    The dropdown requests it the first time it is opened, so pages are
+    rendered without loading any notification.
+    """
+
+    template_name = "components/notifications_dropdown.html"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["notifications"] = (
+            Notification.objects.filter(user=self.request.user)
+            .unread()
+            .for_dropdown()[: settings.NOTIFICATION_DROPDOWN_LIMIT]
+        )
+        return context
+
+
+class MarkNotificationsAsReadView(LoginRequiredMixin, View):
+    """
+    Mark the user's notifications as read with a single UPDATE.
+
+    Marks the notifications listed in `notification_ids`, or all of the
+    user's notifications when none are given. HTMX requests get the emptied
+    notifications dropdown back; other requests are redirected.
+    """
+
+    http_method_names = ["post"]
+
+    def post(self, request, *args, **kwargs) -> HttpResponse:
+        """
+        Handle POST requests.
+
+        :param request: HttpRequest object
+        :return: HttpResponse object
+        """
+        notifications = Notification.objects.filter(user=request.user)
+        notification_ids = request.POST.getlist("notification_ids")
+        if notification_ids:
+            try:
+                notifications = notifications.filter(
+                    pk__in=[int(pk) for pk in notification_ids]
+                )
+            except ValueError:
+                return HttpResponseBadRequest("Invalid notification ids.")
+        notifications.mark_as_read()
+
+        if request.headers.get("HX-Request"):
+            # The badge is rendered from the counter, which the UPDATE changed
+            request.user.refresh_from_db(fields=["unread_notifications"])
+            return render(
+                request,
+                "components/notifications_dropdown.html",
+                {
+                    "notifications": Notification.objects.filter(user=request.user)
+                    .unread()
+                    .for_dropdown()[: settings.NOTIFICATION_DROPDOWN_LIMIT],
+                    "refresh_badge": True,
+                },
+            )
+        referer = request.META.get("HTTP_REFERER")
+        if referer and url_has_allowed_host_and_scheme(
+            referer, allowed_hosts={request.get_host()}
+        ):
+            return HttpResponseRedirect(referer)
+        return redirect("home")
+
+
+# A stream outlives any transaction, so it must not run inside ATOMIC_REQUESTS
+@method_decorator(transaction.non_atomic_requests, name="dispatch")
+class NotificationStreamView(View):
+    """
+    Server-Sent Events stream of the user's new notifications.
+
+    The navbar keeps it open through the htmx SSE extension and inserts each
+    notification into the dropdown and the updated badge as they arrive. The
+    view is async, so under an ASGI server an idle stream costs a coroutine
+    instead of a worker thread. Under WSGI, or when NOTIFICATION_STREAM_ENABLED
+    is off, it answers 204, which tells the browser not to reconnect.
+    """
+
+    async def get(self, request, *args, **kwargs) -> HttpResponse:
+        """
+        Handle GET requests.
+
+        :param request: HttpRequest object
+        :return: A text/event-stream response, 401 for anonymous users, or 204
+        when streams are not offered
+        """
+        if not settings.NOTIFICATION_STREAM_ENABLED or not isinstance(
+            request, ASGIRequest
+        ):
+            return HttpResponse(status=204)
+        user = await request.auser()
+        if not user.is_authenticated:
+            return HttpResponse(status=401)
+
+        response = StreamingHttpResponse(
+            stream_notifications(
+                user.pk, user.unread_notifications, get_notification_hub()
+            ),
+            content_type="text/event-stream",
+        )
+        response["Cache-Control"] = "no-cache"
+        # Keep nginx from buffering the events
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+
+@rate_limit("contact")
 class ContactUsView(View):
     """
     View to handle the Contact Us form.
@@ -141,36 +320,71 @@ class FAQListView(ListView):
     model = FAQ
     template_name = "main/faqs.html"
     context_object_name = "faqs"
+    paginate_by = 10
+    # Longer searches are cut, to bound the work and the cache keys they cost
+    max_query_length = 200
+
+    def get_search(self) -> str:
+        return self.request.GET.get("q", "").strip()[: self.max_query_length]
+
+    def get_queryset(self):
+        """
+        Return the FAQs matching the `q` search, best ranked first, or all of them.
+
+        The FAQs are cached until one changes. Searches come from clients and
+        have no bound on their number, so their results are also only cached
+        for FAQ_SEARCH_CACHE_TIMEOUT seconds, under the normalised search.
+        """
+        search = " ".join(self.get_search().split()).lower()
+        faqs = FAQ.objects.defer("search_vector")
+        if not search:
+            return model_cache.get_or_set(
+                "faqs", [FAQ], lambda: list(faqs.order_by("pk"))
+            )
+        digest = hashlib.blake2b(search.encode(), digest_size=16).hexdigest()
+        return model_cache.get_or_set(
+            f"faqs:search:{digest}",
+            [FAQ],
+            lambda: list(faqs.search(search)),
+            timeout=settings.FAQ_SEARCH_CACHE_TIMEOUT,
+        )
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["search"] = self.get_search()
+        return context
 
 
+@rate_limit("report")
 class ReportView(View):
     """
     A view for handling reports of inappropriate content.
 
     Methods:
-        post(request, model_type, object_id): Handles the report creation.
+        post(request, model_name, object_id): Handles the report creation.
     """
 
     def post(self, request: HttpRequest, model_name: str, object_id: int):
         """
-        Get the model class based on the model_type string
+        Report an object of a model in REPORTABLE_MODELS
         :param request:
-        :param model_name:
+        :param model_name: The label of the model, e.g. "main.comment"
         :param object_id:
         :return:
         """
-        try:
-            model = ContentType.objects.get(model=model_name).model_class()
-            obj = get_object_or_404(model, pk=object_id)
-        except Http404:
+        reportable = get_reportable_model(model_name)
+        if (
+            reportable is None
+            or not reportable.model._base_manager.filter(pk=object_id).exists()
+        ):
             return HttpResponseNotFound("Object not found")
 
-        # Create the report
-        Report.objects.create(
-            content_type=ContentType.objects.get_for_model(obj),
-            object_id=obj.id,
-            reporter=request.user,
-            reason=request.POST.get("reason", "No reason provided."),
+        # Create the report, or update the user's previous report of the object
+        submit_report(
+            reportable.content_type_id,
+            object_id,
+            request.user.pk,
+            request.POST.get("reason", "No reason provided."),
         )
         # Refresh the page the user was on. If for some reason it doesnt work then take the user home.
         return HttpResponseRedirect(request.META.get("HTTP_REFERER", "home"))
@@ -0,0 +1,393 @@
+import abc
+import atexit
+import logging
+import threading
+import time
+from collections import namedtuple, OrderedDict
+from functools import lru_cache, partial
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.module_loading import import_string
+
+from apps.main.redis_client import get_redis_client
+
+from .geoip import get_geo_resolver
+from .models import UserIP, UserDevice
+from .tasks import resolve_ip_geolocation
+
+logger = logging.getLogger(__name__)
+
+ActivityEntry = namedtuple(
+    "ActivityEntry", ["user_id", "ip_address", "device_identifier", "seen_at"]
+)
+
+
+def record_activity(entries: Iterable[ActivityEntry]) -> None:
+    """
+    Write a batch of activity entries to UserIP and UserDevice.
+
+    Entries are collapsed to the latest sighting per (user, ip) and
+    (user, device), then written with one upsert per table, so the number of
+    queries depends on the number of tables, not on the number of entries.
+
+    :param entries: The activity entries to record.
+    """
+    ips = {}
+    devices = {}
+    for entry in entries:
+        if entry.ip_address:
+            key = (entry.user_id, entry.ip_address)
+            ips[key] = max(entry.seen_at, ips.get(key, entry.seen_at))
+        if entry.device_identifier:
+            key = (entry.user_id, entry.device_identifier)
+            devices[key] = max(entry.seen_at, devices.get(key, entry.seen_at))
+
+    user_ips = UserIP.objects.bulk_touch(
+        _build_user_ip(user_id, ip_address, seen_at)
+        for (user_id, ip_address), seen_at in ips.items()
+    )
+    UserDevice.objects.bulk_touch(
+        UserDevice(
+            user_id=user_id, device_identifier=device_identifier, last_seen=seen_at
+        )
+        for (user_id, device_identifier), seen_at in devices.items()
+    )
+
+    if user_ips and not get_geo_resolver().is_local:
+        # The upsert does not tell new rows apart, so look for unresolved ones
+        pending = (
+            UserIP.objects.filter(
+                pk__in=[user_ip.pk for user_ip in user_ips], country__isnull=True
+            )
+            .values_list("ip_address", flat=True)
+            .distinct()
+        )
+        for ip_address in pending:
+            # Resolve the location in the background once the row is visible
+            transaction.on_commit(partial(resolve_ip_geolocation.delay, ip_address))
+
+
+def _build_user_ip(user_id, ip_address, seen_at) -> UserIP:
+    """
+    Build an unsaved UserIP, resolving its location inline when the resolver is local.
+
+    The location is only stored when the row is new; upserts keep the location
+    of existing rows.
+    """
+    user_ip = UserIP(user_id=user_id, ip_address=ip_address, last_seen=seen_at)
+    resolver = get_geo_resolver()
+    if resolver.is_local:
+        geo_data = resolver.lookup(ip_address)
+        user_ip.country = geo_data.get("country", "")
+        user_ip.region = geo_data.get("region", "")
+        user_ip.city = geo_data.get("city", "")
+    return user_ip
+
+
+class ActivityBuffer(abc.ABC):
+    """
+    The interface for write-behind buffers of user activity.
+
+    The tracking middleware adds one entry per request. Entries are
+    deduplicated per (user, ip, device) so only the latest sighting is kept,
+    and are written in batches by flush(). A batch whose write fails is kept
+    for the next flush.
+    """
+
+    @abc.abstractmethod
+    def add(self, entry: ActivityEntry) -> None:
+        """
+        Buffer an activity entry.
+        :param entry: The entry to buffer.
+        """
+
+    @abc.abstractmethod
+    def drain(self) -> List[ActivityEntry]:
+        """
+        Take every buffered entry for writing.
+        """
+
+    def acknowledge(self) -> None:
+        """
+        Forget the entries of the last drain, once they are written.
+        """
+
+    def restore(self, entries: List[ActivityEntry]) -> None:
+        """
+        Buffer the entries of a drain again after their write failed.
+        """
+
+    def flush(self) -> int:
+        """
+        Write every buffered entry to the database.
+
+        :return: The number of entries written.
+        """
+        entries = self.drain()
+        if not entries:
+            return 0
+        try:
+            with transaction.atomic():
+                record_activity(entries)
+        except Exception:
+            self.restore(entries)
+            raise
+        self.acknowledge()
+        return len(entries)
+
+
+class LocalActivityBuffer(ActivityBuffer):
+    """
+    An in-process buffer that flushes itself in a background thread.
+
+    A flush is started by whichever request fills the buffer up to
+    USER_ACTIVITY_BUFFER_MAX_SIZE, or by the first request after
+    USER_ACTIVITY_FLUSH_INTERVAL seconds, and the buffer is flushed once
+    more at process exit. Entries still buffered when a process is killed
+    are lost.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._flusher: Optional[threading.Thread] = None
+        atexit.register(self.flush)
+
+    def add(self, entry: ActivityEntry) -> None:
+        with self._lock:
+            self._entries[entry[:3]] = entry
+            due = (
+                len(self._entries) >= settings.USER_ACTIVITY_BUFFER_MAX_SIZE
+                or time.monotonic() - self._last_flush
+                >= settings.USER_ACTIVITY_FLUSH_INTERVAL
+            )
+            start = due and (self._flusher is None or not self._flusher.is_alive())
+            if start:
+                # Keep the requests arriving meanwhile from starting another flush
+                self._last_flush = time.monotonic()
+                self._flusher = threading.Thread(
+                    target=self._flush_in_background, name="activity-flush", daemon=True
+                )
+        if start:
+            self._flusher.start()
+
+    def _flush_in_background(self) -> None:
+        try:
+            self.flush()
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Could not write the buffered user activity")
+        finally:
+            # The thread's connections are not closed by any request
+            connections.close_all()
+
+    def drain(self) -> List[ActivityEntry]:
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries = {}
+            self._last_flush = time.monotonic()
+        return entries
+
+    def restore(self, entries: List[ActivityEntry]) -> None:
+        with self._lock:
+            for entry in entries:
+                # Sightings buffered since the drain are newer
+                self._entries.setdefault(entry[:3], entry)
+
+
+class RedisActivityBuffer(ActivityBuffer):
+    """
+    A buffer shared by every process through a Redis hash.
+
+    Each (user, ip, device) key is a field of the hash, so repeated sightings
+    overwrite each other. The flush_user_activity task drains the hash
+    periodically: the hash is renamed to a processing key, which is only
+    deleted once its entries are written. A batch whose write failed, or
+    whose worker died, is written again by the next flush.
+    """
+
+    key = "users:activity_buffer"
+    processing_key = "users:activity_buffer:processing"
+    separator = "\x1f"
+
+    # Move the hash to the processing key in one atomic step, unless a batch that
+    # was not written is still there, and return the batch to write
+    DRAIN_SCRIPT = """
+    if redis.call('EXISTS', KEYS[2]) == 0 and redis.call('EXISTS', KEYS[1]) == 1 then
+        redis.call('RENAME', KEYS[1], KEYS[2])
+    end
+    return redis.call('HGETALL', KEYS[2])
+    """
+
+    def __init__(self):
+        self._drain = get_redis_client().register_script(self.DRAIN_SCRIPT)
+
+    def add(self, entry: ActivityEntry) -> None:
+        field = self.separator.join(
+            [str(entry.user_id), entry.ip_address or "", entry.device_identifier or ""]
+        )
+        get_redis_client().hset(self.key, field, entry.seen_at.isoformat())
+
+    def drain(self) -> List[ActivityEntry]:
+        data = self._drain(keys=[self.key, self.processing_key])
+        entries = []
+        for field, seen_at in zip(data[::2], data[1::2]):
+            user_id, ip_address, device_identifier = field.decode().split(
+                self.separator
+            )
+            entries.append(
+                ActivityEntry(
+                    int(user_id),
+                    ip_address or None,
+                    device_identifier or None,
+                    parse_datetime(seen_at.decode()),
+                )
+            )
+        return entries
+
+    def acknowledge(self) -> None:
+        get_redis_client().delete(self.processing_key)
+
+
+class ActivityDebouncer:
+    """
+    Skip activity that was already recorded recently.
+
+    Recently recorded (user_id, ip, device) keys are kept in an in-process
+    LRU cache for USER_ACTIVITY_DEBOUNCE_INTERVAL seconds. With
+    USER_ACTIVITY_DEBOUNCE_SHARED the keys are also claimed in Redis, so a
+    key recorded by one worker is skipped by all the others.
+
+    Hits (skipped writes) and misses (recorded writes) are counted per
+    process by stats(). With the shared tier they are also added to a Redis
+    hash every STATS_PUBLISH_EVERY decisions, which the user_activity_stats
+    command reports across all workers.
+    """
+
+    key_prefix = "users:activity_seen:"
+    stats_key = "users:activity_debounce_stats"
+    STATS_PUBLISH_EVERY = 100
+
+    def __init__(self, interval: float, max_size: int, shared: bool = False):
+        """
+        :param interval: Seconds during which a recorded key is skipped. 0 disables debouncing.
+        :param max_size: The maximum number of keys kept in memory.
+        :param shared: Whether to also claim keys in Redis.
+        """
+        self.interval = interval
+        self.max_size = max_size
+        self.shared = shared
+        self._recent = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"local_hits": 0, "shared_hits": 0, "misses": 0}
+        self._unpublished = dict(self._stats)
+
+    def should_record(self, user_id, ip_address, device_identifier) -> bool:
+        """
+        Return whether a sighting should be written, and remember it if so.
+        """
+        if self.interval <= 0:
+            return True
+        key = (user_id, ip_address, device_identifier)
+        now = time.monotonic()
+
+        with self._lock:
+            recorded_at = self._recent.get(key)
+            if recorded_at is not None and now - recorded_at < self.interval:
+                self._recent.move_to_end(key)
+                self._count("local_hits")
+                return False
+
+        # Another worker may have recorded it already
+        record = not self.shared or get_redis_client().set(
+            self.key_prefix + "\x1f".join(str(part) for part in key),
+            1,
+            nx=True,
+            ex=max(int(self.interval), 1),
+        )
+
+        with self._lock:
+            self._recent[key] = now
+            self._recent.move_to_end(key)
+            while len(self._recent) > self.max_size:
+                self._recent.popitem(last=False)
+            self._count("misses" if record else "shared_hits")
+        return bool(record)
+
+    def _count(self, name: str) -> None:
+        """
+        Increment a counter and publish the pending counts when due. Called with the lock held.
+        """
+        self._stats[name] += 1
+        self._unpublished[name] += 1
+        if self.shared and sum(self._unpublished.values()) >= self.STATS_PUBLISH_EVERY:
+            pipeline = get_redis_client().pipeline(transaction=False)
+            for counter, value in self._unpublished.items():
+                pipeline.hincrby(self.stats_key, counter, value)
+            pipeline.execute()
+            self._unpublished = dict.fromkeys(self._unpublished, 0)
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Return the counters of this process and the share of writes saved.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        return with_hit_rate(stats)
+
+
+def with_hit_rate(stats: Dict[str, int]) -> Dict[str, float]:
+    """
+    Add the total and the hit rate to debouncer counters.
+    """
+    hits = stats.get("local_hits", 0) + stats.get("shared_hits", 0)
+    total = hits + stats.get("misses", 0)
+    return {**stats, "total": total, "hit_rate": hits / total if total else 0.0}
+
+
+@lru_cache(maxsize=None)
+def get_activity_debouncer() -> ActivityDebouncer:
+    """
+    Return the debouncer configured by the USER_ACTIVITY_DEBOUNCE_* settings, built once per process.
+    """
+    return ActivityDebouncer(
+        interval=settings.USER_ACTIVITY_DEBOUNCE_INTERVAL,
+        max_size=settings.USER_ACTIVITY_DEBOUNCE_MAX_SIZE,
+        shared=settings.USER_ACTIVITY_DEBOUNCE_SHARED,
+    )
+
+
+@lru_cache(maxsize=None)
+def get_activity_buffer() -> Optional[ActivityBuffer]:
+    """
+    Return the buffer configured by USER_ACTIVITY_BUFFER, built once per process.
+
+    :return: The buffer, or None when activity is written synchronously.
+    """
+    if not settings.USER_ACTIVITY_BUFFER:
+        return None
+    return import_string(settings.USER_ACTIVITY_BUFFER)()
+
+
+def track_activity(user_id, ip_address, device_identifier) -> None:
+    """
+    Record that a user was seen on an IP address and device.
+
+    Sightings already recorded within the debounce interval are dropped. The
+    rest are buffered when USER_ACTIVITY_BUFFER is set and written
+    immediately otherwise.
+    """
+    if not get_activity_debouncer().should_record(
+        user_id, ip_address, device_identifier
+    ):
+        return
+    entry = ActivityEntry(user_id, ip_address, device_identifier, timezone.now())
+    buffer = get_activity_buffer()
+    if buffer is None:
+        record_activity([entry])
+    else:
+        buffer.add(entry)
@@ -3,7 +3,7 @@ from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib import admin
 from django.db.models import Count
 
-from .models import User, UserIP, UserDevice
+from .models import BlockedNetwork, User, UserIP, UserDevice
 from .utils import block_user_and_devices
 
 
@@ -88,6 +88,21 @@ class UserAdmin(BaseUserAdmin):
         ("Important dates", {"fields": ("last_login", "date_joined")}),
     )
 
+    def save_model(self, request, obj, form, change):
+        """
+        Overriding the default save_model method to keep the unread notification counter
+        :param request:
+        :param obj:
+        :param form:
+        :param change:
+        :return:
+        """
+        if change:
+            # The counter is only changed by F() updates, which may have run since
+            # the user was loaded to build the form
+            obj.refresh_from_db(fields=["unread_notifications"])
+        super().save_model(request, obj, form, change)
+
     def block_users_and_devices(self, request, queryset):
         """
         Custom admin action to block users and their devices.
@@ -194,3 +209,17 @@ class UserDeviceAdmin(admin.ModelAdmin):
     )
 
     fieldsets = ((None, {"fields": ("user", "device_identifier", "last_seen")}),)
+
+
+@admin.register(BlockedNetwork)
+class BlockedNetworkAdmin(admin.ModelAdmin):
+    """
+    Custom admin interface for the BlockedNetwork model.
+    """
+
+    list_display = ("network", "reason", "created")
+    search_fields = ("network", "reason")
+    list_filter = ("created",)
+    readonly_fields = ("created", "modified")
+
+    fieldsets = ((None, {"fields": ("network", "reason", "created", "modified")}),)
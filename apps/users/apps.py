@@ -6,3 +6,8 @@ class UsersConfig(AppConfig):
 
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.users"
+
+    def ready(self):
+        """Connect the signal handlers"""
+        # pylint: disable=import-outside-toplevel,unused-import
+        from . import signals  # noqa: F401
@@ -0,0 +1,261 @@
+"""
+An in-memory index of blocked and suspicious IP addresses, networks and devices.
+
+Every worker builds a snapshot of the blocklist once, from the flagged UserIP
+and UserDevice rows and the BlockedNetwork ranges, and answers block checks
+from memory without a database round trip.
+
+Snapshots are kept fresh through a version token in the shared cache, read
+past the per-process tier of the default cache. Whenever the blocklist
+changes, invalidate_blocklist() drops the snapshot of the current process and
+replaces the token, and every other worker rebuilds its snapshot the next
+time it notices the new token. Workers read the token at most once every
+USER_BLOCKLIST_CHECK_INTERVAL seconds.
+"""
+
+import ipaddress
+import threading
+import time
+import uuid
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from apps.main.cache_backends import shared_cache
+
+from .models import BlockedNetwork, UserDevice, UserIP
+
+VERSION_KEY = "users:blocklist_version"
+
+# Replaces a node of the tree when its whole subtree is covered by a network
+COVERED = True
+
+
+class PrefixTree:
+    """
+    A binary prefix tree of the networks of one IP version.
+
+    Each level of the tree consumes one bit of the address, most significant
+    first, so a lookup walks at most 32 (IPv4) or 128 (IPv6) nodes. Single
+    addresses, usually the bulk of a blocklist, are kept in a set instead of
+    as full-length paths of the tree.
+    """
+
+    def __init__(self, max_prefixlen: int):
+        """
+        :param max_prefixlen: The number of bits of an address, 32 or 128.
+        """
+        self.max_prefixlen = max_prefixlen
+        self._addresses = set()
+        # A node is a [zero, one] list of children, None or COVERED
+        self._root = [None, None]
+
+    def add(self, network) -> None:
+        """
+        Add a network to the tree.
+        :param network: An IPv4Network or IPv6Network of the tree's IP version.
+        """
+        if network.prefixlen == self.max_prefixlen:
+            self._addresses.add(int(network.network_address))
+            return
+        if network.prefixlen == 0:
+            self._root = COVERED
+            return
+
+        value = int(network.network_address)
+        node = self._root
+        for depth in range(network.prefixlen - 1):
+            if node is COVERED:
+                return
+            bit = (value >> (self.max_prefixlen - 1 - depth)) & 1
+            if node[bit] is None:
+                node[bit] = [None, None]
+            node = node[bit]
+        if node is not COVERED:
+            node[(value >> (self.max_prefixlen - network.prefixlen)) & 1] = COVERED
+
+    def __contains__(self, address) -> bool:
+        """
+        Return whether an address is in any network of the tree.
+        :param address: An IPv4Address or IPv6Address of the tree's IP version.
+        """
+        value = int(address)
+        if value in self._addresses:
+            return True
+
+        node = self._root
+        for depth in range(self.max_prefixlen):
+            if node is COVERED:
+                return True
+            node = node[(value >> (self.max_prefixlen - 1 - depth)) & 1]
+            if node is None:
+                return False
+        return node is COVERED
+
+
+class NetworkSet:
+    """
+    A set of IPv4 and IPv6 networks that answers membership of single addresses.
+    """
+
+    def __init__(self, networks: Iterable[str] = ()):
+        """
+        :param networks: Addresses or networks in CIDR notation.
+        """
+        self._trees = {4: PrefixTree(32), 6: PrefixTree(128)}
+        for network in networks:
+            self.add(network)
+
+    def add(self, network: str) -> None:
+        """
+        Add an address or a network in CIDR notation.
+        """
+        network = ipaddress.ip_network(network, strict=False)
+        self._trees[network.version].add(network)
+
+    def __contains__(self, ip_address: Optional[str]) -> bool:
+        if not ip_address:
+            return False
+        try:
+            address = ipaddress.ip_address(ip_address)
+        except ValueError:
+            return False
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        return address in self._trees[address.version]
+
+
+class Blocklist:
+    """
+    A snapshot of everything that is blocked or suspicious.
+    """
+
+    def __init__(
+        self,
+        blocked_or_suspicious_ips: Iterable[str] = (),
+        blocked_devices: Iterable[str] = (),
+    ):
+        """
+        :param blocked_or_suspicious_ips: Addresses or networks in CIDR notation.
+        :param blocked_devices: Blocked device identifiers.
+        """
+        self.ips = NetworkSet(blocked_or_suspicious_ips)
+        self.devices = frozenset(blocked_devices)
+
+    @classmethod
+    def from_database(cls) -> "Blocklist":
+        """
+        Build a snapshot from the flagged UserIP and UserDevice rows and the BlockedNetwork ranges.
+        """
+        flagged_ips = (
+            UserIP.objects.filter(Q(is_blocked=True) | Q(is_suspicious=True))
+            .values_list("ip_address", flat=True)
+            .distinct()
+        )
+        networks = BlockedNetwork.objects.values_list("network", flat=True)
+        blocked_devices = (
+            UserDevice.objects.filter(is_blocked=True)
+            .values_list("device_identifier", flat=True)
+            .distinct()
+        )
+        return cls([*flagged_ips, *networks], blocked_devices)
+
+    def is_ip_blocked_or_suspicious(self, ip_address: Optional[str]) -> bool:
+        """
+        Check if an IP address is blocked, suspicious or in a blocked network.
+        """
+        return ip_address in self.ips
+
+    def is_device_blocked(self, device_identifier: Optional[str]) -> bool:
+        """
+        Check if a device is blocked.
+        """
+        return device_identifier in self.devices
+
+
+class LocalBlocklist:
+    """
+    The blocklist snapshot of this process, rebuilt when the shared version changes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self) -> None:
+        """
+        Drop the snapshot so the next get() rebuilds it.
+        """
+        self._blocklist = None
+        self._version = None
+        self._checked_at = 0.0
+
+    def get(self) -> Blocklist:
+        """
+        Return the snapshot, rebuilding it if the shared version changed since it was built.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if (
+                self._blocklist is not None
+                and now - self._checked_at < settings.USER_BLOCKLIST_CHECK_INTERVAL
+            ):
+                return self._blocklist
+
+            version = get_blocklist_version()
+            if self._blocklist is None or version != self._version:
+                self._blocklist = Blocklist.from_database()
+                self._version = version
+            self._checked_at = now
+            return self._blocklist
+
+
+_local_blocklist = LocalBlocklist()
+
+
+def get_blocklist_version() -> str:
+    """
+    Return the shared version token, creating one if the cache has none.
+    """
+    version = shared_cache().get(VERSION_KEY)
+    if version is None:
+        # Another worker may create it first, so read back whichever won
+        shared_cache().add(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        version = shared_cache().get(VERSION_KEY)
+    return version
+
+
+def bump_blocklist_version() -> None:
+    """
+    Replace the shared version token so every worker rebuilds its snapshot.
+    """
+    shared_cache().set(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+
+
+def get_blocklist() -> Blocklist:
+    """
+    Return the blocklist snapshot of this process.
+    """
+    return _local_blocklist.get()
+
+
+def invalidate_blocklist() -> None:
+    """
+    Make every worker rebuild its blocklist snapshot.
+
+    The version is replaced right away and again once the current transaction
+    commits, so a worker that rebuilt its snapshot before the change was
+    visible rebuilds it once more.
+    """
+    _local_blocklist.clear()
+    bump_blocklist_version()
+    transaction.on_commit(bump_blocklist_version)
+
+
+def reset_blocklist() -> None:
+    """
+    Drop the snapshot of this process without touching the shared version.
+    """
+    _local_blocklist.clear()
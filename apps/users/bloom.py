@@ -0,0 +1,232 @@
+"""
+A Bloom filter over usernames for the check_username endpoint.
+
+A Bloom filter answers "definitely absent" or "probably present" from a small
+bit array. Every username availability check first asks the filter of the
+worker: absent names are reported as available without touching the
+database, and only probable hits are confirmed with a query.
+
+Each worker builds its filter from the database on first use. Names added
+afterwards, by any worker, are appended to a short log in the shared cache
+under an increasing generation number; before answering, a worker replays the
+entries it has not seen yet. When the log cannot be replayed (entries were
+evicted or the worker is too far behind) the filter is rebuilt from the
+database, so a taken name is never reported as available.
+
+Deleted and renamed users leave their old name in the filter. That only
+raises the false positive rate, which the database check absorbs, until the
+next rebuild.
+"""
+
+import hashlib
+import math
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from apps.main.cache_backends import shared_cache
+
+GENERATION_KEY = "users:username_filter:generation"
+ENTRY_KEY = "users:username_filter:entry:{}"
+# How long logged names are kept for workers to replay, in seconds
+ENTRY_TIMEOUT = 24 * 60 * 60
+# Workers further behind than this rebuild their filter instead of replaying
+MAX_REPLAY = 1000
+
+
+class BloomFilter:
+    """
+    A fixed-size Bloom filter of strings.
+
+    The bit array and the number of hash functions are sized for the expected
+    number of items and the acceptable false positive rate. Adding more items
+    than the capacity keeps working but raises the false positive rate.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        """
+        :param capacity: The number of items the filter is sized for.
+        :param error_rate: The false positive rate at capacity, between 0 and 1.
+        """
+        if capacity < 1 or not 0 < error_rate < 1:
+            raise ValueError("capacity must be positive and error_rate in (0, 1).")
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        """
+        Yield the bit positions of an item, using double hashing of one digest.
+        """
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "big")
+        second = int.from_bytes(digest[8:], "big") | 1
+        for i in range(self.hash_count):
+            yield (first + i * second) % self.size
+
+    def add(self, item: str) -> None:
+        """
+        Add an item to the filter.
+        """
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        """
+        Return False if the item was never added, True if it probably was.
+        """
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(item)
+        )
+
+    @property
+    def memory_bytes(self) -> int:
+        """The size of the bit array in bytes."""
+        return len(self._bits)
+
+    @property
+    def expected_error_rate(self) -> float:
+        """The expected false positive rate for the current number of items."""
+        return (
+            1 - math.exp(-self.hash_count * self.count / self.size)
+        ) ** self.hash_count
+
+
+class UsernameFilter:
+    """
+    The username Bloom filter of this process, kept in sync with other workers through the cache.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        """
+        :param capacity: The minimum number of usernames the filter is sized for.
+        :param error_rate: The false positive rate at capacity.
+        """
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._lock = threading.Lock()
+        self._filter: Optional[BloomFilter] = None
+        self._generation = 0
+
+    def build(self) -> BloomFilter:
+        """
+        Build the filter from every username in the database. Called with the lock held.
+        """
+        # Read the generation first: anything logged after it is replayed later
+        self._generation = get_generation()
+        usernames = get_user_model().objects.values_list("username", flat=True)
+        bloom = BloomFilter(max(self.capacity, usernames.count() * 2), self.error_rate)
+        for username in usernames.iterator(chunk_size=10000):
+            bloom.add(username)
+        self._filter = bloom
+        return bloom
+
+    def _sync(self) -> BloomFilter:
+        """
+        Return the filter after replaying the names logged by other workers. Called with the lock held.
+        """
+        if self._filter is None:
+            return self.build()
+
+        generation = shared_cache().get(GENERATION_KEY)
+        if generation is None:
+            # The log was lost, so names may be missing
+            return self.build()
+        if generation == self._generation:
+            return self._filter
+        if generation < self._generation or generation - self._generation > MAX_REPLAY:
+            return self.build()
+
+        keys = [
+            ENTRY_KEY.format(n) for n in range(self._generation + 1, generation + 1)
+        ]
+        entries = shared_cache().get_many(keys)
+        if len(entries) != len(keys):
+            return self.build()
+        for username in entries.values():
+            self._filter.add(username)
+        self._generation = generation
+
+        if self._filter.count > self._filter.capacity:
+            # Resize before the false positive rate degrades further
+            return self.build()
+        return self._filter
+
+    def add(self, username: str) -> None:
+        """
+        Add a username to the filter of this process, if it was built.
+        """
+        with self._lock:
+            if self._filter is not None:
+                self._filter.add(username)
+
+    def might_exist(self, username: str) -> bool:
+        """
+        Return False if no user has the username, True if one probably does.
+        """
+        with self._lock:
+            return username in self._sync()
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Return the size and the expected false positive rate of the filter, building it if needed.
+        """
+        with self._lock:
+            bloom = self._sync()
+        return {
+            "capacity": bloom.capacity,
+            "count": bloom.count,
+            "bits": bloom.size,
+            "hash_count": bloom.hash_count,
+            "memory_bytes": bloom.memory_bytes,
+            "configured_error_rate": bloom.error_rate,
+            "expected_error_rate": bloom.expected_error_rate,
+        }
+
+
+@lru_cache(maxsize=None)
+def get_username_filter() -> UsernameFilter:
+    """
+    Return the username filter configured by the USERNAME_FILTER_* settings, built once per process.
+    """
+    return UsernameFilter(
+        capacity=settings.USERNAME_FILTER_CAPACITY,
+        error_rate=settings.USERNAME_FILTER_ERROR_RATE,
+    )
+
+
+def get_generation() -> int:
+    """
+    Return the generation of the last logged username, starting the counter if the cache has none.
+    """
+    # Start from the clock so a counter lost from the cache never restarts at a
+    # generation a worker has already seen
+    shared_cache().add(GENERATION_KEY, time.time_ns() // 1000, timeout=None)
+    return shared_cache().get(GENERATION_KEY)
+
+
+def log_username(username: str) -> None:
+    """
+    Append a username to the log replayed by every worker's filter.
+    """
+    get_generation()
+    generation = shared_cache().incr(GENERATION_KEY)
+    shared_cache().set(ENTRY_KEY.format(generation), username, timeout=ENTRY_TIMEOUT)
+
+
+def record_username(username: str) -> None:
+    """
+    Make a new username visible to the filter of this process now, and to every worker once it is committed.
+    """
+    get_username_filter().add(username)
+    transaction.on_commit(lambda: log_username(username))
@@ -0,0 +1,232 @@
+"""
+Pluggable geolocation resolvers for enriching UserIP rows.
+
+Two backends are provided:
+
+- ``IPInfoGeoResolver`` calls the ipinfo.io API. It is slow and blocking, so it
+  is only ever used from background tasks.
+- ``MmapGeoResolver`` reads a compiled range database through ``mmap`` and
+  answers lookups with a binary search, without touching the network. It is
+  cheap enough to run on the request path.
+
+The compiled database is produced from a CSV file with the ``compile_geoip``
+management command. Its layout (all integers big-endian) is::
+
+    header      magic "GEOIPDB1", v4 count, v6 count, location count, string size
+    v4 ranges   start (4 bytes), end (4 bytes), location index (4 bytes)
+    v6 ranges   start (16 bytes), end (16 bytes), location index (4 bytes)
+    locations   string offset (4 bytes), string length (2 bytes)
+    strings     "country\\tregion\\tcity" entries encoded as UTF-8
+
+Ranges are sorted by start address and never overlap. Packed addresses
+compare the same way as the integers they encode, so the search works on raw
+bytes for both IPv4 and IPv6.
+"""
+
+import ipaddress
+import mmap
+import struct
+from functools import lru_cache
+from typing import Dict, Iterable, Tuple, Union
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+from .utils import get_geolocation_data
+
+MAGIC = b"GEOIPDB1"
+HEADER = struct.Struct(">8sIIII")
+LOCATION = struct.Struct(">IH")
+INDEX = struct.Struct(">I")
+ADDRESS_WIDTHS = {4: 4, 6: 16}
+FIELD_SEPARATOR = "\t"
+
+IPAddress = Union[ipaddress.IPv4Address, ipaddress.IPv6Address]
+GeoRange = Tuple[IPAddress, IPAddress, Tuple[str, str, str]]
+
+
+class GeoResolver:
+    """
+    The interface every geolocation backend implements.
+    """
+
+    # True when lookups are local and cheap enough to run on the request path.
+    is_local = False
+
+    def lookup(self, ip_address: str) -> Dict[str, str]:
+        """
+        Return the location of an IP address.
+
+        :param ip_address: The IP address to look up.
+        :return: A dict with "country", "region" and "city" keys, or an empty
+            dict if the address is unknown.
+        """
+        raise NotImplementedError
+
+
+class IPInfoGeoResolver(GeoResolver):
+    """
+    Resolve locations through the ipinfo.io API.
+    """
+
+    def lookup(self, ip_address: str) -> Dict[str, str]:
+        return get_geolocation_data(ip_address)
+
+
+class MmapGeoResolver(GeoResolver):
+    """
+    Resolve locations from a compiled range database mapped into memory.
+
+    The file is mapped read-only once per process and shared between threads.
+    """
+
+    is_local = True
+
+    def __init__(self, path=None):
+        """
+        Map the compiled database into memory.
+        :param path: Path to the compiled database. Defaults to GEOIP_DATABASE_PATH.
+        """
+        path = path or settings.GEOIP_DATABASE_PATH
+        try:
+            with open(path, "rb") as database:
+                self._map = mmap.mmap(database.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            raise ImproperlyConfigured(
+                f"Could not open the GeoIP database at {path}: {e}"
+            ) from e
+
+        magic, v4_count, v6_count, location_count, _ = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ImproperlyConfigured(f"{path} is not a compiled GeoIP database.")
+
+        v4_offset = HEADER.size
+        v6_offset = v4_offset + v4_count * self._record_size(4)
+        locations_offset = v6_offset + v6_count * self._record_size(6)
+        self._tables = {4: (v4_offset, v4_count), 6: (v6_offset, v6_count)}
+        self._locations_offset = locations_offset
+        self._strings_offset = locations_offset + location_count * LOCATION.size
+
+    @staticmethod
+    def _record_size(version: int) -> int:
+        """Return the size in bytes of a range record for an IP version."""
+        return ADDRESS_WIDTHS[version] * 2 + INDEX.size
+
+    def lookup(self, ip_address: str) -> Dict[str, str]:
+        try:
+            address = ipaddress.ip_address(ip_address)
+        except ValueError:
+            return {}
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+
+        location_index = self._find(address.version, address.packed)
+        if location_index is None:
+            return {}
+        return self._location(location_index)
+
+    def _find(self, version: int, key: bytes):
+        """
+        Binary search the ranges of one IP version for the packed address.
+
+        :return: The location index of the matching range, or None.
+        """
+        offset, count = self._tables[version]
+        width = ADDRESS_WIDTHS[version]
+        record_size = self._record_size(version)
+        data = self._map
+
+        # Find the last range whose start is <= key
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            start = offset + middle * record_size
+            end = start + width
+            if data[start:end] <= key:
+                low = middle + 1
+            else:
+                high = middle
+        if low == 0:
+            return None
+
+        last_start = offset + (low - 1) * record_size + width
+        last_end = last_start + width
+        if key > data[last_start:last_end]:
+            return None
+        return INDEX.unpack_from(data, last_end)[0]
+
+    def _location(self, index: int) -> Dict[str, str]:
+        """Decode the location stored at an index of the location table."""
+        string_offset, length = LOCATION.unpack_from(
+            self._map, self._locations_offset + index * LOCATION.size
+        )
+        start = self._strings_offset + string_offset
+        end = start + length
+        country, region, city = self._map[start:end].decode().split(FIELD_SEPARATOR)
+        return {"country": country, "region": region, "city": city}
+
+
+def compile_geoip_database(ranges: Iterable[GeoRange], output_path) -> Dict[int, int]:
+    """
+    Compile IP ranges into the binary format read by MmapGeoResolver.
+
+    :param ranges: (first address, last address, (country, region, city)) tuples.
+    :param output_path: Where to write the compiled database.
+    :return: The number of ranges written per IP version.
+    :raises ValueError: If a range is inverted, mixes IP versions or overlaps another.
+    """
+    tables = {4: [], 6: []}
+    location_indexes = {}
+    strings = bytearray()
+    locations = bytearray()
+
+    for first, last, location in ranges:
+        if first.version != last.version:
+            raise ValueError(f"Range {first}-{last} mixes IP versions.")
+        if first > last:
+            raise ValueError(f"Range {first}-{last} ends before it starts.")
+        if location not in location_indexes:
+            encoded = FIELD_SEPARATOR.join(location).encode()
+            location_indexes[location] = len(location_indexes)
+            locations += LOCATION.pack(len(strings), len(encoded))
+            strings += encoded
+        tables[first.version].append(
+            (first.packed, last.packed, location_indexes[location])
+        )
+
+    for version, records in tables.items():
+        records.sort()
+        for previous, current in zip(records, records[1:]):
+            if current[0] <= previous[1]:
+                raise ValueError(
+                    f"Overlapping IPv{version} ranges starting at "
+                    f"{ipaddress.ip_address(previous[0])} and "
+                    f"{ipaddress.ip_address(current[0])}."
+                )
+
+    with open(output_path, "wb") as output:
+        output.write(
+            HEADER.pack(
+                MAGIC,
+                len(tables[4]),
+                len(tables[6]),
+                len(location_indexes),
+                len(strings),
+            )
+        )
+        for version in (4, 6):
+            for first, last, index in tables[version]:
+                output.write(first + last + INDEX.pack(index))
+        output.write(locations)
+        output.write(strings)
+
+    return {version: len(records) for version, records in tables.items()}
+
+
+@lru_cache(maxsize=None)
+def get_geo_resolver() -> GeoResolver:
+    """
+    Return the resolver configured by GEOIP_RESOLVER, built once per process.
+    """
+    return import_string(settings.GEOIP_RESOLVER)()
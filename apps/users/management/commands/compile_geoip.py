@@ -0,0 +1,75 @@
+import csv
+import ipaddress
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+from apps.users.geoip import compile_geoip_database, FIELD_SEPARATOR
+
+
+class Command(BaseCommand):
+    """
+    A management command to compile a CSV of IP ranges into the binary GeoIP database.
+
+    Each CSV row is either ``start_ip,end_ip,country,region,city`` or
+    ``network,country,region,city`` where network is in CIDR notation (the
+    layout of the MaxMind GeoLite2 CSV once joined with its locations file).
+    A header row is skipped automatically.
+    """
+
+    help = (
+        "Compile a CSV of IP ranges into the binary database read by MmapGeoResolver."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("csv_path", help="Path to the CSV file of IP ranges.")
+        parser.add_argument(
+            "-o",
+            "--output",
+            default=None,
+            help="Where to write the compiled database. Defaults to GEOIP_DATABASE_PATH.",
+        )
+
+    def handle(self, *args, **options):
+        output = options["output"] or settings.GEOIP_DATABASE_PATH
+        try:
+            with open(options["csv_path"], newline="", encoding="utf-8") as csv_file:
+                counts = compile_geoip_database(self.read_ranges(csv_file), output)
+        except OSError as e:
+            raise CommandError(str(e)) from e
+        except ValueError as e:
+            raise CommandError(f"Invalid GeoIP CSV: {e}") from e
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Compiled {counts[4]} IPv4 and {counts[6]} IPv6 ranges into {output}."
+            )
+        )
+
+    def read_ranges(self, csv_file):
+        """
+        Yield (first address, last address, location) tuples from the CSV rows.
+        :param csv_file: An open CSV file.
+        """
+        for line_number, row in enumerate(csv.reader(csv_file), start=1):
+            if not row or row[0].startswith("#"):
+                continue
+            try:
+                if "/" in row[0]:
+                    network = ipaddress.ip_network(row[0].strip(), strict=False)
+                    first, last = network.network_address, network.broadcast_address
+                    location = row[1:4]
+                else:
+                    first = ipaddress.ip_address(row[0].strip())
+                    last = ipaddress.ip_address(row[1].strip())
+                    location = row[2:5]
+            except ValueError as e:
+                if line_number == 1:
+                    continue  # header row
+                raise ValueError(f"line {line_number}: {e}") from e
+
+            location = [
+                value.strip().replace(FIELD_SEPARATOR, " ") for value in location
+            ]
+            location += [""] * (3 - len(location))
+            yield first, last, tuple(location)
@@ -0,0 +1,43 @@
+from django.core.management import BaseCommand
+
+from apps.main.redis_client import get_redis_client
+from apps.users.activity import ActivityDebouncer, with_hit_rate
+
+
+class Command(BaseCommand):
+    """
+    A management command to report how many activity writes the debouncer saved.
+
+    The counters are aggregated in Redis by every worker, so this requires
+    USER_ACTIVITY_DEBOUNCE_SHARED to be enabled.
+    """
+
+    help = "Report the hit rate of the user activity debouncer across all workers."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset", action="store_true", help="Reset the counters after reporting."
+        )
+
+    def handle(self, *args, **options):
+        client = get_redis_client()
+        raw = client.hgetall(ActivityDebouncer.stats_key)
+        stats = with_hit_rate({key.decode(): int(value) for key, value in raw.items()})
+
+        if not stats["total"]:
+            self.stdout.write(
+                "No debouncer statistics yet. Counters are only aggregated when "
+                "USER_ACTIVITY_DEBOUNCE_SHARED is enabled."
+            )
+            return
+
+        self.stdout.write(f"Sightings:        {stats['total']}")
+        self.stdout.write(f"Written:          {stats.get('misses', 0)}")
+        self.stdout.write(f"Skipped (local):  {stats.get('local_hits', 0)}")
+        self.stdout.write(f"Skipped (shared): {stats.get('shared_hits', 0)}")
+        self.stdout.write(
+            self.style.SUCCESS(f"Writes saved:     {stats['hit_rate']:.1%}")
+        )
+
+        if options["reset"]:
+            client.delete(ActivityDebouncer.stats_key)
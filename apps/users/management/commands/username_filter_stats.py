@@ -0,0 +1,53 @@
+import secrets
+
+from django.core.management import BaseCommand
+
+from apps.users.bloom import get_username_filter
+
+
+class Command(BaseCommand):
+    """
+    A management command to report the memory footprint and false positive rate of the username filter.
+
+    The filter is built from the database the same way each worker builds its own.
+    """
+
+    help = "Report the size and false positive rate of the username Bloom filter."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sample",
+            type=int,
+            default=10000,
+            help="Number of random names to test to measure the false positive rate.",
+        )
+
+    def handle(self, *args, **options):
+        username_filter = get_username_filter()
+        stats = username_filter.stats()
+
+        self.stdout.write(f"Usernames:             {stats['count']}")
+        self.stdout.write(f"Capacity:              {stats['capacity']}")
+        self.stdout.write(
+            f"Size:                  {stats['bits']} bits, {stats['hash_count']} hashes"
+        )
+        self.stdout.write(
+            f"Memory:                {stats['memory_bytes'] / 1024:.1f} KiB"
+        )
+        self.stdout.write(
+            f"Configured error rate: {stats['configured_error_rate']:.2%}"
+        )
+        self.stdout.write(f"Expected error rate:   {stats['expected_error_rate']:.2%}")
+
+        sample = options["sample"]
+        if sample > 0:
+            # Random names are all but certain not to exist, so every hit is a false positive
+            hits = sum(
+                username_filter.might_exist(secrets.token_hex(16))
+                for _ in range(sample)
+            )
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Measured error rate:   {hits / sample:.2%} ({hits}/{sample})"
+                )
+            )
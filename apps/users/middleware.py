@@ -1,9 +1,6 @@
-import requests
 from ipware import get_client_ip
-from django.utils import timezone
-
-from .models import UserIP, UserDevice
 
+from .activity import track_activity
 from .utils import get_device_identifier
 
 
@@ -11,6 +8,14 @@ class TrackUserIPAndDeviceMiddleware:
     """
     Middleware to track and record the IP address of authenticated users.
 
+    Geolocation never blocks the request. With a local resolver (see
+    apps.users.geoip) new IP addresses are resolved inline from memory.
+    Otherwise they are recorded without location data and a background task
+    backfills the country, region and city afterwards.
+
+    When USER_ACTIVITY_BUFFER is set the sightings are buffered and written in
+    batches instead of on every request (see apps.users.activity).
+
     Edge Cases:
     - This middleware only tracks authenticated users.
     - Users behind proxies or VPNs may have different or masked IPs.
@@ -31,7 +36,9 @@ class TrackUserIPAndDeviceMiddleware:
         :return:
         """
         response = self.get_response(request)
-        self.process_request(request)
+        # Rate limited requests are rejected without touching the database
+        if not getattr(request, "rate_limited", False):
+            self.process_request(request)
         return response
 
     def process_request(self, request):
@@ -43,34 +50,5 @@ class TrackUserIPAndDeviceMiddleware:
         client_ip, _ = get_client_ip(request)
         device_identifier = get_device_identifier(request)
 
-        if client_ip:
-            geo_data = self.get_geolocation_data(client_ip)
-            UserIP.objects.update_or_create(
-                user=request.user,
-                ip_address=client_ip,
-                defaults={
-                    "last_seen": timezone.now(),
-                    "country": geo_data.get("country", ""),
-                    "region": geo_data.get("region", ""),
-                    "city": geo_data.get("city", ""),
-                },
-            )
-
-        if device_identifier:
-            UserDevice.objects.update_or_create(
-                user=request.user,
-                device_identifier=device_identifier,
-                defaults={"last_seen": timezone.now()},
-            )
-
-    def get_geolocation_data(self, ip):
-        """
-        Get the geolocation data for the given IP address.
-        :param ip:
-        :return:
-        """
-        # Replace with the actual API call
-        response = requests.get(f"https://ipinfo.io/{ip}/json", timeout=120)  # noqa
-        if response.status_code == 200:
-            return response.json()
-        return {}
+        if client_ip or device_identifier:
+            track_activity(request.user.pk, client_ip, device_identifier)
@@ -0,0 +1,108 @@
+# Generated by Django 5.0.14 on 2026-10-16 20:39
+
+import django.utils.timezone
+from django.db import migrations, models
+
+# Merge duplicate rows into the one with the highest id before the unique
+# constraints are added: keep the latest last_seen, any resolved location and
+# the blocked/suspicious flags of every duplicate.
+DEDUPE_USER_IPS = """
+UPDATE users_userip AS keep
+SET last_seen = dup.last_seen,
+    country = COALESCE(keep.country, dup.country),
+    region = COALESCE(keep.region, dup.region),
+    city = COALESCE(keep.city, dup.city),
+    is_blocked = dup.is_blocked,
+    is_suspicious = dup.is_suspicious
+FROM (
+    SELECT user_id, ip_address, MAX(id) AS id, MAX(last_seen) AS last_seen,
+           MAX(country) AS country, MAX(region) AS region, MAX(city) AS city,
+           BOOL_OR(is_blocked) AS is_blocked, BOOL_OR(is_suspicious) AS is_suspicious
+    FROM users_userip
+    GROUP BY user_id, ip_address
+    HAVING COUNT(*) > 1
+) AS dup
+WHERE keep.id = dup.id;
+
+DELETE FROM users_userip AS extra
+USING users_userip AS keep
+WHERE extra.user_id = keep.user_id
+  AND extra.ip_address = keep.ip_address
+  AND extra.id < keep.id;
+"""
+
+DEDUPE_USER_DEVICES = """
+UPDATE users_userdevice AS keep
+SET last_seen = dup.last_seen,
+    is_blocked = dup.is_blocked
+FROM (
+    SELECT user_id, device_identifier, MAX(id) AS id, MAX(last_seen) AS last_seen,
+           BOOL_OR(is_blocked) AS is_blocked
+    FROM users_userdevice
+    GROUP BY user_id, device_identifier
+    HAVING COUNT(*) > 1
+) AS dup
+WHERE keep.id = dup.id;
+
+DELETE FROM users_userdevice AS extra
+USING users_userdevice AS keep
+WHERE extra.user_id = keep.user_id
+  AND extra.device_identifier = keep.device_identifier
+  AND extra.id < keep.id;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0002_user_avatar_userdevice_userip"),
+    ]
+
+    operations = [
+        migrations.RunSQL(DEDUPE_USER_IPS, migrations.RunSQL.noop),
+        migrations.RunSQL(DEDUPE_USER_DEVICES, migrations.RunSQL.noop),
+        migrations.AlterField(
+            model_name="userdevice",
+            name="last_seen",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name="userip",
+            name="last_seen",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name="userdevice",
+            index=models.Index(
+                fields=["user", "-last_seen"], name="userdevice_user_last_seen_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="userdevice",
+            index=models.Index(
+                fields=["device_identifier"], name="userdevice_identifier_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="userip",
+            index=models.Index(
+                fields=["user", "-last_seen"], name="userip_user_last_seen_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="userip",
+            index=models.Index(fields=["ip_address"], name="userip_ip_address_idx"),
+        ),
+        migrations.AddConstraint(
+            model_name="userdevice",
+            constraint=models.UniqueConstraint(
+                fields=("user", "device_identifier"), name="unique_user_device"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="userip",
+            constraint=models.UniqueConstraint(
+                fields=("user", "ip_address"), name="unique_user_ip_address"
+            ),
+        ),
+    ]
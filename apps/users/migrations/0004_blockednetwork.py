@@ -0,0 +1,58 @@
+# Generated by Django 5.0.14 on 2026-10-16 20:42
+
+import apps.users.models
+import django.utils.timezone
+import model_utils.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0003_unique_user_ip_and_device"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BlockedNetwork",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created",
+                    model_utils.fields.AutoCreatedField(
+                        default=django.utils.timezone.now,
+                        editable=False,
+                        verbose_name="created",
+                    ),
+                ),
+                (
+                    "modified",
+                    model_utils.fields.AutoLastModifiedField(
+                        default=django.utils.timezone.now,
+                        editable=False,
+                        verbose_name="modified",
+                    ),
+                ),
+                (
+                    "network",
+                    models.CharField(
+                        max_length=49,
+                        unique=True,
+                        validators=[apps.users.models.validate_network],
+                    ),
+                ),
+                ("reason", models.CharField(blank=True, max_length=255)),
+            ],
+            options={
+                "abstract": False,
+            },
+        ),
+    ]
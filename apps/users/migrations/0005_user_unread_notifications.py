@@ -0,0 +1,33 @@
+# Generated by Django 5.0.14 on 2026-10-16 20:47
+
+from django.db import migrations, models
+
+# Start every counter from the notifications that already exist
+COUNT_UNREAD_NOTIFICATIONS = """
+UPDATE users_user AS u
+SET unread_notifications = unread.count
+FROM (
+    SELECT user_id, COUNT(*) AS count
+    FROM main_notification
+    WHERE NOT is_read
+    GROUP BY user_id
+) AS unread
+WHERE u.id = unread.user_id;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0004_blockednetwork"),
+        ("main", "0011_comment"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="unread_notifications",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunSQL(COUNT_UNREAD_NOTIFICATIONS, migrations.RunSQL.noop),
+    ]
@@ -1,6 +1,11 @@
+import ipaddress
+
 from django.contrib.auth.models import AbstractUser
 from django.contrib.postgres.fields import CIEmailField
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.utils import timezone
+from model_utils.models import TimeStampedModel
 
 from apps.main.mixins import CreateMediaLibraryMixin
 
@@ -11,6 +16,8 @@ class User(CreateMediaLibraryMixin, AbstractUser):
     # override the default email field so that we can make it unique
     email = CIEmailField(max_length=255, unique=True, verbose_name="Email Address")
     avatar = models.ImageField(upload_to="profile_image/", null=True, blank=True)
+    # Kept up to date by the notification signals, see apps.main.signals
+    unread_notifications = models.PositiveIntegerField(default=0, editable=False)
 
     # Add any custom fields for your application here
 
@@ -30,21 +37,85 @@ class User(CreateMediaLibraryMixin, AbstractUser):
         return "https://www.gravatar.com/avatar/"
 
 
-class UserIPManager(models.Manager):
+class TrackedManager(models.Manager):
+    """
+    A manager for models that record when a user was last seen with a value.
+
+    Subclasses set `unique_fields` to the fields of the model's unique constraint.
+    """
+
+    unique_fields = ()
+
+    def bulk_touch(self, objs):
+        """
+        Insert the given rows or, if they already exist, update their last_seen.
+
+        This runs a single INSERT ... ON CONFLICT DO UPDATE statement, so it is
+        idempotent and safe under concurrency. Only last_seen is updated on
+        conflict; every other value of an existing row is kept.
+
+        :param objs: Unsaved model instances. Later duplicates of a key win.
+        :return: The instances, with their primary keys set.
+        """
+        unique_objs = {
+            tuple(
+                getattr(obj, self.model._meta.get_field(name).attname)
+                for name in self.unique_fields
+            ): obj
+            for obj in objs
+        }
+        if not unique_objs:
+            return []
+        return self.bulk_create(
+            list(unique_objs.values()),
+            update_conflicts=True,
+            unique_fields=self.unique_fields,
+            update_fields=["last_seen"],
+        )
+
+
+class FlaggedModelMixin:
+    """
+    A mixin for models with flags that put their rows on the blocklist.
+
+    Subclasses set `flag_fields` to the boolean fields that flag a row.
+    """
+
+    flag_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored flags so saves can tell whether the blocklist changed
+        if all(name in field_names for name in cls.flag_fields):
+            instance._loaded_flagged = instance.is_flagged
+        return instance
+
+    @property
+    def is_flagged(self):
+        """Return whether any flag of the row is set."""
+        return any(getattr(self, name) for name in self.flag_fields)
+
+
+class UserIPManager(TrackedManager):
     """
     A custom manager for the UserIP model.
     """
 
+    unique_fields = ("user", "ip_address")
+
     def is_ip_blocked_or_suspicious(self, ip_address):
         """
-        Check if an IP address is blocked or suspicious.
+        Check if an IP address is blocked, suspicious or in a blocked network.
+
+        The check is answered from the in-memory blocklist of the process.
         :param ip_address:
         :return:
         """
-        return (
-            self.filter(ip_address=ip_address, is_blocked=True).exists()
-            or self.filter(ip_address=ip_address, is_suspicious=True).exists()
-        )
+        # Imported here because the blocklist module imports the models
+        from .blocklist import get_blocklist  # pylint: disable=import-outside-toplevel
+
+        return get_blocklist().is_ip_blocked_or_suspicious(ip_address)
 
     def get_ip_history_for_user(self, user_id):
         """
@@ -55,7 +126,7 @@ class UserIPManager(models.Manager):
         return self.filter(user_id=user_id).order_by("-last_seen")
 
 
-class UserIP(models.Model):
+class UserIP(FlaggedModelMixin, models.Model):
     """
     This Django model stores IP addresses associated with users.
 
@@ -72,30 +143,50 @@ class UserIP(models.Model):
 
     objects = UserIPManager()
 
+    flag_fields = ("is_blocked", "is_suspicious")
+
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="ips")
     ip_address = models.GenericIPAddressField()
-    last_seen = models.DateTimeField(auto_now=True)
+    last_seen = models.DateTimeField(default=timezone.now)
     country = models.CharField(max_length=100, blank=True, null=True)
     region = models.CharField(max_length=100, blank=True, null=True)
     city = models.CharField(max_length=100, blank=True, null=True)
     is_blocked = models.BooleanField(default=False)
     is_suspicious = models.BooleanField(default=False)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "ip_address"], name="unique_user_ip_address"
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["user", "-last_seen"], name="userip_user_last_seen_idx"
+            ),
+            models.Index(fields=["ip_address"], name="userip_ip_address_idx"),
+        ]
 
-class UserDeviceManager(models.Manager):
+
+class UserDeviceManager(TrackedManager):
     """
     A custom manager for the UserDevice model.
     """
 
+    unique_fields = ("user", "device_identifier")
+
     def is_device_blocked(self, device_identifier):
         """
         Check if a device is blocked.
+
+        The check is answered from the in-memory blocklist of the process.
         :param device_identifier:
         :return:
         """
-        return self.filter(
-            device_identifier=device_identifier, is_blocked=True
-        ).exists()
+        # Imported here because the blocklist module imports the models
+        from .blocklist import get_blocklist  # pylint: disable=import-outside-toplevel
+
+        return get_blocklist().is_device_blocked(device_identifier)
 
     def get_device_history_for_user(self, user_id):
         """
@@ -106,14 +197,68 @@ class UserDeviceManager(models.Manager):
         return self.filter(user_id=user_id).order_by("-last_seen")
 
 
-class UserDevice(models.Model):
+class UserDevice(FlaggedModelMixin, models.Model):
     """
     This Django model stores device identifiers associated with users.
     """
 
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="devices")
     device_identifier = models.CharField(max_length=255)
-    last_seen = models.DateTimeField(auto_now=True)
+    last_seen = models.DateTimeField(default=timezone.now)
     is_blocked = models.BooleanField(default=False)
 
     objects = UserDeviceManager()
+
+    flag_fields = ("is_blocked",)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "device_identifier"], name="unique_user_device"
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["user", "-last_seen"], name="userdevice_user_last_seen_idx"
+            ),
+            models.Index(
+                fields=["device_identifier"], name="userdevice_identifier_idx"
+            ),
+        ]
+
+
+def validate_network(value):
+    """
+    Validate an IP address or a network in CIDR notation.
+    :param value:
+    :return:
+    """
+    try:
+        ipaddress.ip_network(value, strict=False)
+    except ValueError as e:
+        raise ValidationError(f"{value} is not a valid IP address or network.") from e
+
+
+class BlockedNetwork(TimeStampedModel, models.Model):
+    """
+    This Django model stores IP networks that are blocked as a whole.
+
+    Attributes:
+        network (str): An IP address or a network in CIDR notation, e.g. 203.0.113.0/24.
+        reason (str): Why the network was blocked.
+
+    Every address in a blocked network is treated like a blocked UserIP.
+    """
+
+    network = models.CharField(
+        max_length=49, unique=True, validators=[validate_network]
+    )
+    reason = models.CharField(max_length=255, blank=True)
+
+    def __str__(self):
+        return self.network
+
+    def save(self, *args, **kwargs):
+        # Store the canonical form so the same network cannot be added twice
+        self.network = str(ipaddress.ip_network(self.network, strict=False))
+        super().save(*args, **kwargs)
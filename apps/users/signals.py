@@ -0,0 +1,69 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .blocklist import invalidate_blocklist
+from .bloom import record_username
+from .models import BlockedNetwork, User, UserDevice, UserIP
+
+
+@receiver(post_save, sender=UserIP)
+@receiver(post_delete, sender=UserIP)
+@receiver(post_save, sender=UserDevice)
+@receiver(post_delete, sender=UserDevice)
+def invalidate_blocklist_on_flag_change(
+    sender, instance, created=False, update_fields=None, **kwargs
+):
+    """
+    Rebuild the blocklist when a flagged IP or device changes.
+
+    Only rows that are flagged, or were flagged when they were loaded, can
+    change the blocklist. Rows whose stored flags are unknown are treated as
+    flagged.
+    :param sender:
+    :param instance:
+    :param created:
+    :param update_fields:
+    :param kwargs:
+    :return:
+    """
+    flagged = instance.is_flagged
+    if created or kwargs.get("signal") is post_delete:
+        if flagged:
+            invalidate_blocklist()
+        instance._loaded_flagged = flagged
+        return
+    if update_fields is not None and not set(instance.flag_fields) & set(update_fields):
+        return
+    was_flagged = getattr(instance, "_loaded_flagged", None)
+    if flagged or was_flagged is not False:
+        invalidate_blocklist()
+    instance._loaded_flagged = flagged
+
+
+@receiver(post_save, sender=BlockedNetwork)
+@receiver(post_delete, sender=BlockedNetwork)
+def invalidate_blocklist_on_network_change(sender, **kwargs):
+    """
+    Rebuild the blocklist when a blocked network is added, changed or removed.
+    :param sender:
+    :param kwargs:
+    :return:
+    """
+    invalidate_blocklist()
+
+
+@receiver(post_save, sender=User)
+def add_username_to_filter(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Add new and renamed usernames to the username filter.
+
+    Saves limited to other fields, like the last_login update on login, are ignored.
+    :param sender:
+    :param instance:
+    :param created:
+    :param update_fields:
+    :param kwargs:
+    :return:
+    """
+    if created or update_fields is None or "username" in update_fields:
+        record_username(instance.username)
@@ -0,0 +1,54 @@
+import logging
+
+import requests
+from celery import shared_task
+
+from .geoip import get_geo_resolver
+from .models import UserIP
+
+logger = logging.getLogger("celery")
+
+
+@shared_task(
+    autoretry_for=(requests.RequestException,),
+    retry_backoff=True,
+    max_retries=3,
+)
+def resolve_ip_geolocation(ip_address: str) -> bool:
+    """
+    A Celery task to backfill the geolocation of every UserIP using an IP address.
+
+    Only rows that have never been resolved (country is NULL) are updated, so
+    enqueueing the same address more than once is harmless.
+
+    :param ip_address: The IP address to resolve.
+    :return: True if any rows were updated, False otherwise.
+    """
+    pending = UserIP.objects.filter(ip_address=ip_address, country__isnull=True)
+    if not pending.exists():
+        return False
+
+    geo_data = get_geo_resolver().lookup(ip_address)
+    updated = pending.update(
+        country=geo_data.get("country", ""),
+        region=geo_data.get("region", ""),
+        city=geo_data.get("city", ""),
+    )
+    logger.info("Resolved geolocation for %s (%s rows)", ip_address, updated)
+    return updated > 0
+
+
+@shared_task
+def flush_user_activity() -> int:
+    """
+    A periodic Celery task to write buffered user activity to the database.
+
+    :return: The number of buffered entries written.
+    """
+    # Imported here because the activity module enqueues tasks from this module
+    from .activity import get_activity_buffer  # pylint: disable=import-outside-toplevel
+
+    buffer = get_activity_buffer()
+    if buffer is None:
+        return 0
+    return buffer.flush()
@@ -1,11 +1,13 @@
 import hashlib
 
+import requests
 from django.conf import settings
 from django.contrib.auth import get_user_model
 
 from apps.main.tasks import send_email_task
 
 
+from .blocklist import invalidate_blocklist
 from .models import UserDevice, UserIP
 
 
@@ -28,10 +30,11 @@ def block_user_and_devices(user_id):
     # Block all devices associated with the user
     UserDevice.objects.filter(user_id=user_id).update(is_blocked=True)
 
-    # Handle IPs used by the user
-    user_ips = UserIP.objects.filter(user=user_id)
-    for ip in user_ips:
-        mark_ip_as_suspicious(ip.ip_address)
+    # Mark the IPs used by the user as suspicious, for every user of those IPs
+    UserIP.objects.filter(
+        ip_address__in=UserIP.objects.filter(user=user_id).values("ip_address")
+    ).update(is_suspicious=True)
+    invalidate_blocklist()
 
     # Send email to user that they are blocked
     send_email_task.delay(
@@ -53,6 +56,7 @@ def mark_ip_as_suspicious(ip_address):
     None
     """
     UserIP.objects.filter(ip_address=ip_address).update(is_suspicious=True)
+    invalidate_blocklist()
 
 
 def block_ip(ip_address):
@@ -66,6 +70,7 @@ def block_ip(ip_address):
     None
     """
     UserIP.objects.filter(ip_address=ip_address).update(is_blocked=True)
+    invalidate_blocklist()
 
 
 def get_device_identifier(request):
@@ -89,3 +94,23 @@ def get_device_identifier(request):
     hashed_string = hashlib.sha256(raw_string.encode()).hexdigest()
 
     return hashed_string
+
+
+def get_geolocation_data(ip_address):
+    """
+    Get the geolocation data for the given IP address.
+
+    This performs a blocking network call, so it should only be used from
+    background tasks and never on the request path.
+
+    Args:
+    ip_address (str): The IP address to look up.
+
+    Returns:
+    dict: The geolocation data, or an empty dict if the lookup failed.
+    """
+    # Replace with the actual API call
+    response = requests.get(f"https://ipinfo.io/{ip_address}/json", timeout=120)  # noqa
+    if response.status_code == 200:
+        return response.json()
+    return {}
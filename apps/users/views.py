@@ -11,8 +11,12 @@ from django.contrib.auth.views import (
 )
 from ipware import get_client_ip
 
+from apps.main.ratelimit import rate_limit
+
+from .blocklist import get_blocklist
+from .bloom import get_username_filter
 from .forms import UserCreationForm
-from .models import UserIP, UserDevice, User
+from .models import User
 from .utils import get_device_identifier
 
 
@@ -57,12 +61,11 @@ class RegisterView(TemplateView):
         ip_address, _ = get_client_ip(request)
         device_identifier = get_device_identifier(request)
 
-        ip_blocked_or_suspicious = UserIP.objects.is_ip_blocked_or_suspicious(
+        # Both checks are answered from memory, without querying the database
+        blocklist = get_blocklist()
+        return blocklist.is_ip_blocked_or_suspicious(
             ip_address
-        )
-        device_blocked = UserDevice.objects.is_device_blocked(device_identifier)
-
-        return ip_blocked_or_suspicious or device_blocked
+        ) or blocklist.is_device_blocked(device_identifier)
 
     def get_context_data(self, **kwargs):
         """
@@ -137,13 +140,29 @@ class PasswordResetConfirmView(BasePasswordResetConfirmView):
         context["token"] = self.kwargs["token"]
         return context
 
+    def form_valid(self, form):
+        """
+        Overriding the default form_valid method to save the current unread notification counter
+        :param form:
+        :return:
+        """
+        form.user.refresh_from_db(fields=["unread_notifications"])
+        return super().form_valid(form)
+
 
+@rate_limit("check_username")
 def check_username(request):
     """
     Handles POST requests to check username availability, returning an HTML snippet.
+
+    Names that the username filter has never seen are available without a
+    query; only probable matches are confirmed against the database.
     """
     username = request.POST.get("username", "")
-    if User.objects.filter(username=username).exists():
+    if (
+        get_username_filter().might_exist(username)
+        and User.objects.filter(username=username).exists()
+    ):
         message = '<div class="text-red-500">That username is taken.</div>'
     else:
         message = '<div class="text-green-500">That username is available.</div>'
@@ -0,0 +1,38 @@
+"""
+Benchmarks of the hot paths of the project.
+
+Each benchmark is a script that sets Django up with the test settings and
+works in a throwaway copy of the test database:
+
+    python -m benchmarks.<name> --help
+"""
+
+import os
+from contextlib import contextmanager
+
+import django
+
+
+def setup_django() -> None:
+    """
+    Configure Django with the test settings, whose apps the factories need.
+    """
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "tests.settings")
+    django.setup()
+
+
+@contextmanager
+def test_database(keepdb: bool = False):
+    """
+    Create the test database for the duration of the context, and destroy it after unless keepdb is set.
+    """
+    # Imported here because Django has to be set up first
+    from django.db import connection  # pylint: disable=import-outside-toplevel
+
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, keepdb=keepdb, serialize=False)
+    try:
+        yield
+    finally:
+        if not keepdb:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
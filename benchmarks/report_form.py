@@ -0,0 +1,86 @@
+"""
+Benchmark the render time of pages without a report button, with an eager and a lazy report_form.
+
+Renders --template for an anonymous user --renders times with the
+report_form context processor building a ReportForm for every render, as it
+used to, and then with the lazy processor, which only builds it for the
+templates that use it:
+
+    python -m benchmarks.report_form --template main/home.html
+"""
+
+import argparse
+import copy
+import statistics
+import time
+
+from benchmarks import setup_django, test_database
+
+REPORT_FORM_PROCESSOR = "apps.main.context_processors.report_form"
+
+
+def eager_report_form(request):
+    """
+    The report_form context processor as it was, building the form for every render.
+    """
+    # Imported here because the forms need Django to be set up
+    from apps.main.forms import ReportForm  # pylint: disable=import-outside-toplevel
+
+    return {"report_form": ReportForm()}
+
+
+def time_renders(template: str, renders: int) -> list:
+    """
+    Render a template for an anonymous user and return the duration of each render in ms.
+    """
+    # Imported here because Django has to be set up first
+    # pylint: disable=import-outside-toplevel
+    from django.contrib.auth.models import AnonymousUser
+    from django.template.loader import render_to_string
+    from django.test import RequestFactory
+
+    request = RequestFactory().get("/")
+    request.user = AnonymousUser()
+    # Warm up the template loaders and caches
+    render_to_string(template, request=request)
+
+    durations = []
+    for _ in range(renders):
+        start = time.perf_counter()
+        render_to_string(template, request=request)
+        durations.append((time.perf_counter() - start) * 1000)
+    return durations
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--template", default="main/home.html")
+    parser.add_argument("--renders", type=int, default=2000)
+    args = parser.parse_args()
+
+    setup_django()
+    # Imported here because Django has to be set up first
+    # pylint: disable=import-outside-toplevel
+    from django.conf import settings
+    from django.test import override_settings
+
+    templates = copy.deepcopy(settings.TEMPLATES)
+    processors = templates[0]["OPTIONS"]["context_processors"]
+    processors[processors.index(REPORT_FORM_PROCESSOR)] = (
+        f"{__name__}.eager_report_form"
+    )
+
+    with test_database():
+        with override_settings(TEMPLATES=templates):
+            eager = time_renders(args.template, args.renders)
+        lazy = time_renders(args.template, args.renders)
+
+    for label, durations in (("Eager report_form", eager), ("Lazy report_form", lazy)):
+        print(
+            f"{label}: median {statistics.median(durations):.3f} ms, "
+            f"mean {statistics.mean(durations):.3f} ms over {len(durations)} renders"
+        )
+
+
+if __name__ == "__main__":
+    main()
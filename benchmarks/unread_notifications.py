@@ -0,0 +1,157 @@
+"""
+Benchmark the unread notifications query with and without notification_unread_user_idx.
+
+Fills a throwaway test database with --rows notifications spread over
+--users users, built from the test factories, a fraction --unread-ratio of
+them unread. It then prints the plan and the timings of the dropdown query
+(a user's latest unread notifications), first with the partial index
+dropped and then with it:
+
+    python -m benchmarks.unread_notifications --rows 10000000
+
+Generating 10M rows takes a few minutes; --keepdb reuses them on the next run.
+"""
+
+import argparse
+import random
+import statistics
+import time
+from typing import List
+
+from benchmarks import setup_django, test_database
+
+INDEX_NAME = "notification_unread_user_idx"
+
+INSERT_NOTIFICATIONS = """
+INSERT INTO main_notification
+    (user_id, title, message, link, type, is_read, created_at, updated_at)
+SELECT
+    (%(user_ids)s::bigint[])[1 + floor(random() * %(users)s)::int],
+    %(title)s, %(message)s, %(link)s, %(type)s,
+    random() >= %(unread_ratio)s,
+    now() - random() * interval '365 days',
+    now()
+FROM generate_series(1, %(count)s)
+"""
+
+
+def populate(users: int, rows: int, unread_ratio: float, chunk_size: int) -> None:
+    """
+    Create the users with the user factory, then the notifications in chunks of generated rows.
+    """
+    # Imported here because the factories need Django to be set up
+    # pylint: disable=import-outside-toplevel
+    from django.contrib.auth import get_user_model
+    from django.db import connection
+
+    from tests.factories.main import NotificationFactory
+    from tests.factories.users import UserFactory
+
+    user_model = get_user_model()
+    user_model.objects.bulk_create(
+        [
+            UserFactory.build(
+                username=f"benchmark{n}", email=f"benchmark{n}@example.com"
+            )
+            for n in range(users)
+        ],
+        batch_size=5000,
+    )
+    user_ids = list(user_model.objects.values_list("pk", flat=True))
+
+    template = NotificationFactory.build()
+    inserted = 0
+    with connection.cursor() as cursor:
+        while inserted < rows:
+            count = min(chunk_size, rows - inserted)
+            cursor.execute(
+                INSERT_NOTIFICATIONS,
+                {
+                    "user_ids": user_ids,
+                    "users": len(user_ids),
+                    "title": template.title,
+                    "message": template.message,
+                    "link": template.link,
+                    "type": template.type,
+                    "unread_ratio": unread_ratio,
+                    "count": count,
+                },
+            )
+            inserted += count
+            print(f"Inserted {inserted}/{rows} notifications")
+        cursor.execute("ANALYZE main_notification")
+
+
+def dropdown_query(user_id: int):
+    """
+    The query of the notifications dropdown, as the context processor runs it.
+    """
+    # Imported here because the models need Django to be set up
+    # pylint: disable=import-outside-toplevel
+    from django.conf import settings
+
+    from apps.main.models import Notification
+
+    return (
+        Notification.objects.filter(user_id=user_id)
+        .unread()
+        .for_dropdown()[: settings.NOTIFICATION_DROPDOWN_LIMIT]
+    )
+
+
+def report(label: str, user_ids: List[int], samples: int) -> None:
+    """
+    Print the plan of the query for one user and its timings over a sample of users.
+    """
+    print(f"\n=== {label} ===")
+    print(dropdown_query(user_ids[0]).explain(analyze=True, buffers=True))
+    durations = []
+    for user_id in random.sample(user_ids, min(samples, len(user_ids))):
+        start = time.perf_counter()
+        list(dropdown_query(user_id))
+        durations.append((time.perf_counter() - start) * 1000)
+    durations.sort()
+    print(
+        f"{len(durations)} queries: median {statistics.median(durations):.2f} ms, "
+        f"p95 {durations[int(len(durations) * 0.95) - 1]:.2f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--unread-ratio", type=float, default=0.05)
+    parser.add_argument("--chunk-size", type=int, default=1_000_000)
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument(
+        "--keepdb", action="store_true", help="Keep the database and its rows."
+    )
+    args = parser.parse_args()
+
+    setup_django()
+    # Imported here because Django has to be set up first
+    # pylint: disable=import-outside-toplevel
+    from django.contrib.auth import get_user_model
+    from django.db import connection, transaction
+
+    with test_database(args.keepdb):
+        user_model = get_user_model()
+        if not user_model.objects.filter(username__startswith="benchmark").exists():
+            populate(args.users, args.rows, args.unread_ratio, args.chunk_size)
+        user_ids = list(
+            user_model.objects.filter(username__startswith="benchmark").values_list(
+                "pk", flat=True
+            )
+        )
+
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(f"DROP INDEX {INDEX_NAME}")
+            report(f"Without {INDEX_NAME}", user_ids, args.samples)
+            transaction.set_rollback(True)
+        report(f"With {INDEX_NAME}", user_ids, args.samples)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
 import os
+import uuid
 from pathlib import Path
 
 
@@ -65,6 +66,7 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "apps.main.ratelimit.RateLimitMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "waffle.middleware.WaffleMiddleware",
@@ -242,11 +244,170 @@ LOGIN_URL = "login"
 REDIS_HOST = os.getenv("REDIS_HOST")
 REDIS_PORT = int(os.getenv("REDIS_PORT"))
 
+# Redis database for application data, kept apart from the Celery broker
+REDIS_URL = os.getenv("REDIS_URL", f"redis://{REDIS_HOST}:{REDIS_PORT}/1")
+
+# Cache: a small LRU in each process (L1) in front of Redis (L2), shared by all the
+# workers. L1 keeps values for at most CACHE_L1_TIMEOUT seconds; writes publish the
+# changed keys so the other workers evict them from their L1 right away.
+CACHE_URL = os.getenv("CACHE_URL", f"redis://{REDIS_HOST}:{REDIS_PORT}/2")
+CACHES = {
+    "default": {
+        "BACKEND": "apps.main.cache_backends.TieredCache",
+        "LOCATION": "tiered",
+        "OPTIONS": {
+            "L2": "shared",
+            "L1_MAX_ENTRIES": int(os.getenv("CACHE_L1_MAX_ENTRIES", "1000")),
+            "L1_TIMEOUT": float(os.getenv("CACHE_L1_TIMEOUT", "5")),
+            "INVALIDATION_URL": CACHE_URL,
+        },
+    },
+    "shared": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": CACHE_URL,
+    },
+}
+
 # settings.py
 CELERY_BROKER_URL = f"redis://{REDIS_HOST}:{REDIS_PORT}/0"
 CELERY_RESULT_BACKEND = "django-db"
 CELERY_RESULT_EXTENDED = True  # needed for django-celery results
 
+# Geolocation settings for tracked user IPs.
+# Use "apps.users.geoip.MmapGeoResolver" with a database built by the compile_geoip
+# command to resolve locations offline, on the request path.
+GEOIP_RESOLVER = os.getenv("GEOIP_RESOLVER", "apps.users.geoip.IPInfoGeoResolver")
+GEOIP_DATABASE_PATH = os.getenv("GEOIP_DATABASE_PATH", BASE_DIR / "geoip.bin")
+
+# Write-behind buffering of user IP/device "last seen" updates.
+# Empty writes on every request. Otherwise one of:
+# - "apps.users.activity.LocalActivityBuffer": per process, flushed by a background thread of each web worker
+# - "apps.users.activity.RedisActivityBuffer": shared, flushed by the flush-user-activity task
+USER_ACTIVITY_BUFFER = os.getenv("USER_ACTIVITY_BUFFER", "")
+USER_ACTIVITY_BUFFER_MAX_SIZE = int(os.getenv("USER_ACTIVITY_BUFFER_MAX_SIZE", "1000"))
+USER_ACTIVITY_FLUSH_INTERVAL = float(os.getenv("USER_ACTIVITY_FLUSH_INTERVAL", "30"))
+
+# Skip "last seen" writes for a (user, ip, device) recorded within the interval (seconds).
+# Set the interval to 0 to record every request. USER_ACTIVITY_DEBOUNCE_SHARED also
+# shares the recorded keys between workers through Redis.
+USER_ACTIVITY_DEBOUNCE_INTERVAL = float(
+    os.getenv("USER_ACTIVITY_DEBOUNCE_INTERVAL", "300")
+)
+USER_ACTIVITY_DEBOUNCE_MAX_SIZE = int(
+    os.getenv("USER_ACTIVITY_DEBOUNCE_MAX_SIZE", "10000")
+)
+USER_ACTIVITY_DEBOUNCE_SHARED = (
+    os.getenv("USER_ACTIVITY_DEBOUNCE_SHARED", "FALSE").upper() == "TRUE"
+)
+
+# Seconds between checks of the shared blocklist version by each worker. Blocklist
+# changes made by other workers are picked up within this delay.
+USER_BLOCKLIST_CHECK_INTERVAL = float(os.getenv("USER_BLOCKLIST_CHECK_INTERVAL", "5"))
+
+# Sizing of the per-worker Bloom filter that answers username availability checks.
+# The filter grows to twice the number of users when that is larger than the capacity.
+USERNAME_FILTER_CAPACITY = int(os.getenv("USERNAME_FILTER_CAPACITY", "100000"))
+USERNAME_FILTER_ERROR_RATE = float(os.getenv("USERNAME_FILTER_ERROR_RATE", "0.01"))
+
+# Part of the keys of the cached template fragments (navbar, footer, meta tags). Set
+# it to the release, e.g. the git commit, so a deploy renders them again. By default
+# every process uses its own, which also works but renders them once per process.
+SITE_VERSION = os.getenv("SITE_VERSION") or uuid.uuid4().hex
+
+# Seconds the values of rarely changing models are cached by apps.main.model_cache. They are
+# invalidated whenever the models change, so by default they are kept until evicted.
+MODEL_CACHE_TIMEOUT = (
+    int(os.getenv("MODEL_CACHE_TIMEOUT")) if os.getenv("MODEL_CACHE_TIMEOUT") else None
+)
+
+# Seconds the results of an FAQ search are cached. Searches are chosen by clients, so
+# unlike the FAQ list they must expire.
+FAQ_SEARCH_CACHE_TIMEOUT = int(os.getenv("FAQ_SEARCH_CACHE_TIMEOUT", "300"))
+
+# Number of unread notifications listed in the navbar dropdown.
+NOTIFICATION_DROPDOWN_LIMIT = int(os.getenv("NOTIFICATION_DROPDOWN_LIMIT", "10"))
+
+# Notification broadcasts are delivered in chunks of users. Audiences of at least
+# NOTIFICATION_BROADCAST_COPY_THRESHOLD users are written with Postgres COPY instead
+# of bulk_create. Running broadcasts without progress for
+# NOTIFICATION_BROADCAST_STALL_TIMEOUT seconds are restarted.
+NOTIFICATION_BROADCAST_CHUNK_SIZE = int(
+    os.getenv("NOTIFICATION_BROADCAST_CHUNK_SIZE", "5000")
+)
+NOTIFICATION_BROADCAST_COPY_THRESHOLD = int(
+    os.getenv("NOTIFICATION_BROADCAST_COPY_THRESHOLD", "50000")
+)
+NOTIFICATION_BROADCAST_STALL_TIMEOUT = int(
+    os.getenv("NOTIFICATION_BROADCAST_STALL_TIMEOUT", "600")
+)
+
+# Offer the live notification stream. Only enable it when the project is served by an
+# ASGI server: under WSGI every open stream holds a worker thread and sends nothing.
+NOTIFICATION_STREAM_ENABLED = (
+    os.getenv("NOTIFICATION_STREAM_ENABLED", "FALSE").upper() == "TRUE"
+)
+
+# Seconds of silence after which a notification stream sends a keepalive comment,
+# so proxies do not close idle connections.
+NOTIFICATION_STREAM_KEEPALIVE = float(os.getenv("NOTIFICATION_STREAM_KEEPALIVE", "15"))
+
+# Retention of notifications. Read notifications older than NOTIFICATION_RETENTION_DAYS
+# and unread ones older than NOTIFICATION_UNREAD_RETENTION_DAYS are moved to
+# ArchivedNotification, or deleted when NOTIFICATION_ARCHIVE is off. 0 keeps them forever.
+# Each daily run purges at most NOTIFICATION_RETENTION_MAX_BATCHES batches of
+# NOTIFICATION_RETENTION_BATCH_SIZE rows and continues on the next run.
+NOTIFICATION_RETENTION_DAYS = int(os.getenv("NOTIFICATION_RETENTION_DAYS", "90"))
+NOTIFICATION_UNREAD_RETENTION_DAYS = int(
+    os.getenv("NOTIFICATION_UNREAD_RETENTION_DAYS", "365")
+)
+NOTIFICATION_ARCHIVE = os.getenv("NOTIFICATION_ARCHIVE", "TRUE").upper() == "TRUE"
+NOTIFICATION_RETENTION_BATCH_SIZE = int(
+    os.getenv("NOTIFICATION_RETENTION_BATCH_SIZE", "5000")
+)
+NOTIFICATION_RETENTION_MAX_BATCHES = int(
+    os.getenv("NOTIFICATION_RETENTION_MAX_BATCHES", "100")
+)
+
+# Once the notifications table is partitioned with the partition_notifications
+# command, the purge task keeps NOTIFICATION_PARTITIONS_AHEAD future months
+# created and drops the empty past ones.
+NOTIFICATION_PARTITIONS_AHEAD = int(os.getenv("NOTIFICATION_PARTITIONS_AHEAD", "3"))
+
+# The models users can report, as "app_label.model".
+REPORTABLE_MODELS = ["main.comment", "main.notification", "users.user"]
+
+# Moderation actions of apps.main.reports, queued once for an object when this many
+# distinct users have reported it.
+REPORT_MODERATION_THRESHOLDS = {
+    "notify_moderators": int(os.getenv("REPORT_NOTIFY_MODERATORS_THRESHOLD", "3")),
+}
+
+# Rate limits of the views decorated with apps.main.ratelimit.rate_limit, per client IP
+# and per signed in user: `burst` requests at once, refilled at `rate` ("count/s|m|h|d").
+# RATELIMIT_STORAGE "local" keeps the buckets in each process instead of Redis.
+RATELIMIT_STORAGE = os.getenv("RATELIMIT_STORAGE", "redis")
+RATELIMITS = {
+    "report": {"rate": "10/h", "burst": 5, "methods": ["POST"]},
+    "contact": {"rate": "5/h", "burst": 3, "methods": ["POST"]},
+    "check_username": {"rate": "30/m", "burst": 20, "methods": ["POST"]},
+}
+
+# Periodic tasks. The beat scheduler copies these into django-celery-beat on start.
+CELERY_BEAT_SCHEDULE = {
+    "flush-user-activity": {
+        "task": "apps.users.tasks.flush_user_activity",
+        "schedule": USER_ACTIVITY_FLUSH_INTERVAL,
+    },
+    "resume-notification-broadcasts": {
+        "task": "apps.main.tasks.resume_notification_broadcasts",
+        "schedule": 300,
+    },
+    "purge-notifications": {
+        "task": "apps.main.tasks.purge_notifications",
+        "schedule": 24 * 60 * 60,
+    },
+}
+
 # Google Captcha Settings
 RECAPTCHA_PRIVATE_KEY = os.getenv("RECAPTCHA_PRIVATE_KEY")
 RECAPTCHA_PUBLIC_KEY = os.getenv("RECAPTCHA_PUBLIC_KEY")
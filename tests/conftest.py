@@ -0,0 +1,27 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def reset_process_state():
+    """
+    Clear per-process state that would outlive the database rollback of a test.
+    """
+    yield
+    # Imported here so Django is configured first
+    from django.core.cache import cache  # pylint: disable=import-outside-toplevel
+
+    from apps.users.blocklist import (  # pylint: disable=import-outside-toplevel
+        reset_blocklist,
+    )
+    from apps.users.bloom import (  # pylint: disable=import-outside-toplevel
+        get_username_filter,
+    )
+
+    from apps.main.ratelimit import (  # pylint: disable=import-outside-toplevel
+        reset_local_buckets,
+    )
+
+    cache.clear()
+    reset_local_buckets()
+    reset_blocklist()
+    get_username_filter.cache_clear()
@@ -3,7 +3,12 @@ from django.contrib.contenttypes.models import ContentType
 from django.utils import timezone
 
 from apps.main.consts import ContactStatus
-from apps.main.models import Notification, Contact, SocialMediaLink
+from apps.main.models import (
+    Notification,
+    NotificationBroadcast,
+    Contact,
+    SocialMediaLink,
+)
 from tests.factories.dummy import DummyFactory
 from tests.factories.users import UserFactory
 from tests.test_app.models import Dummy
@@ -38,6 +43,20 @@ class NotificationFactory(factory.django.DjangoModelFactory):
     type = "info"
 
 
+class NotificationBroadcastFactory(factory.django.DjangoModelFactory):
+    """
+    A factory for creating notification broadcasts
+    """
+
+    class Meta:
+        model = NotificationBroadcast
+
+    title = factory.Faker("sentence")
+    message = factory.Faker("paragraph")
+    link = factory.Faker("url")
+    type = "info"
+
+
 class ContactFactory(factory.django.DjangoModelFactory):
     """
     Factory for creating instances of the Contact model for testing.
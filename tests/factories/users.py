@@ -29,6 +29,7 @@ class UserIPFactory(factory.django.DjangoModelFactory):
 
     user = factory.SubFactory(UserFactory)
     ip_address = factory.Sequence(lambda n: f"192.168.1.{n}")
+    country = factory.Sequence(lambda n: f"Country{n}")
     region = factory.Sequence(lambda n: f"Region{n}")
     city = factory.Sequence(lambda n: f"City{n}")
     is_suspicious = False
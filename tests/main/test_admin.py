@@ -1,29 +1,40 @@
 from unittest.mock import patch
 
+from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.messages import get_messages
 from django.http import HttpRequest
+from django.db import connection
 from django.test import TestCase, RequestFactory
+from django.test.utils import CaptureQueriesContext
 from django.contrib.admin.sites import AdminSite
 from django.urls import reverse
 from django.utils import timezone
 
-from apps.main.consts import ContactStatus
+from apps.main.consts import BroadcastStatus, ContactStatus
 from apps.main.models import (
     TermsAndConditions,
     AuditLogConfig,
     Contact,
     Report,
     Comment,
+    NotificationBroadcast,
 )
 from apps.main.admin import (
+    prefetch_generic_objects,
     AuditLogConfigAdmin,
     ContactAdmin,
     TermsAndConditionsAdmin,
     ReportAdmin,
     CommentAdmin,
+    NotificationBroadcastAdmin,
+)
+from tests.factories.main import (
+    ContactFactory,
+    ReportFactory,
+    CommentFactory,
+    NotificationBroadcastFactory,
 )
-from tests.factories.main import ContactFactory, ReportFactory, CommentFactory
 from tests.factories.users import UserFactory
 
 
@@ -352,6 +363,80 @@ class ReportAdminTest(TestCase):
         self.assertEqual(result, "Object does not exist")
 
 
+class GenericObjectLinkMixinTest(TestCase):
+    """
+    Test the batched links of the Report and Comment changelists.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(UserFactory(is_staff=True, is_superuser=True))
+        self.user_type = ContentType.objects.get_for_model(get_user_model())
+        self.comment_type = ContentType.objects.get_for_model(Comment)
+        # The first request records the IP and device of the user
+        self.client.get(reverse("admin:index"))
+
+    def create_reports(self, count: int) -> None:
+        for _ in range(count):
+            user = UserFactory()
+            comment = CommentFactory(
+                content_type=self.user_type, object_id=user.pk, user=user
+            )
+            ReportFactory(content_type=self.user_type, object_id=user.pk)
+            ReportFactory(content_type=self.comment_type, object_id=comment.pk)
+
+    def count_queries(self, url: str) -> int:
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        """
+        Test that a changelist page runs as many queries for 2 rows as for 20.
+        """
+        for view_name in (
+            "admin:main_report_changelist",
+            "admin:main_comment_changelist",
+        ):
+            with self.subTest(view_name=view_name):
+                self.create_reports(1)
+                few = self.count_queries(reverse(view_name))
+                self.create_reports(9)
+                self.assertEqual(self.count_queries(reverse(view_name)), few)
+
+    def test_links(self):
+        """
+        Test that the changelist links each object, and shows deleted objects as missing.
+        """
+        user = UserFactory()
+        comment = CommentFactory(content_type=self.user_type, object_id=user.pk)
+        ReportFactory(content_type=self.comment_type, object_id=comment.pk)
+        ReportFactory(content_type=self.user_type, object_id=999999)
+
+        response = self.client.get(reverse("admin:main_report_changelist"))
+
+        self.assertContains(
+            response,
+            f'<a href="{reverse("admin:main_comment_change", args=[comment.pk])}">{comment}</a>',
+            html=True,
+        )
+        self.assertContains(response, "Object does not exist")
+
+    def test_prefetch_generic_objects(self):
+        """
+        Test that the objects are fetched with one query per content type and cached on their rows.
+        """
+        user = UserFactory()
+        comment = CommentFactory(content_type=self.user_type, object_id=user.pk)
+        ReportFactory(content_type=self.user_type, object_id=user.pk)
+        ReportFactory(content_type=self.comment_type, object_id=comment.pk)
+
+        with self.assertNumQueries(3):
+            reports = prefetch_generic_objects(Report.objects.order_by("pk"))
+        with self.assertNumQueries(0):
+            self.assertEqual([r.content_object for r in reports], [user, comment])
+
+
 class CommentAdminTest(TestCase):
     """
     Test suite for the ContactAdmin class.
@@ -416,3 +501,64 @@ class CommentAdminTest(TestCase):
         result = comment_admin.content_object_link(comment)
 
         self.assertEqual(result, "Object does not exist")
+
+
+class NotificationBroadcastAdminTest(TestCase):
+    """
+    Test suite for the NotificationBroadcastAdmin class.
+    """
+
+    def setUp(self):
+        """
+        Set up the test suite.
+        :return:
+        """
+        super().setUp()
+        self.admin = NotificationBroadcastAdmin(NotificationBroadcast, AdminSite())
+        self.request = RequestFactory().post("/fake-url")
+        self.request.user = UserFactory(is_superuser=True)
+
+    def test_delivery_progress(self):
+        """
+        Test that the progress shows the notified users out of the audience.
+        :return:
+        """
+        broadcast = NotificationBroadcastFactory(total=200, sent=50)
+        self.assertEqual(self.admin.delivery_progress(broadcast), "50 / 200 (25%)")
+        self.assertEqual(
+            self.admin.delivery_progress(NotificationBroadcastFactory()), "-"
+        )
+
+    @patch("apps.main.tasks.send_notification_broadcast.delay")
+    def test_save_model_starts_new_broadcasts(self, mock_delay):
+        """
+        Test that saving a new broadcast queues its delivery, and saving it again does not.
+        :return:
+        """
+        broadcast = NotificationBroadcastFactory.build()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.admin.save_model(self.request, broadcast, None, change=False)
+            self.admin.save_model(self.request, broadcast, None, change=True)
+        mock_delay.assert_called_once_with(broadcast.pk)
+
+    @patch("apps.main.admin.NotificationBroadcastAdmin.message_user")
+    @patch("apps.main.tasks.send_notification_broadcast.delay")
+    def test_resume_broadcasts(self, mock_delay, mock_message_user):
+        """
+        Test that failed broadcasts are resumed and completed ones are left alone.
+        :return:
+        """
+        failed = NotificationBroadcastFactory(
+            status=BroadcastStatus.FAILED.value, error="boom"
+        )
+        NotificationBroadcastFactory(status=BroadcastStatus.COMPLETED.value)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.admin.resume_broadcasts(
+                self.request, NotificationBroadcast.objects.all()
+            )
+
+        failed.refresh_from_db()
+        self.assertEqual(failed.status, BroadcastStatus.RUNNING.value)
+        self.assertEqual(failed.error, "")
+        mock_delay.assert_called_once_with(failed.pk)
@@ -0,0 +1,160 @@
+import json
+from unittest import mock
+
+import redis
+from django.core.cache import caches
+from django.test import SimpleTestCase
+
+from apps.main import cache_backends
+from apps.main.cache_backends import InvalidationListener, TieredCache
+
+
+class TieredCacheTestCase(SimpleTestCase):
+    """
+    Test the two-tier cache backend, over the local memory cache of the test settings.
+    """
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.cache = self.make_cache()
+        self.l2 = caches["shared"]
+        self.l2.clear()
+
+    def tearDown(self) -> None:
+        cache_backends._stores.pop("test-tiered", None)
+        super().tearDown()
+
+    def make_cache(self, **options) -> TieredCache:
+        options = {"L2": "shared", "L1_MAX_ENTRIES": 2, "L1_TIMEOUT": 5, **options}
+        return TieredCache("test-tiered", {"OPTIONS": options})
+
+    def test_l2_hits_are_kept_locally(self):
+        """
+        Test that a value read from L2 is then served from L1, and the hits are counted per tier.
+        """
+        self.l2.set("key", "value")
+
+        self.assertEqual(self.cache.get("key"), "value")
+        with mock.patch.object(self.l2, "get") as l2_get:
+            self.assertEqual(self.cache.get("key"), "value")
+        l2_get.assert_not_called()
+        self.assertIsNone(self.cache.get("missing"))
+
+        stats = self.cache.stats()
+        self.assertEqual(stats["l1"], {"hits": 1, "misses": 2, "hit_rate": 1 / 3})
+        self.assertEqual(stats["l2"], {"hits": 1, "misses": 1, "hit_rate": 0.5})
+        self.assertEqual(stats["l1_size"], 1)
+
+    def test_local_values_expire(self):
+        """
+        Test that a value changed by another worker is read again after L1_TIMEOUT.
+        """
+        self.cache.set("key", "old")
+        self.l2.set("key", "new")
+        self.assertEqual(self.cache.get("key"), "old")
+
+        now = cache_backends.time.monotonic()
+        with mock.patch.object(cache_backends.time, "monotonic", return_value=now + 6):
+            self.assertEqual(self.cache.get("key"), "new")
+
+    def test_threads_share_local_values(self):
+        """
+        Test that backends of the same location, as each thread gets, share L1.
+        """
+        self.cache.set("key", "value")
+        self.l2.delete("key")
+
+        self.assertEqual(self.make_cache().get("key"), "value")
+
+    def test_writes_update_both_tiers(self):
+        """
+        Test that writes, deletes and clears reach L1 and L2.
+        """
+        self.cache.set("key", None)
+        self.assertIsNone(self.cache.get("key", "default"))
+        self.assertTrue(self.cache.has_key("key"))
+
+        self.cache.set_many({"a": 1, "b": 2})
+        self.assertEqual(self.l2.get_many(["a", "b"]), {"a": 1, "b": 2})
+        self.assertEqual(self.cache.get_many(["a", "b", "c"]), {"a": 1, "b": 2})
+
+        self.cache.delete("a")
+        self.assertIsNone(self.cache.get("a"))
+        self.assertEqual(self.cache.incr("b"), 3)
+        self.assertEqual(self.cache.get("b"), 3)
+
+        self.cache.clear()
+        self.assertIsNone(self.l2.get("b"))
+        self.assertEqual(self.cache.stats()["l1_size"], 0)
+
+    def test_least_recently_used_are_evicted(self):
+        """
+        Test that L1 keeps at most L1_MAX_ENTRIES values.
+        """
+        self.cache.set("a", 1)
+        self.cache.set("b", 2)
+        self.cache.get("a")
+        self.cache.set("c", 3)
+
+        self.assertEqual(
+            list(self.cache.store.values),
+            [self.cache.make_key("a"), self.cache.make_key("c")],
+        )
+
+    def test_zero_timeout_is_not_kept(self):
+        """
+        Test that a value stored with a timeout of 0 does not stay in L1.
+        """
+        self.cache.set("key", "value", timeout=0)
+
+        self.assertIsNone(self.cache.get("key"))
+
+    @mock.patch.object(cache_backends, "InvalidationListener")
+    @mock.patch.object(cache_backends, "get_publisher")
+    def test_writes_are_published(self, get_publisher, listener):
+        """
+        Test that writes publish their keys, and the listener evicts the keys of other processes only.
+        """
+        self.cache = self.make_cache(INVALIDATION_URL="redis://redis:6379/2")
+        self.cache.set("key", "value")
+
+        listener.return_value.start.assert_called_once()
+        channel, message = get_publisher.return_value.publish.call_args.args
+        self.assertEqual(channel, "cache:invalidate")
+        self.assertEqual(
+            json.loads(message),
+            {
+                "sender": cache_backends.process_sender(),
+                "keys": [self.cache.make_key("key")],
+            },
+        )
+
+        own = InvalidationListener(
+            self.cache.store, "", channel, cache_backends.process_sender()
+        )
+        own.handle(message)
+        self.assertEqual(self.cache.stats()["l1_size"], 1)
+        InvalidationListener(self.cache.store, "", channel, "other").handle(message)
+        self.assertEqual(self.cache.stats()["l1_size"], 0)
+
+    def test_forked_process_has_own_sender(self):
+        """
+        Test that a forked child does not share its parent's sender, so their invalidations reach each other.
+        """
+        parent = cache_backends.process_sender()
+        self.assertEqual(cache_backends.process_sender(), parent)
+        with mock.patch.object(cache_backends.os, "getpid", return_value=-1):
+            self.assertNotEqual(cache_backends.process_sender(), parent)
+
+    @mock.patch.object(cache_backends, "InvalidationListener")
+    @mock.patch.object(cache_backends, "get_publisher")
+    def test_publish_errors_are_logged(self, get_publisher, listener):
+        """
+        Test that a write still succeeds when Redis cannot publish it.
+        """
+        get_publisher.return_value.publish.side_effect = redis.ConnectionError("down")
+        self.cache = self.make_cache(INVALIDATION_URL="redis://redis:6379/2")
+
+        with self.assertLogs(cache_backends.logger, "WARNING"):
+            self.cache.set("key", "value")
+        self.assertEqual(self.l2.get("key"), "value")
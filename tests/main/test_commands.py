@@ -5,6 +5,8 @@ from unittest import mock
 from django.test import TestCase, override_settings
 from django.core.management import call_command
 from apps.main.management.commands.restore_db import Command, NO_COMMANDS_MESSAGE
+from tests.factories.main import NotificationFactory
+from tests.factories.users import UserFactory
 
 
 @override_settings(DEBUG=True)
@@ -247,3 +249,35 @@ class RestoreDbCommandTest(TestCase):
         commands = self.command.generate_source_commands("test", "file.dump")
         self.assertEqual(len(commands), 1)
         self.assertIn("pg_dump -Fc -v --host=", commands[0])
+
+
+class ReconcileUnreadNotificationsCommandTest(TestCase):
+    """
+    Test suite for the reconcile_unread_notifications command.
+    """
+
+    def test_fixes_drifted_counters(self):
+        """
+        Test that only counters that drifted are rewritten, across chunks.
+        :return: None
+        """
+        users = UserFactory.create_batch(3)
+        NotificationFactory.create_batch(2, user=users[0])
+        NotificationFactory(user=users[1])
+        NotificationFactory(user=users[1], is_read=True)
+        User = users[0].__class__
+        User.objects.filter(pk=users[0].pk).update(unread_notifications=7)
+        User.objects.filter(pk=users[2].pk).update(unread_notifications=3)
+
+        out = StringIO()
+        call_command("reconcile_unread_notifications", chunk_size=1, stdout=out)
+
+        self.assertIn("Fixed 2 unread notification counters.", out.getvalue())
+        self.assertEqual(
+            list(
+                User.objects.filter(pk__in=[user.pk for user in users])
+                .order_by("pk")
+                .values_list("unread_notifications", flat=True)
+            ),
+            [2, 1, 0],
+        )
@@ -1,6 +1,9 @@
-from django.test import RequestFactory
+from unittest.mock import patch
 
-from apps.main.context_processors import notifications
+from django.test import RequestFactory, TestCase
+
+from apps.main.context_processors import notifications, report_form
+from apps.main.forms import ReportForm
 from tests.base import BaseTestCase
 from tests.factories.main import NotificationFactory
 
@@ -27,6 +30,7 @@ class TestNotificationContextProcessor(BaseTestCase):
         """
         # Create a mock request object
         request = self.factory.get("/")
+        self.regular_user.refresh_from_db()
         request.user = self.regular_user
 
         # Call the notifications context processor with the mock request
@@ -35,3 +39,37 @@ class TestNotificationContextProcessor(BaseTestCase):
         # Assert that the result contains the expected notifications
         self.assertEqual(len(result["notifications"]), 1)
         self.assertEqual(result["notifications"][0].user, self.regular_user)
+        self.assertEqual(result["unread_notification_count"], 1)
+
+    def test_notifications_are_lazy(self):
+        """
+        Test that the context processor does not query anything until the values are used.
+        :return:
+        """
+        request = self.factory.get("/")
+        request.user = self.regular_user
+
+        with self.assertNumQueries(0):
+            notifications(request)
+
+
+class TestReportFormContextProcessor(TestCase):
+    """
+    Test the report_form context processor.
+    """
+
+    def test_form_is_built_on_use(self):
+        """
+        Test that the form is only instantiated when a template accesses it.
+        :return:
+        """
+        request = RequestFactory().get("/")
+
+        with patch(
+            "apps.main.context_processors.ReportForm", wraps=ReportForm
+        ) as form_class:
+            form = report_form(request)["report_form"]
+            form_class.assert_not_called()
+
+            self.assertIn("reason", str(form["reason"].label_tag()))
+            form_class.assert_called_once_with()
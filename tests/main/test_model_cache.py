@@ -0,0 +1,219 @@
+import time
+from unittest import mock
+
+from django.contrib import messages
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+from django.utils.http import http_date
+
+from apps.main import model_cache
+from apps.main.models import FAQ, PrivacyPolicy, SocialMediaLink, TermsAndConditions
+from apps.main.templatetags.custom_filters import social_media_row
+from apps.main.views import TermsAndConditionsView
+from tests.factories.main import FAQFactory, SocialMediaLinkFactory
+from tests.factories.users import UserFactory
+
+
+class ModelCacheTestCase(TestCase):
+    """
+    Test the versioned cache of rarely changing models.
+    """
+
+    def test_value_is_cached_until_model_changes(self):
+        """
+        Test that a value is computed once, and again after its model changes.
+        """
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return len(calls)
+
+        self.assertEqual(model_cache.get_or_set("value", [FAQ], compute), 1)
+        self.assertEqual(model_cache.get_or_set("value", [FAQ], compute), 1)
+
+        FAQFactory()
+        self.assertEqual(model_cache.get_or_set("value", [FAQ], compute), 2)
+
+    def test_other_models_do_not_invalidate(self):
+        """
+        Test that a change to a model leaves the values of other models cached.
+        """
+        model_cache.get_or_set("faqs", [FAQ], lambda: "cached")
+
+        TermsAndConditions.objects.create(terms="Terms")
+
+        self.assertEqual(model_cache.get_or_set("faqs", [FAQ], lambda: "new"), "cached")
+
+    def test_invalidated_again_on_commit(self):
+        """
+        Test that the version is replaced once more when the transaction commits.
+        """
+        with self.captureOnCommitCallbacks() as callbacks:
+            model_cache.invalidate(FAQ)
+        version = model_cache.get_version(FAQ)
+
+        for callback in callbacks:
+            callback()
+
+        self.assertNotEqual(model_cache.get_version(FAQ), version)
+
+
+class SocialMediaRowTestCase(TestCase):
+    """
+    Test the caching of the social_media_row tag.
+    """
+
+    def test_links_are_cached(self):
+        """
+        Test that the links are only queried once.
+        """
+        link = SocialMediaLinkFactory()
+        self.assertEqual(social_media_row()["links"], [link])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(social_media_row()["links"], [link])
+
+    def test_edits_are_visible_immediately(self):
+        """
+        Test that saved and deleted links show up on the next render.
+        """
+        link = SocialMediaLinkFactory(platform_name="Old")
+        social_media_row()
+
+        link.platform_name = "New"
+        link.save()
+        self.assertEqual(social_media_row()["links"][0].platform_name, "New")
+
+        link.delete()
+        self.assertEqual(social_media_row()["links"], [])
+        self.assertFalse(SocialMediaLink.objects.exists())
+
+
+class CachedPagesTestCase(TestCase):
+    """
+    Test the pages that show cached models.
+    """
+
+    def test_terms_are_cached(self):
+        """
+        Test that the terms are only queried once, and updated terms show up.
+        """
+        TermsAndConditions.objects.create(terms="First terms")
+        self.assertContains(self.client.get(reverse("terms_and_conditions")), "First")
+
+        # Only the savepoint of the atomic request remains
+        with self.assertNumQueries(2):
+            self.client.get(reverse("terms_and_conditions"))
+
+        TermsAndConditions.objects.create(terms="Second terms")
+        self.assertContains(self.client.get(reverse("terms_and_conditions")), "Second")
+
+    def test_faqs_are_cached(self):
+        """
+        Test that the FAQ list is only queried once, and new FAQs show up.
+        """
+        FAQFactory(question="First question")
+        self.assertContains(self.client.get(reverse("faqs")), "First question")
+
+        with self.assertNumQueries(2):
+            self.client.get(reverse("faqs"))
+
+        FAQFactory(question="Second question")
+        self.assertContains(self.client.get(reverse("faqs")), "Second question")
+
+    def test_legal_pages_are_revalidated(self):
+        """
+        Test that the legal pages answer a matching If-None-Match with a 304, until a new document is saved.
+        """
+        for model, field, url in (
+            (TermsAndConditions, "terms", reverse("terms_and_conditions")),
+            (PrivacyPolicy, "policy", reverse("privacy_policy")),
+        ):
+            with self.subTest(model=model):
+                model.objects.create(**{field: "First"})
+                response = self.client.get(url)
+                etag = response["ETag"]
+                self.assertFalse(response.has_header("Last-Modified"))
+
+                with self.assertNumQueries(2):
+                    response = self.client.get(url, headers={"if-none-match": etag})
+                self.assertEqual(response.status_code, 304)
+
+                model.objects.create(**{field: "Second"})
+                response = self.client.get(url, headers={"if-none-match": etag})
+                self.assertContains(response, "Second")
+                self.assertNotEqual(response["ETag"], etag)
+
+    def test_no_etag_with_flash_messages(self):
+        """
+        Test that a page showing flash messages cannot be revalidated, which would swallow them.
+        """
+        TermsAndConditions.objects.create(terms="Terms")
+        request = RequestFactory().get(reverse("terms_and_conditions"))
+        request.user = AnonymousUser()
+        request._messages = CookieStorage(request)
+        view = TermsAndConditionsView()
+
+        self.assertIsNotNone(view.get_etag(request))
+        messages.info(request, "Saved")
+        self.assertIsNone(view.get_etag(request))
+
+    def test_etag_varies_with_user(self):
+        """
+        Test that a page cached for an anonymous user is not revalidated for a signed in one.
+        """
+        TermsAndConditions.objects.create(terms="Terms")
+        etag = self.client.get(reverse("terms_and_conditions"))["ETag"]
+
+        self.client.force_login(UserFactory())
+        response = self.client.get(
+            reverse("terms_and_conditions"), headers={"if-none-match": etag}
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_if_modified_since_is_not_honoured(self):
+        """
+        Test that a date alone cannot revalidate a page whose navbar may have changed.
+        """
+        TermsAndConditions.objects.create(terms="Terms")
+        self.client.force_login(UserFactory())
+        response = self.client.get(
+            reverse("terms_and_conditions"),
+            headers={"if-modified-since": http_date(time.time() + 3600)},
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_missing_document(self):
+        """
+        Test that the legal pages are not found before a document is saved.
+        """
+        # handler404 answers with the bad request page
+        self.assertEqual(self.client.get(reverse("privacy_policy")).status_code, 400)
+
+
+class LocalModelCacheTestCase(TestCase):
+    """
+    Test the per-process layer of the model cache.
+    """
+
+    def test_local_value_survives_shared_cache_miss(self):
+        """
+        Test that a local value is served without reading the shared cache, and dropped on a new version.
+        """
+        model_cache.get_or_set("value", [FAQ], lambda: "first", local=True)
+
+        with mock.patch.object(model_cache.cache, "get_or_set") as get_or_set:
+            self.assertEqual(
+                model_cache.get_or_set("value", [FAQ], lambda: "second", local=True),
+                "first",
+            )
+        get_or_set.assert_not_called()
+
+        FAQFactory()
+        self.assertEqual(
+            model_cache.get_or_set("value", [FAQ], lambda: "second", local=True),
+            "second",
+        )
@@ -4,6 +4,7 @@ from unittest.mock import patch
 from django.contrib.auth.models import User
 from django.test import TestCase
 from django.urls import reverse
+from django.utils import timezone
 from auditlog.registry import auditlog
 
 from apps.main.models import (
@@ -13,6 +14,7 @@ from apps.main.models import (
     AuditLogConfig,
     Notification,
     SocialMediaLink,
+    FAQ,
 )
 from tests.factories.dummy import DummyFactory
 
@@ -170,6 +172,85 @@ class NotificationTest(TestCase):
         self.notification.mark_as_read()
         self.assertTrue(self.notification.is_read)
 
+    def test_unread_counter(self):
+        """
+        Test that creating, reading, unreading and deleting notifications maintain the user's unread counter.
+        """
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.unread_notifications, 1)
+
+        other = NotificationFactory(user=self.user)
+        NotificationFactory(user=self.user, is_read=True)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.unread_notifications, 2)
+
+        self.notification.mark_as_read()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.unread_notifications, 1)
+
+        notification = Notification.objects.get(pk=self.notification.pk)
+        notification.is_read = False
+        notification.save()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.unread_notifications, 2)
+
+        other.delete()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.unread_notifications, 1)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(Notification.objects.unread_count(self.user.pk), 1)
+
+    def test_unread_counter_never_negative(self):
+        """
+        Test that a counter that drifted low does not go below zero.
+        """
+        User = self.user.__class__
+        User.objects.filter(pk=self.user.pk).update(unread_notifications=0)
+        self.notification.mark_as_read()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.unread_notifications, 0)
+
+    def test_mark_as_read_saves_only_changed_fields(self):
+        """
+        Test that marking a notification as read does not rewrite its other fields.
+        """
+        Notification.objects.filter(pk=self.notification.pk).update(message="Edited")
+        self.notification.mark_as_read()
+        self.notification.refresh_from_db()
+        self.assertTrue(self.notification.is_read)
+        self.assertEqual(self.notification.message, "Edited")
+
+    def test_queryset_mark_as_read(self):
+        """
+        Test that a queryset is marked as read with a constant number of queries and counters follow.
+        """
+        other_user = UserFactory()
+        NotificationFactory.create_batch(3, user=self.user)
+        NotificationFactory.create_batch(2, user=other_user)
+        before = timezone.now()
+
+        # A savepoint around the lock, the notification update and the counter update
+        with self.assertNumQueries(5):
+            marked = Notification.objects.all().mark_as_read()
+
+        self.assertEqual(marked, 6)
+        self.assertFalse(Notification.objects.unread().exists())
+        self.assertFalse(Notification.objects.filter(updated_at__lt=before).exists())
+        self.user.refresh_from_db()
+        other_user.refresh_from_db()
+        self.assertEqual(self.user.unread_notifications, 0)
+        self.assertEqual(other_user.unread_notifications, 0)
+        self.assertEqual(Notification.objects.all().mark_as_read(), 0)
+
+    def test_for_dropdown_defers_message(self):
+        """
+        Test that the dropdown queryset loads a preview instead of the message body.
+        """
+        notification = Notification.objects.for_dropdown().get()
+        self.assertIn("message", notification.get_deferred_fields())
+        self.assertEqual(notification.preview, self.notification.message[:200])
+
 
 class SocialMediaLinkTest(TestCase):
     """
@@ -228,6 +309,35 @@ class TestFAQ(TestCase):
         """
         self.assertEqual(str(self.faq), self.faq.question)
 
+    def test_search_ignores_html(self):
+        """
+        Test that the search vector holds the words of the HTML, not its tags, and is updated on save.
+        """
+        faq = FAQFactory(
+            question="<p>How do I reset my <strong>password</strong>?</p>",
+            answer="<p>Use the&nbsp;<a href='/reset/'>reset link</a>.</p>",
+        )
+
+        self.assertQuerySetEqual(FAQ.objects.search("password"), [faq])
+        self.assertQuerySetEqual(FAQ.objects.search("strong"), [])
+        self.assertQuerySetEqual(FAQ.objects.search("nbsp"), [])
+
+        faq.answer = "<p>Contact support.</p>"
+        faq.save()
+        self.assertQuerySetEqual(FAQ.objects.search("reset link"), [])
+        self.assertQuerySetEqual(FAQ.objects.search("support"), [faq])
+        self.assertQuerySetEqual(FAQ.objects.search("link"), [])
+
+    def test_search_ranks_questions_first(self):
+        """
+        Test that a match in the question ranks above a match in the answer, and web search syntax works.
+        """
+        in_answer = FAQFactory(question="Billing", answer="Invoices list each refund.")
+        in_question = FAQFactory(question="Refunds", answer="Ask support.")
+
+        self.assertQuerySetEqual(FAQ.objects.search("refund"), [in_question, in_answer])
+        self.assertQuerySetEqual(FAQ.objects.search("refund -invoices"), [in_question])
+
 
 class MediaLibraryTest(TestCase):
     """
@@ -0,0 +1,202 @@
+import asyncio
+import json
+import time
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import redis
+from asgiref.sync import sync_to_async
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.main.notification_stream import (
+    NotificationHub,
+    format_event,
+    notification_payload,
+    online_user_ids,
+    stream_notifications,
+    user_channel,
+)
+from tests.factories.main import NotificationFactory
+from tests.factories.users import UserFactory
+
+
+class FakeHub:
+    """
+    A hub that hands out one queue filled by the test instead of Redis.
+    """
+
+    def __init__(self):
+        self.queue = asyncio.Queue()
+        self.listening = []
+
+    @asynccontextmanager
+    async def listen(self, user_id):
+        self.listening.append(user_id)
+        try:
+            yield self.queue
+        finally:
+            self.listening.remove(user_id)
+
+
+class NotificationStreamTestCase(TestCase):
+    """
+    Test cases for the notification event stream.
+    """
+
+    def test_format_event_splits_lines(self):
+        """
+        Test that every line of the data gets its own data field.
+        """
+        self.assertEqual(
+            format_event("notification", "<li>\n</li>"),
+            "event: notification\ndata: <li>\ndata: </li>\n\n",
+        )
+
+    async def test_stream_renders_notification_and_badge(self):
+        """
+        Test that a published notification is sent as a dropdown item, followed by the incremented badge.
+        """
+        notification = NotificationFactory.build(
+            id=1, user_id=7, title="New comment", created_at=timezone.now()
+        )
+        hub = FakeHub()
+        stream = stream_notifications(7, 2, hub)
+
+        with patch.object(notification, "get_absolute_url", return_value="/n/1/"):
+            payload = notification_payload(notification)
+        await hub.queue.put(json.dumps(payload))
+
+        item = await anext(stream)
+        badge = await anext(stream)
+        self.assertEqual(hub.listening, [7])
+        self.assertTrue(item.startswith("event: notification\n"))
+        self.assertIn("New comment", item)
+        self.assertIn("/n/1/", item)
+        self.assertTrue(badge.startswith("event: unread-count\n"))
+        self.assertIn("3", badge)
+
+        await stream.aclose()
+        self.assertEqual(hub.listening, [])
+
+    @override_settings(NOTIFICATION_STREAM_KEEPALIVE=0.01)
+    async def test_stream_sends_keepalive(self):
+        """
+        Test that an idle stream sends a comment to keep the connection open.
+        """
+        stream = stream_notifications(7, 0, FakeHub())
+        self.assertEqual(await anext(stream), ": keepalive\n\n")
+        await stream.aclose()
+
+    def test_new_notification_is_published_on_commit(self):
+        """
+        Test that creating an unread notification publishes it once committed.
+        """
+        with patch("apps.main.signals.publish_notifications") as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                notification = NotificationFactory(is_read=False)
+
+        publish.assert_called_once()
+        (payload,) = publish.call_args.args[0]
+        self.assertEqual(payload["id"], notification.id)
+        self.assertEqual(payload["user_id"], notification.user_id)
+        self.assertEqual(payload["get_absolute_url"], notification.get_absolute_url())
+
+
+@override_settings(NOTIFICATION_STREAM_ENABLED=True)
+class NotificationStreamViewTestCase(TestCase):
+    """
+    Test cases for the NotificationStreamView.
+    """
+
+    @override_settings(NOTIFICATION_STREAM_ENABLED=False)
+    async def test_disabled_stream(self):
+        """
+        Test that no stream is opened when streams are not enabled.
+        """
+        user = await sync_to_async(UserFactory)()
+        await self.async_client.aforce_login(user)
+
+        response = await self.async_client.get(reverse("notification_stream"))
+        self.assertEqual(response.status_code, 204)
+
+    def test_no_stream_under_wsgi(self):
+        """
+        Test that no stream is opened for requests served by WSGI.
+        """
+        self.client.force_login(UserFactory())
+
+        response = self.client.get(reverse("notification_stream"))
+        self.assertEqual(response.status_code, 204)
+
+    async def test_anonymous_user_is_rejected(self):
+        """
+        Test that anonymous users get a 401 instead of a stream.
+        """
+        response = await self.async_client.get(reverse("notification_stream"))
+        self.assertEqual(response.status_code, 401)
+
+    async def test_stream_response(self):
+        """
+        Test that authenticated users get an uncached event stream.
+        """
+        user = await sync_to_async(UserFactory)()
+        await self.async_client.aforce_login(user)
+
+        with patch("apps.main.views.get_notification_hub", return_value=FakeHub()):
+            response = await self.async_client.get(reverse("notification_stream"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertEqual(response["Cache-Control"], "no-cache")
+        self.assertTrue(response.streaming)
+
+
+class NotificationHubTestCase(TestCase):
+    """
+    Test cases for the NotificationHub's recovery from Redis errors.
+    """
+
+    async def test_read_resubscribes_after_error(self):
+        """
+        Test that a failed subscription is replaced by one to every listening user's channel.
+        """
+        hub = NotificationHub()
+        hub.RETRY_DELAY = 0
+        queue = asyncio.Queue()
+        hub._listeners[7].add(queue)
+
+        messages = [{"channel": user_channel(7).encode(), "data": b"payload"}]
+
+        def deliver_once(**kwargs):
+            if messages:
+                return messages.pop()
+            # The last stream closes after the message
+            hub._listeners.clear()
+            return None
+
+        failing = AsyncMock()
+        failing.get_message.side_effect = redis.ConnectionError("gone")
+        fresh = AsyncMock()
+        fresh.get_message.side_effect = deliver_once
+        hub._client = MagicMock()
+        hub._client.pubsub.return_value = fresh
+        hub._pubsub = failing
+
+        with patch.object(hub, "_mark_online", AsyncMock()) as mark_online:
+            await asyncio.wait_for(hub._read(), 1)
+
+        self.assertEqual(queue.get_nowait(), b"payload")
+        failing.reset.assert_awaited_once()
+        fresh.subscribe.assert_awaited_once_with(user_channel(7))
+        mark_online.assert_awaited_with([7])
+
+    @patch("apps.main.notification_stream.get_redis_client")
+    def test_online_users_expire(self, mock_client):
+        """
+        Test that users whose last refresh expired are not online.
+        """
+        now = time.time()
+        mock_client.return_value.zmscore.return_value = [now + 60, now - 1, None]
+        self.assertEqual(online_user_ids([1, 2, 3]), [1])
@@ -0,0 +1,145 @@
+from unittest import mock
+
+import redis
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from apps.main import ratelimit
+from apps.main.ratelimit import parse_rate, take_local_token
+from tests.factories.main import NotificationFactory
+from tests.factories.users import UserFactory
+
+RATELIMITS = {
+    "report": {"rate": "1/m", "burst": 2, "methods": ["POST"]},
+    "contact": {"rate": "1/m", "burst": 1, "methods": ["POST"]},
+    "check_username": {"rate": "1/m", "burst": 1, "methods": ["POST"]},
+}
+
+
+class TokenBucketTestCase(TestCase):
+    """
+    Test the buckets kept in process.
+    """
+
+    def test_parse_rate(self):
+        """
+        Test that rates are converted to tokens per second.
+        """
+        self.assertEqual(parse_rate("30/m"), 0.5)
+        self.assertEqual(parse_rate("7200/hour"), 2)
+
+    def test_burst_then_refill(self):
+        """
+        Test that a bucket allows `capacity` requests at once, then one per refilled token.
+        """
+        now = 1000.0
+        with mock.patch.object(ratelimit.time, "monotonic", return_value=now):
+            self.assertEqual(take_local_token("key", 0.5, 2), (True, 0.0))
+            self.assertEqual(take_local_token("key", 0.5, 2), (True, 0.0))
+            self.assertEqual(take_local_token("key", 0.5, 2), (False, 2.0))
+        with mock.patch.object(ratelimit.time, "monotonic", return_value=now + 2):
+            self.assertEqual(take_local_token("key", 0.5, 2), (True, 0.0))
+            self.assertFalse(take_local_token("key", 0.5, 2)[0])
+
+
+@override_settings(RATELIMITS=RATELIMITS, RATELIMIT_STORAGE="local")
+class RateLimitMiddlewareTestCase(TestCase):
+    """
+    Test the rate limits of the write endpoints.
+    """
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.notification = NotificationFactory()
+        self.report_url = reverse(
+            "report", args=["main.notification", self.notification.pk]
+        )
+
+    def test_rejects_over_limit_without_queries(self):
+        """
+        Test that requests over the limit get a 429 with Retry-After, without a database query.
+        """
+        self.client.force_login(UserFactory())
+        for _ in range(2):
+            self.assertEqual(self.client.post(self.report_url).status_code, 302)
+
+        with self.assertNumQueries(0):
+            response = self.client.post(self.report_url)
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "60")
+
+    def test_limits_per_user(self):
+        """
+        Test that a signed in user is limited across IP addresses and sessions.
+        """
+        user = UserFactory()
+        self.client.force_login(user)
+        self.client.post(self.report_url, REMOTE_ADDR="10.0.0.1")
+        self.client.logout()
+        self.client.force_login(user)
+        self.client.post(self.report_url, REMOTE_ADDR="10.0.0.2")
+
+        # Only the session is read, not the user
+        with self.assertNumQueries(1):
+            response = self.client.post(self.report_url, REMOTE_ADDR="10.0.0.3")
+
+        self.assertEqual(response.status_code, 429)
+
+    def test_ip_rejection_skips_database(self):
+        """
+        Test that a request rejected by its IP bucket does not read the session.
+        """
+        self.client.force_login(UserFactory())
+        url = reverse("check_username")
+        self.client.post(url, REMOTE_ADDR="10.0.0.1")
+
+        with self.assertNumQueries(0):
+            response = self.client.post(url, REMOTE_ADDR="10.0.0.1")
+
+        self.assertEqual(response.status_code, 429)
+
+    @mock.patch.object(ratelimit, "get_client_ip", return_value=(None, False))
+    def test_unknown_ips_share_a_bucket(self, get_client_ip):
+        """
+        Test that clients without an IP are limited together.
+        """
+        url = reverse("check_username")
+        self.assertEqual(self.client.post(url).status_code, 200)
+        self.assertEqual(self.client.post(url).status_code, 429)
+
+    def test_limits_per_ip(self):
+        """
+        Test that anonymous clients are limited per IP address.
+        """
+        url = reverse("check_username")
+        self.assertEqual(self.client.post(url, REMOTE_ADDR="10.0.0.1").status_code, 200)
+        self.assertEqual(self.client.post(url, REMOTE_ADDR="10.0.0.1").status_code, 429)
+        self.assertEqual(self.client.post(url, REMOTE_ADDR="10.0.0.2").status_code, 200)
+
+    def test_other_methods_are_not_limited(self):
+        """
+        Test that only the methods of the limit are counted.
+        """
+        for _ in range(3):
+            self.assertEqual(self.client.get(reverse("contact_us")).status_code, 200)
+
+    @override_settings(RATELIMIT_STORAGE="redis")
+    @mock.patch.object(ratelimit, "get_token_bucket_script")
+    def test_redis_buckets(self, get_script):
+        """
+        Test that the buckets are taken from Redis, and from the process when Redis fails.
+        """
+        get_script.return_value.return_value = [0, "2.5"]
+        response = self.client.post(reverse("check_username"))
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "3")
+        self.assertEqual(
+            get_script.return_value.call_args.kwargs,
+            {"keys": ["ratelimit:check_username:ip:127.0.0.1"], "args": [1 / 60, 1]},
+        )
+
+        get_script.return_value.side_effect = redis.ConnectionError("down")
+        with self.assertLogs(ratelimit.logger, "WARNING"):
+            response = self.client.post(reverse("check_username"))
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,277 @@
+import importlib
+from unittest import mock
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from apps.main.models import Comment, Notification, Report, ReportSummary
+from apps.main.reports import (
+    build_registry,
+    refresh_pending_summaries,
+    submit_report,
+)
+from apps.users.models import User
+from tests.factories.main import CommentFactory, ReportFactory
+from tests.factories.users import UserFactory
+
+
+class BuildRegistryTestCase(SimpleTestCase):
+    """
+    Test the registry of reportable models.
+    """
+
+    @override_settings(REPORTABLE_MODELS=["main.Comment", "users.user"])
+    def test_models_by_label_and_name(self):
+        """
+        Test that the models are registered by lowercase label and by model name.
+        """
+        registry = build_registry()
+
+        self.assertEqual(
+            {name: entry.model for name, entry in registry.items()},
+            {
+                "main.comment": Comment,
+                "comment": Comment,
+                "users.user": User,
+                "user": User,
+            },
+        )
+        with self.assertRaises(TypeError):
+            registry["main.notification"] = registry["main.comment"]
+
+    @override_settings(REPORTABLE_MODELS=["main.comment", "forum.comment"])
+    def test_ambiguous_names_are_left_out(self):
+        """
+        Test that a model name shared by two reportable models is only registered by label.
+        """
+        forum_comment = mock.Mock(
+            _meta=mock.Mock(label_lower="forum.comment", model_name="comment")
+        )
+        models = {"main.comment": Comment, "forum.comment": forum_comment}
+
+        with mock.patch("apps.main.reports.apps.get_model", models.get):
+            registry = build_registry()
+
+        self.assertEqual(set(registry), {"main.comment", "forum.comment"})
+
+
+@override_settings(REPORT_MODERATION_THRESHOLDS={"notify_moderators": 2})
+class ReportSummaryTestCase(TestCase):
+    """
+    Test the summaries of the reports of each object.
+    """
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.comment = CommentFactory()
+        self.content_type = ContentType.objects.get_for_model(Comment)
+        self.moderator = UserFactory(is_staff=True)
+
+    def report(self, reporter, reason: str = "Spam") -> Report:
+        with self.captureOnCommitCallbacks(execute=True):
+            report, _ = submit_report(
+                self.content_type.pk, self.comment.pk, reporter.pk, reason
+            )
+        return report
+
+    def test_counts_reports_and_reporters(self):
+        """
+        Test that the summary counts each reporter once, and keeps the last report date.
+        """
+        reporter = UserFactory()
+        self.report(reporter)
+        self.report(UserFactory())
+        last = self.report(reporter)
+
+        summary = ReportSummary.objects.get()
+        self.assertEqual(summary.content_object, self.comment)
+        self.assertEqual((summary.report_count, summary.reporter_count), (2, 2))
+        self.assertEqual(summary.last_reported_at, last.created_at)
+
+    def test_repeat_report_updates_reason(self):
+        """
+        Test that reporting an object again updates the reason and date of the user's report.
+        """
+        reporter = UserFactory()
+        first = self.report(reporter, "Spam")
+        with self.captureOnCommitCallbacks(execute=True):
+            report, created = submit_report(
+                self.content_type.pk, self.comment.pk, reporter.pk, "Abuse"
+            )
+
+        self.assertFalse(created)
+        self.assertEqual(report.pk, first.pk)
+        stored = Report.objects.get()
+        self.assertEqual(stored.reason, "Abuse")
+        self.assertEqual(stored.created_at, report.created_at)
+        self.assertGreater(stored.created_at, first.created_at)
+
+    def test_unique_per_reporter(self):
+        """
+        Test that the database refuses a second report of an object by the same user.
+        """
+        reporter = UserFactory()
+        self.report(reporter)
+
+        with self.assertRaises(IntegrityError):
+            ReportFactory(
+                content_type=self.content_type,
+                object_id=self.comment.pk,
+                reporter=reporter,
+            )
+
+    def test_threshold_notifies_moderators_once(self):
+        """
+        Test that moderators are notified when the threshold of distinct reporters is reached, and only then.
+        """
+        reporter = UserFactory()
+        self.report(reporter)
+        self.report(reporter)
+        self.assertFalse(Notification.objects.filter(user=self.moderator).exists())
+
+        self.report(UserFactory())
+        self.report(UserFactory())
+
+        notification = Notification.objects.get(user=self.moderator)
+        summary = ReportSummary.objects.get()
+        self.assertEqual(
+            notification.link,
+            reverse("admin:main_reportsummary_change", args=[summary.pk]),
+        )
+        self.assertIn("was reported by 2 users", notification.message)
+
+    def test_deleted_reports_are_uncounted(self):
+        """
+        Test that deleting reports counts them again, and drops the summary with the last one.
+        """
+        first = self.report(UserFactory())
+        second = self.report(UserFactory())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        summary = ReportSummary.objects.get()
+        self.assertEqual((summary.report_count, summary.reporter_count), (1, 1))
+        self.assertEqual(summary.last_reported_at, first.created_at)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertFalse(ReportSummary.objects.exists())
+
+    def test_deleted_reporter_is_uncounted_together(self):
+        """
+        Test that the reports deleted along with their reporter are counted again in one batch.
+        """
+        reporter = UserFactory()
+        other = CommentFactory()
+        self.report(reporter)
+        self.report(UserFactory())
+        with self.captureOnCommitCallbacks(execute=True):
+            submit_report(self.content_type.pk, other.pk, reporter.pk, "Spam")
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            reporter.delete()
+        refreshes = [
+            callback for callback in callbacks if callback is refresh_pending_summaries
+        ]
+        self.assertEqual(len(refreshes), 2)
+        with self.assertNumQueries(2):
+            for refresh in refreshes:
+                refresh()
+
+        summary = ReportSummary.objects.get()
+        self.assertEqual(summary.object_id, self.comment.pk)
+        self.assertEqual((summary.report_count, summary.reporter_count), (1, 1))
+
+    def test_rolled_back_savepoint_keeps_refresh(self):
+        """
+        Test that a deletion rolled back with its savepoint does not cancel the refresh of a later one.
+        """
+        first = self.report(UserFactory())
+        second = self.report(UserFactory())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(DatabaseError):
+                with transaction.atomic():
+                    first.delete()
+                    raise DatabaseError
+            second.delete()
+
+        summary = ReportSummary.objects.get()
+        self.assertEqual((summary.report_count, summary.reporter_count), (1, 1))
+
+    def test_threshold_is_not_crossed_twice(self):
+        """
+        Test that an object reported again after falling below a threshold does not queue its action again.
+        """
+        self.report(UserFactory())
+        second = self.report(UserFactory())
+        self.assertEqual(Notification.objects.filter(user=self.moderator).count(), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.report(UserFactory())
+
+        self.assertEqual(Notification.objects.filter(user=self.moderator).count(), 1)
+        self.assertEqual(
+            ReportSummary.objects.get().fired_actions, ["notify_moderators"]
+        )
+
+    def test_admin_lists_most_reported_first(self):
+        """
+        Test that the admin changelist orders the summaries by report count.
+        """
+        self.report(UserFactory())
+        other = CommentFactory()
+        for _ in range(2):
+            ReportFactory(content_type=self.content_type, object_id=other.pk)
+        self.client.force_login(UserFactory(is_staff=True, is_superuser=True))
+
+        response = self.client.get(reverse("admin:main_reportsummary_changelist"))
+
+        self.assertEqual(
+            [summary.object_id for summary in response.context["cl"].result_list],
+            [other.pk, self.comment.pk],
+        )
+
+
+class DeleteDuplicateReportsTestCase(TestCase):
+    """
+    Test the migration deleting duplicate reports before their unique constraint is added.
+
+    Postgres DDL is transactional, so dropping the constraint is rolled back.
+    """
+
+    def test_keeps_latest_report(self):
+        """
+        Test that the latest report of each reporter and object is kept, and summaries are recounted.
+        """
+        migration = importlib.import_module(
+            "apps.main.migrations.0018_report_reporter_object_uniq"
+        )
+        reporter = UserFactory()
+        comment = CommentFactory()
+        content_type = ContentType.objects.get_for_model(Comment)
+        with connection.cursor() as cursor:
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+            cursor.execute(
+                "ALTER TABLE main_report DROP CONSTRAINT report_reporter_object_uniq"
+            )
+        reports = [
+            ReportFactory(
+                content_type=content_type,
+                object_id=comment.pk,
+                reporter=reporter,
+                reason=reason,
+            )
+            for reason in ("First", "Second")
+        ]
+        other = ReportFactory(content_type=content_type, object_id=comment.pk)
+
+        with mock.patch.object(migration, "CHUNK_SIZE", 1):
+            migration.delete_duplicates(None, mock.Mock(connection=connection))
+
+        self.assertQuerySetEqual(Report.objects.order_by("pk"), [reports[1], other])
+        summary = ReportSummary.objects.get()
+        self.assertEqual((summary.report_count, summary.reporter_count), (2, 2))
@@ -0,0 +1,237 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from apps.main.models import ArchivedNotification, Notification
+from apps.main.partitions import (
+    add_months,
+    is_partitioned,
+    maintain_partitions,
+    partition_name,
+    partition_notifications,
+    unpartition_notifications,
+)
+from apps.main.tasks import purge_notifications
+from tests.factories.main import NotificationFactory
+from tests.factories.users import UserFactory
+
+
+def age(notification, days):
+    """
+    Move the creation date of a notification `days` into the past.
+    """
+    notification.created_at = timezone.now() - timedelta(days=days)
+    Notification.objects.filter(pk=notification.pk).update(
+        created_at=notification.created_at
+    )
+
+
+@override_settings(
+    NOTIFICATION_RETENTION_DAYS=30,
+    NOTIFICATION_UNREAD_RETENTION_DAYS=365,
+    NOTIFICATION_ARCHIVE=True,
+)
+class PurgeNotificationsTestCase(TestCase):
+    """
+    Test the purge_notifications task.
+    """
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.user = UserFactory()
+        self.old_read = NotificationFactory(user=self.user, is_read=True)
+        self.recent_read = NotificationFactory(user=self.user, is_read=True)
+        self.old_unread = NotificationFactory(user=self.user)
+        self.expired_unread = NotificationFactory(user=self.user)
+        age(self.old_read, 31)
+        age(self.recent_read, 29)
+        age(self.old_unread, 100)
+        age(self.expired_unread, 366)
+
+    def test_archives_expired_notifications(self):
+        """
+        Test that expired notifications are moved to the archive and the others are kept.
+        """
+        self.assertEqual(purge_notifications(), {"read": 1, "unread": 1})
+
+        self.assertQuerySetEqual(
+            Notification.objects.order_by("pk"),
+            [self.recent_read, self.old_unread],
+        )
+        archived = ArchivedNotification.objects.order_by("notification_id")
+        self.assertEqual(
+            [(a.notification_id, a.user_id, a.is_read) for a in archived],
+            [
+                (self.old_read.pk, self.user.pk, True),
+                (self.expired_unread.pk, self.user.pk, False),
+            ],
+        )
+        self.assertEqual(archived[0].title, self.old_read.title)
+        self.assertEqual(archived[0].message, self.old_read.message)
+
+    def test_decrements_unread_counter(self):
+        """
+        Test that purging unread notifications decrements their user's counter.
+        """
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.unread_notifications, 2)
+
+        purge_notifications()
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.unread_notifications, 1)
+
+    @override_settings(NOTIFICATION_ARCHIVE=False)
+    def test_deletes_without_archive(self):
+        """
+        Test that expired notifications are only deleted when archiving is off.
+        """
+        purge_notifications()
+
+        self.assertEqual(Notification.objects.count(), 2)
+        self.assertFalse(ArchivedNotification.objects.exists())
+
+    @override_settings(NOTIFICATION_RETENTION_BATCH_SIZE=1)
+    def test_batches_are_bounded(self):
+        """
+        Test that a run stops after NOTIFICATION_RETENTION_MAX_BATCHES batches, oldest first.
+        """
+        older_read = NotificationFactory(user=self.user, is_read=True)
+        age(older_read, 60)
+
+        with override_settings(NOTIFICATION_RETENTION_MAX_BATCHES=1):
+            self.assertEqual(purge_notifications(), {"read": 1, "unread": 1})
+        self.assertTrue(
+            ArchivedNotification.objects.filter(notification_id=older_read.pk).exists()
+        )
+        self.assertTrue(Notification.objects.filter(pk=self.old_read.pk).exists())
+
+        self.assertEqual(purge_notifications(), {"read": 1, "unread": 0})
+        self.assertFalse(Notification.objects.filter(pk=self.old_read.pk).exists())
+
+    @override_settings(
+        NOTIFICATION_RETENTION_DAYS=0, NOTIFICATION_UNREAD_RETENTION_DAYS=0
+    )
+    def test_retention_disabled(self):
+        """
+        Test that nothing is purged when both retention periods are 0.
+        """
+        self.assertEqual(purge_notifications(), {"read": 0, "unread": 0})
+        self.assertEqual(Notification.objects.count(), 4)
+
+    def test_dropdown_leaves_out_expired(self):
+        """
+        Test that the dropdown does not list unread notifications waiting to be purged.
+        """
+        self.assertQuerySetEqual(
+            Notification.objects.unread().for_dropdown(), [self.old_unread]
+        )
+
+
+class PartitionNotificationsTestCase(TestCase):
+    """
+    Test the monthly partitioning of the notifications table.
+
+    Postgres DDL is transactional, so each test's changes are rolled back.
+    """
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.user = UserFactory()
+        self.old = NotificationFactory(user=self.user, is_read=True)
+        age(self.old, 400)
+        self.recent = NotificationFactory(user=self.user)
+        # Run the deferred foreign key checks so the table can be altered
+        with connection.cursor() as cursor:
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+    def test_add_months(self):
+        """
+        Test that add_months returns the first day of the month and wraps years.
+        """
+        self.assertEqual(
+            add_months(timezone.datetime(2024, 11, 15).date(), 3),
+            timezone.datetime(2025, 2, 1).date(),
+        )
+
+    def test_partition_keeps_rows_and_ids(self):
+        """
+        Test that partitioning keeps the rows, and new rows get new ids in the partition of their month.
+        """
+        partition_notifications(connection, months_ahead=2)
+
+        self.assertTrue(is_partitioned(connection))
+        self.assertQuerySetEqual(
+            Notification.objects.order_by("pk"), [self.old, self.recent]
+        )
+        notification = NotificationFactory(user=self.user)
+        self.assertGreater(notification.pk, self.recent.pk)
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT id FROM {partition_name(timezone.now().date())} ORDER BY id"
+            )
+            self.assertEqual(
+                [row[0] for row in cursor.fetchall()],
+                [self.recent.pk, notification.pk],
+            )
+
+        # Partitioning twice is a no-op
+        self.assertFalse(partition_notifications(connection, months_ahead=2))
+        self.assertEqual(Notification.objects.count(), 3)
+
+    def test_undo_restores_plain_table(self):
+        """
+        Test that the partition_notifications command can be undone without losing rows or ids.
+        """
+        call_command("partition_notifications", months_ahead=1, stdout=StringIO())
+        self.assertTrue(is_partitioned(connection))
+
+        out = StringIO()
+        call_command("partition_notifications", undo=True, stdout=out)
+        self.assertIn("no longer partitioned", out.getvalue())
+        self.assertFalse(is_partitioned(connection))
+        self.assertFalse(unpartition_notifications(connection))
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, Notification._meta.db_table
+            )
+        self.assertIn(
+            ["id"], [c["columns"] for c in constraints.values() if c["primary_key"]]
+        )
+        self.assertIn("notification_unread_user_idx", constraints)
+
+        self.assertQuerySetEqual(
+            Notification.objects.order_by("pk"), [self.old, self.recent]
+        )
+        notification = NotificationFactory(user=self.user)
+        self.assertGreater(notification.pk, self.recent.pk)
+
+    @override_settings(
+        NOTIFICATION_RETENTION_DAYS=30,
+        NOTIFICATION_ARCHIVE=False,
+        NOTIFICATION_PARTITIONS_AHEAD=4,
+    )
+    def test_purge_maintains_partitions(self):
+        """
+        Test that purging creates the coming partitions and drops the emptied past ones.
+        """
+        partition_notifications(connection, months_ahead=0)
+        old_partition = partition_name(self.old.created_at.date())
+
+        purge_notifications()
+
+        self.assertFalse(Notification.objects.filter(pk=self.old.pk).exists())
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT to_regclass(%s)", [old_partition])
+            self.assertIsNone(cursor.fetchone()[0])
+            cursor.execute(
+                "SELECT to_regclass(%s)",
+                [partition_name(add_months(timezone.now().date(), 4))],
+            )
+            self.assertIsNotNone(cursor.fetchone()[0])
+        self.assertEqual(maintain_partitions(connection, 4), ([], []))
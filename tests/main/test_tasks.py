@@ -1,8 +1,21 @@
 import smtplib
+from datetime import timedelta
 from unittest.mock import patch
 
-from django.test import TestCase
-from apps.main.tasks import send_email_task
+from django.contrib.auth.models import Group
+from django.core.exceptions import ValidationError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from apps.main.consts import BroadcastStatus
+from apps.main.models import Notification, NotificationBroadcast
+from apps.main.tasks import (
+    resume_notification_broadcasts,
+    send_email_task,
+    send_notification_broadcast,
+)
+from tests.factories.main import NotificationBroadcastFactory, NotificationFactory
+from tests.factories.users import UserFactory
 
 
 class TestSendEmailTask(TestCase):
@@ -47,3 +60,165 @@ class TestSendEmailTask(TestCase):
         mock_send_mail.assert_called_once_with(
             subject, message, from_email, recipient_list
         )
+
+
+@override_settings(
+    NOTIFICATION_BROADCAST_CHUNK_SIZE=2, NOTIFICATION_BROADCAST_COPY_THRESHOLD=1000
+)
+class TestSendNotificationBroadcast(TestCase):
+    """
+    Test the delivery of notification broadcasts.
+    """
+
+    def setUp(self):
+        """
+        Create an audience of active users and one inactive user.
+        """
+        self.users = UserFactory.create_batch(5)
+        self.inactive_user = UserFactory(is_active=False)
+
+    def assert_delivered(self, broadcast, users):
+        """
+        Assert that exactly the given users got one notification with the broadcast's content.
+        """
+        notifications = Notification.objects.filter(title=broadcast.title)
+        self.assertEqual(
+            sorted(notifications.values_list("user_id", flat=True)),
+            sorted(user.pk for user in users),
+        )
+        for notification in notifications:
+            self.assertEqual(notification.message, broadcast.message)
+            self.assertEqual(notification.link, broadcast.link)
+            self.assertFalse(notification.is_read)
+        for user in users:
+            user.refresh_from_db()
+            self.assertEqual(user.unread_notifications, 1)
+
+    def test_delivers_in_chunks(self):
+        """
+        Test that every active user is notified once and the broadcast completes.
+        """
+        broadcast = NotificationBroadcastFactory()
+        with self.captureOnCommitCallbacks(execute=True):
+            broadcast.start()
+
+        broadcast.refresh_from_db()
+        self.assertEqual(broadcast.status, BroadcastStatus.COMPLETED.value)
+        self.assertEqual((broadcast.total, broadcast.sent), (5, 5))
+        self.assertEqual(broadcast.progress, 1.0)
+        self.assertIsNotNone(broadcast.finished_at)
+        self.assert_delivered(broadcast, self.users)
+
+    def test_group_and_filter_audience(self):
+        """
+        Test that the audience can be narrowed to a group and by lookups.
+        """
+        group = Group.objects.create(name="Beta testers")
+        group.user_set.add(*self.users[:3], self.inactive_user)
+        broadcast = NotificationBroadcastFactory(
+            group=group, user_filter={"pk__in": [user.pk for user in self.users[1:]]}
+        )
+
+        send_notification_broadcast(broadcast.pk)
+
+        self.assert_delivered(broadcast, self.users[1:3])
+
+    @override_settings(NOTIFICATION_BROADCAST_COPY_THRESHOLD=1)
+    def test_delivers_with_copy(self):
+        """
+        Test that large audiences are written with COPY, keeping special characters intact.
+        """
+        broadcast = NotificationBroadcastFactory(
+            title="Tab\there", message="<p>Line 1\nLine 2\r\n\\N back\\slash</p>"
+        )
+
+        send_notification_broadcast(broadcast.pk)
+
+        self.assert_delivered(broadcast, self.users)
+
+    @override_settings(NOTIFICATION_BROADCAST_COPY_THRESHOLD=1)
+    @patch("apps.main.broadcasts.publish_notifications")
+    @patch("apps.main.broadcasts.online_user_ids")
+    def test_publishes_only_new_notifications(self, mock_online, mock_publish):
+        """
+        Test that only the broadcast's own notifications are published to online users.
+        """
+        broadcast = NotificationBroadcastFactory()
+        online_user = self.users[0]
+        older = NotificationFactory(user=online_user, title=broadcast.title)
+        mock_online.side_effect = lambda user_ids: [
+            user_id for user_id in user_ids if user_id == online_user.pk
+        ]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            send_notification_broadcast(broadcast.pk)
+
+        published = [
+            payload for call in mock_publish.call_args_list for payload in call.args[0]
+        ]
+        self.assertEqual(len(published), 1)
+        self.assertEqual(published[0]["user_id"], online_user.pk)
+        self.assertNotEqual(published[0]["id"], older.pk)
+        self.assertEqual(
+            Notification.objects.filter(title=broadcast.title).count(),
+            len(self.users) + 1,
+        )
+
+    def test_resumes_after_interruption(self):
+        """
+        Test that a broadcast interrupted mid-way only notifies the remaining users.
+        """
+        broadcast = NotificationBroadcastFactory(
+            status=BroadcastStatus.RUNNING.value,
+            total=5,
+            sent=2,
+            last_user_id=self.users[1].pk,
+        )
+
+        self.assertEqual(send_notification_broadcast(broadcast.pk), 3)
+
+        broadcast.refresh_from_db()
+        self.assertEqual(broadcast.sent, 5)
+        self.assert_delivered(broadcast, self.users[2:])
+        # Running it again does nothing
+        self.assertEqual(send_notification_broadcast(broadcast.pk), 0)
+
+    @patch(
+        "apps.main.broadcasts.create_notifications", side_effect=RuntimeError("boom")
+    )
+    def test_failure_is_recorded(self, mock_create):
+        """
+        Test that a failed delivery is recorded and keeps the progress of committed chunks.
+        """
+        broadcast = NotificationBroadcastFactory()
+
+        with self.assertRaises(RuntimeError):
+            send_notification_broadcast(broadcast.pk)
+
+        broadcast.refresh_from_db()
+        self.assertEqual(broadcast.status, BroadcastStatus.FAILED.value)
+        self.assertEqual(broadcast.error, "boom")
+        self.assertEqual(broadcast.sent, 0)
+
+    @patch("apps.main.tasks.send_notification_broadcast.delay")
+    def test_resume_stalled_broadcasts(self, mock_delay):
+        """
+        Test that only running broadcasts without recent progress are queued again.
+        """
+        stalled = NotificationBroadcastFactory(status=BroadcastStatus.RUNNING.value)
+        NotificationBroadcastFactory(status=BroadcastStatus.RUNNING.value)
+        NotificationBroadcastFactory(status=BroadcastStatus.COMPLETED.value)
+        NotificationBroadcast.objects.filter(pk=stalled.pk).update(
+            modified=timezone.now() - timedelta(hours=1)
+        )
+
+        self.assertEqual(resume_notification_broadcasts(), 1)
+        mock_delay.assert_called_once_with(stalled.pk)
+
+    def test_invalid_user_filter(self):
+        """
+        Test that unknown lookups in the user filter are rejected.
+        """
+        broadcast = NotificationBroadcastFactory.build(user_filter={"no_such_field": 1})
+        with self.assertRaises(ValidationError):
+            broadcast.clean()
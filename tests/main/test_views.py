@@ -1,17 +1,23 @@
+from unittest.mock import patch
+
 from django.contrib.contenttypes.models import ContentType
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+from apps.main import model_cache
 from apps.main.consts import ContactType
 from apps.main.forms import ContactForm
 from apps.main.models import (
     Contact,
+    FAQ,
     TermsAndConditions,
     PrivacyPolicy,
     Report,
     Notification,
 )
-from tests.factories.main import NotificationFactory
+from tests.factories.main import FAQFactory, NotificationFactory
 from tests.factories.users import UserFactory
 
 
@@ -60,6 +66,118 @@ class MarkAsReadAndRedirectViewTestCase(TestCase):
         self.assertEqual(response.status_code, 404)
 
 
+class MarkNotificationsAsReadViewTestCase(TestCase):
+    """
+    Test cases for the MarkNotificationsAsReadView.
+    """
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.user = UserFactory()
+        self.client.force_login(self.user)
+        self.notifications = NotificationFactory.create_batch(3, user=self.user)
+        self.other_notification = NotificationFactory()
+        self.url = reverse("mark_notifications_as_read")
+
+    def test_mark_all(self):
+        """
+        Test that every notification of the user, and only of the user, is marked as read.
+        """
+        response = self.client.post(self.url)
+
+        self.assertRedirects(response, reverse("home"), fetch_redirect_response=False)
+        self.assertFalse(Notification.objects.filter(user=self.user).unread().exists())
+        self.other_notification.refresh_from_db()
+        self.assertFalse(self.other_notification.is_read)
+
+    def test_mark_selected(self):
+        """
+        Test that only the given notifications are marked as read.
+        """
+        self.client.post(
+            self.url,
+            {
+                "notification_ids": [
+                    self.notifications[0].pk,
+                    self.other_notification.pk,
+                ]
+            },
+        )
+
+        self.assertEqual(
+            Notification.objects.filter(user=self.user).unread().count(), 2
+        )
+        self.other_notification.refresh_from_db()
+        self.assertFalse(self.other_notification.is_read)
+
+    def test_htmx(self):
+        """
+        Test that HTMX requests get the emptied dropdown and a cleared badge.
+        """
+        response = self.client.post(self.url, HTTP_HX_REQUEST="true")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "No notifications at this time")
+        self.assertContains(response, 'id="notifications-badge" hx-swap-oob="true"')
+        self.assertNotContains(response, "unread messages")
+
+    def test_invalid_ids(self):
+        """
+        Test that malformed ids are rejected.
+        """
+        response = self.client.post(self.url, {"notification_ids": ["abc"]})
+        self.assertEqual(response.status_code, 400)
+
+    def test_get_not_allowed(self):
+        """
+        Test that notifications cannot be marked as read with a GET request.
+        """
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 405)
+
+
+class NotificationDropdownViewTestCase(TestCase):
+    """
+    Test cases for the NotificationDropdownView.
+    """
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.user = UserFactory()
+        self.client.force_login(self.user)
+        self.url = reverse("notifications_dropdown")
+
+    def test_lists_latest_unread(self):
+        """
+        Test that only the user's latest unread notifications are listed.
+        """
+        with self.settings(NOTIFICATION_DROPDOWN_LIMIT=2):
+            NotificationFactory.create_batch(3, user=self.user)
+            NotificationFactory(user=self.user, is_read=True, title="Already read")
+            NotificationFactory(title="Someone else's")
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["notifications"]), 2)
+        self.assertNotContains(response, "Already read")
+        self.assertNotContains(response, "Someone else&#x27;s")
+
+    def test_empty(self):
+        """
+        Test the message shown when there is nothing to read.
+        """
+        response = self.client.get(self.url)
+        self.assertContains(response, "No notifications at this time")
+
+    def test_requires_login(self):
+        """
+        Test that anonymous users are redirected to the login page.
+        """
+        self.client.logout()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
+
+
 class ContactUsViewTests(TestCase):
     """
     Unit tests for the ContactUsView.
@@ -267,3 +385,135 @@ class ReportViewTest(TestCase):
             reason=post_data["reason"],
         ).exists()
         self.assertFalse(exists)
+
+    def test_report_by_label(self):
+        """
+        Test that a report is created for an object identified by "app_label.model", with one check, one insert and the summary upsert.
+        """
+        report_url = reverse("report", args=["main.notification", self.object_id])
+        # The first request records the IP and device of the user
+        self.client.get(reverse("home"))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(report_url, {"reason": "Spam"})
+
+        self.assertEqual(response.status_code, 302)
+        report = Report.objects.get()
+        self.assertEqual(report.content_object, self.reported_notification)
+        statements = [
+            query["sql"]
+            for query in queries
+            if "main_notification" in query["sql"] or "main_report" in query["sql"]
+        ]
+        self.assertEqual(len(statements), 3)
+        self.assertTrue(statements[0].startswith("SELECT 1 AS"))
+        self.assertIn("INSERT INTO main_report ", statements[1])
+        # The upsert of the report summary
+        self.assertIn("INSERT INTO main_reportsummary", statements[2])
+        self.assertFalse(any("django_content_type" in q["sql"] for q in queries))
+
+    def test_repeat_report(self):
+        """
+        Test that reporting an object again updates the user's report instead of adding one.
+        """
+        self.client.post(self.report_url, {"reason": "Spam"})
+        self.client.post(self.report_url, {"reason": "Abuse"})
+
+        self.assertEqual(Report.objects.get(reporter=self.reporter).reason, "Abuse")
+
+    def test_unreportable_model(self):
+        """
+        Test that objects of models missing from REPORTABLE_MODELS cannot be reported.
+        """
+        faq = FAQFactory()
+
+        for model_name in ("main.faq", "faq", "main.unknown"):
+            with self.subTest(model_name=model_name):
+                report_url = reverse("report", args=[model_name, faq.pk])
+                response = self.client.post(report_url, {"reason": "Spam"})
+                self.assertEqual(response.status_code, 404)
+        self.assertFalse(Report.objects.exists())
+
+
+class FAQListViewTests(TestCase):
+    """
+    Test the search and pagination of the FAQ list.
+    """
+
+    def test_search(self):
+        """
+        Test that `q` lists the matching FAQs, best ranked first, and keeps the search in the form.
+        """
+        FAQFactory(question="Billing", answer="Invoices list each refund.")
+        FAQFactory(question="Refunds", answer="Ask support.")
+        FAQFactory(question="Avatars", answer="Upload a picture.")
+
+        response = self.client.get(reverse("faqs"), {"q": "refund"})
+
+        self.assertEqual(
+            [faq.question for faq in response.context["faqs"]], ["Refunds", "Billing"]
+        )
+        self.assertContains(response, 'value="refund"')
+
+    def test_no_results(self):
+        """
+        Test that a search without results says so.
+        """
+        FAQFactory(question="Billing")
+
+        response = self.client.get(reverse("faqs"), {"q": "avatar"})
+
+        self.assertContains(response, "No FAQs match your search.")
+
+    def test_search_is_cached(self):
+        """
+        Test that a search is only run once until an FAQ changes.
+        """
+        FAQFactory(question="Refunds")
+        self.client.get(reverse("faqs"), {"q": "refund"})
+
+        # Only the savepoint of the atomic request remains
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("faqs"), {"q": "refund"})
+        self.assertEqual(len(response.context["faqs"]), 1)
+
+        FAQFactory(question="Refund delays")
+        response = self.client.get(reverse("faqs"), {"q": "refund"})
+        self.assertEqual(len(response.context["faqs"]), 2)
+
+    @override_settings(FAQ_SEARCH_CACHE_TIMEOUT=60)
+    def test_search_cache_expires(self):
+        """
+        Test that searches are cached for a limited time, under their normalised form.
+        """
+        FAQFactory(question="Refunds")
+        with patch(
+            "apps.main.views.model_cache.get_or_set", wraps=model_cache.get_or_set
+        ) as get_or_set:
+            self.client.get(reverse("faqs"), {"q": "refund"})
+            with self.assertNumQueries(2):
+                self.client.get(reverse("faqs"), {"q": "  REFUND "})
+            self.client.get(reverse("faqs"))
+
+        self.assertEqual(
+            [
+                call.kwargs.get("timeout")
+                for call in get_or_set.call_args_list
+                if call.args[0].startswith("faqs")
+            ],
+            [60, 60, None],
+        )
+
+    def test_pagination(self):
+        """
+        Test that the FAQs are paginated and the page links keep the search.
+        """
+        FAQ.objects.bulk_create(
+            FAQ(question=f"Refund question {n}", answer="Answer") for n in range(12)
+        )
+
+        response = self.client.get(reverse("faqs"), {"q": "refund", "page": 2})
+
+        self.assertEqual(len(response.context["faqs"]), 2)
+        self.assertContains(response, "Showing 11-12 of 12 FAQs")
+        self.assertContains(response, "?q=refund&amp;page=1")
@@ -18,10 +18,26 @@ DATABASES = {
 
 SENTRY_ENV = "test_runner"
 
+# The tiered cache over a local memory cache, as the tests have no Redis
+CACHES = {
+    "default": {
+        "BACKEND": "apps.main.cache_backends.TieredCache",
+        "LOCATION": "tiered",
+        "OPTIONS": {"L2": "shared", "L1_TIMEOUT": 5},
+    },
+    "shared": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "shared",
+    },
+}
+
 # This is added here because the tests need to be able to access the media files
 MEDIA_ROOT = BASE_DIR / "media"
 MEDIA_URL = "/media/"
 
+# The tests have no Redis
+RATELIMIT_STORAGE = "local"
+
 # Celery test settings
 CELERY_BROKER_URL = "memory://"
 CELERY_RESULT_BACKEND = "cache+memory://"
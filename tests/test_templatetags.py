@@ -1,12 +1,26 @@
 from django import forms
 from django.core.paginator import Paginator
 from django.template import Context, Template
-from django.test import RequestFactory
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.test import RequestFactory, override_settings
+from django.urls import reverse
+from django.utils import timezone
 
 from apps.main.forms import ReportForm
-from apps.main.templatetags.custom_filters import get_page_link
+from apps.main.templatetags.custom_filters import (
+    fragment_version,
+    get_page_link,
+    user_fragment_version,
+)
 from tests.base import BaseTestCase
-from tests.factories.main import ContentTypeFactory, ReportFactory
+from tests.factories.main import (
+    ContentTypeFactory,
+    NotificationFactory,
+    ReportFactory,
+    SocialMediaLinkFactory,
+)
 from tests.factories.users import UserFactory
 
 
@@ -144,3 +158,77 @@ class PaginationTagsTest(BaseTestCase):
         output = template.render(context)
 
         self.assertEqual(output.strip(), "value")
+
+
+class FragmentCacheTagsTest(BaseTestCase):
+    """
+    Test the versions of the cached template fragments.
+    """
+
+    def setUp(self):
+        """
+        Setup tests
+        """
+        super().setUp()
+        self.factory = RequestFactory()
+
+    @override_settings(SITE_VERSION="release")
+    def test_fragment_version_follows_models(self):
+        """Test that the fragment version changes when a displayed model changes"""
+        version = fragment_version("main.SocialMediaLink")
+        self.assertTrue(version.startswith("release:"))
+        self.assertEqual(fragment_version("main.SocialMediaLink"), version)
+
+        SocialMediaLinkFactory()
+
+        self.assertNotEqual(fragment_version("main.SocialMediaLink"), version)
+        self.assertEqual(fragment_version(), "release")
+
+    def test_user_fragment_version(self):
+        """Test that the user version changes with the unread count and the CSRF secret"""
+        request = self.factory.get("/")
+        request.user = AnonymousUser()
+        self.assertEqual(
+            user_fragment_version(Context({"request": request})), "anonymous"
+        )
+
+        request.user = self.regular_user
+        request.META["CSRF_COOKIE"] = "secret"
+        version = user_fragment_version(Context({"request": request}))
+        self.assertTrue(version.startswith(f"{self.regular_user.pk}:0:"))
+        self.assertNotIn("secret", version)
+
+        request.META["CSRF_COOKIE"] = "rotated"
+        self.assertNotEqual(
+            user_fragment_version(Context({"request": request})), version
+        )
+
+    def test_user_fragment_version_sets_csrf_cookie(self):
+        """Test that a request without a CSRF secret gets one, so a cached csrf_token gets its cookie"""
+        request = self.factory.get("/")
+        request.user = self.regular_user
+        user_fragment_version(Context({"request": request}))
+        self.assertTrue(request.META["CSRF_COOKIE"])
+        self.assertTrue(request.META["CSRF_COOKIE_NEEDS_UPDATE"])
+
+    def test_cached_footer_shows_new_links(self):
+        """Test that the cached footer is rendered again when a social media link is added"""
+        self.client.get(reverse("home"))
+        key = make_template_fragment_key(
+            "footer",
+            [fragment_version("main.SocialMediaLink"), str(timezone.now().year)],
+        )
+        self.assertIsNotNone(cache.get(key))
+
+        SocialMediaLinkFactory(platform_name="Mastodon")
+
+        self.assertContains(self.client.get(reverse("home")), 'alt="Mastodon"')
+
+    def test_cached_navbar_shows_new_notifications(self):
+        """Test that the cached navbar is rendered again when the unread count changes"""
+        self.client.force_login(self.regular_user)
+        self.assertNotContains(self.client.get(reverse("home")), "unread messages")
+
+        NotificationFactory(user=self.regular_user)
+
+        self.assertContains(self.client.get(reverse("home")), "unread messages")
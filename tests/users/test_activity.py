@@ -0,0 +1,339 @@
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch, MagicMock
+
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from apps.users.activity import (
+    ActivityDebouncer,
+    ActivityEntry,
+    LocalActivityBuffer,
+    RedisActivityBuffer,
+    record_activity,
+    get_activity_buffer,
+    track_activity,
+)
+from apps.users.models import UserIP, UserDevice
+from apps.users.tasks import flush_user_activity
+from tests.factories.users import UserFactory, UserIPFactory
+
+
+class RecordActivityTest(TestCase):
+    """
+    Test writing batches of activity entries.
+    """
+
+    def setUp(self):
+        """
+        Create a user with a known IP address.
+        :return:
+        """
+        self.user = UserFactory()
+        self.known_ip = UserIPFactory(user=self.user, ip_address="10.0.0.1")
+        self.now = timezone.now()
+
+    @patch("apps.users.activity.resolve_ip_geolocation.delay")
+    def test_updates_existing_and_creates_missing(self, mock_delay):
+        """
+        Test that a batch updates known rows, creates new ones and keeps the latest sighting.
+        """
+        earlier = self.now - timedelta(minutes=5)
+        entries = [
+            ActivityEntry(self.user.pk, "10.0.0.1", "device-a", earlier),
+            ActivityEntry(self.user.pk, "10.0.0.1", "device-a", self.now),
+            ActivityEntry(self.user.pk, "10.0.0.2", None, earlier),
+        ]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            record_activity(entries)
+
+        self.known_ip.refresh_from_db()
+        self.assertEqual(self.known_ip.last_seen, self.now)
+        self.assertEqual(UserIP.objects.filter(user=self.user).count(), 2)
+        self.assertTrue(
+            UserDevice.objects.filter(
+                user=self.user, device_identifier="device-a"
+            ).exists()
+        )
+        # Only the new address needs a location
+        mock_delay.assert_called_once_with("10.0.0.2")
+
+    @patch("apps.users.activity.resolve_ip_geolocation.delay")
+    def test_batch_query_count_is_constant(self, mock_delay):
+        """
+        Test that the number of queries does not grow with the batch size.
+        """
+        users = UserFactory.create_batch(20)
+        entries = [
+            ActivityEntry(user.pk, f"10.1.0.{i}", f"device-{i}", self.now)
+            for i, user in enumerate(users)
+        ]
+        # An upsert per table and a lookup of the unresolved addresses
+        with self.assertNumQueries(3):
+            record_activity(entries)
+
+
+class LocalActivityBufferTest(TestCase):
+    """
+    Test the in-process activity buffer.
+    """
+
+    def setUp(self):
+        self.user = UserFactory()
+        self.now = timezone.now()
+
+    @override_settings(
+        USER_ACTIVITY_BUFFER_MAX_SIZE=100, USER_ACTIVITY_FLUSH_INTERVAL=60
+    )
+    @patch("apps.users.activity.resolve_ip_geolocation.delay")
+    def test_deduplicates_and_flushes(self, mock_delay):
+        """
+        Test that repeated sightings collapse to one entry and nothing is written before flush.
+        """
+        buffer = LocalActivityBuffer()
+        for _ in range(5):
+            buffer.add(ActivityEntry(self.user.pk, "10.0.0.1", "device-a", self.now))
+
+        self.assertFalse(UserIP.objects.filter(user=self.user).exists())
+        self.assertEqual(buffer.flush(), 1)
+        self.assertTrue(
+            UserIP.objects.filter(user=self.user, ip_address="10.0.0.1").exists()
+        )
+        self.assertEqual(buffer.flush(), 0)
+
+    @override_settings(USER_ACTIVITY_BUFFER_MAX_SIZE=2, USER_ACTIVITY_FLUSH_INTERVAL=60)
+    def test_flushes_when_full(self):
+        """
+        Test that the buffer starts a background flush once it reaches its maximum size.
+        """
+        buffer = LocalActivityBuffer()
+        with patch.object(buffer, "flush") as mock_flush:
+            buffer.add(ActivityEntry(self.user.pk, "10.0.0.1", None, self.now))
+            self.assertIsNone(buffer._flusher)
+
+            buffer.add(ActivityEntry(self.user.pk, "10.0.0.2", None, self.now))
+            buffer._flusher.join(timeout=5)
+
+        mock_flush.assert_called_once_with()
+        # The request that filled the buffer wrote nothing itself
+        self.assertFalse(UserIP.objects.filter(user=self.user).exists())
+        self.assertEqual(len(buffer.drain()), 2)
+
+    @override_settings(
+        USER_ACTIVITY_BUFFER_MAX_SIZE=100, USER_ACTIVITY_FLUSH_INTERVAL=60
+    )
+    @patch("apps.users.activity.record_activity", side_effect=DatabaseError)
+    def test_keeps_entries_when_write_fails(self, mock_record):
+        """
+        Test that a batch whose write fails is flushed again, behind newer sightings.
+        """
+        buffer = LocalActivityBuffer()
+        buffer.add(ActivityEntry(self.user.pk, "10.0.0.1", None, self.now))
+        buffer.add(ActivityEntry(self.user.pk, "10.0.0.2", None, self.now))
+
+        with self.assertRaises(DatabaseError):
+            buffer.flush()
+
+        later = self.now + timedelta(minutes=1)
+        buffer.add(ActivityEntry(self.user.pk, "10.0.0.1", None, later))
+        buffer.restore([ActivityEntry(self.user.pk, "10.0.0.1", None, self.now)])
+        self.assertEqual(
+            sorted(buffer.drain()),
+            [
+                ActivityEntry(self.user.pk, "10.0.0.1", None, later),
+                ActivityEntry(self.user.pk, "10.0.0.2", None, self.now),
+            ],
+        )
+
+
+class RedisActivityBufferTest(TestCase):
+    """
+    Test the Redis activity buffer against a mocked client.
+    """
+
+    @patch("apps.users.activity.get_redis_client")
+    def test_add_and_drain(self, mock_get_client):
+        """
+        Test that entries are stored per key and decoded when drained.
+        """
+        client = MagicMock()
+        mock_get_client.return_value = client
+        now = timezone.now()
+        buffer = RedisActivityBuffer()
+
+        buffer.add(ActivityEntry(7, "10.0.0.1", None, now))
+        client.hset.assert_called_once_with(
+            RedisActivityBuffer.key, "7\x1f10.0.0.1\x1f", now.isoformat()
+        )
+
+        client.register_script.return_value.return_value = [
+            b"7\x1f10.0.0.1\x1f",
+            now.isoformat().encode(),
+        ]
+        self.assertEqual(buffer.drain(), [ActivityEntry(7, "10.0.0.1", None, now)])
+        client.register_script.return_value.assert_called_once_with(
+            keys=[RedisActivityBuffer.key, RedisActivityBuffer.processing_key]
+        )
+
+    @patch("apps.users.activity.record_activity")
+    @patch("apps.users.activity.get_redis_client")
+    def test_batch_is_kept_until_written(self, mock_get_client, mock_record):
+        """
+        Test that the processing key is only deleted once its batch is written.
+        """
+        client = MagicMock()
+        mock_get_client.return_value = client
+        client.register_script.return_value.return_value = [
+            b"7\x1f10.0.0.1\x1f",
+            timezone.now().isoformat().encode(),
+        ]
+        buffer = RedisActivityBuffer()
+
+        mock_record.side_effect = DatabaseError
+        with self.assertRaises(DatabaseError):
+            buffer.flush()
+        client.delete.assert_not_called()
+
+        mock_record.side_effect = None
+        self.assertEqual(buffer.flush(), 1)
+        client.delete.assert_called_once_with(RedisActivityBuffer.processing_key)
+
+
+class TrackActivityTest(TestCase):
+    """
+    Test the entry point used by the tracking middleware.
+    """
+
+    def setUp(self):
+        self.user = UserFactory()
+        get_activity_buffer.cache_clear()
+        self.addCleanup(get_activity_buffer.cache_clear)
+
+    @patch("apps.users.activity.resolve_ip_geolocation.delay")
+    def test_writes_immediately_without_buffer(self, mock_delay):
+        """
+        Test that activity is written synchronously by default.
+        """
+        track_activity(self.user.pk, "10.0.0.1", "device-a")
+        self.assertTrue(UserIP.objects.filter(user=self.user).exists())
+
+    @override_settings(
+        USER_ACTIVITY_BUFFER="apps.users.activity.LocalActivityBuffer",
+        USER_ACTIVITY_BUFFER_MAX_SIZE=100,
+        USER_ACTIVITY_FLUSH_INTERVAL=60,
+    )
+    @patch("apps.users.activity.resolve_ip_geolocation.delay")
+    def test_buffers_when_configured(self, mock_delay):
+        """
+        Test that activity is buffered and written by the flush task.
+        """
+        track_activity(self.user.pk, "10.0.0.1", "device-a")
+        self.assertFalse(UserIP.objects.filter(user=self.user).exists())
+
+        self.assertEqual(flush_user_activity(), 1)
+        self.assertTrue(UserIP.objects.filter(user=self.user).exists())
+        self.assertTrue(UserDevice.objects.filter(user=self.user).exists())
+
+
+class ActivityDebouncerTest(TestCase):
+    """
+    Test skipping activity that was recorded recently.
+    """
+
+    def test_skips_repeat_sightings(self):
+        """
+        Test that a key is recorded once per interval and other keys are unaffected.
+        """
+        debouncer = ActivityDebouncer(interval=300, max_size=100)
+
+        self.assertTrue(debouncer.should_record(1, "10.0.0.1", "device-a"))
+        self.assertFalse(debouncer.should_record(1, "10.0.0.1", "device-a"))
+        self.assertTrue(debouncer.should_record(1, "10.0.0.1", "device-b"))
+
+        stats = debouncer.stats()
+        self.assertEqual(stats["misses"], 2)
+        self.assertEqual(stats["local_hits"], 1)
+        self.assertAlmostEqual(stats["hit_rate"], 1 / 3)
+
+    @patch("apps.users.activity.time.monotonic")
+    def test_records_again_after_interval(self, mock_monotonic):
+        """
+        Test that a key is recorded again once the interval has passed.
+        """
+        debouncer = ActivityDebouncer(interval=300, max_size=100)
+        mock_monotonic.return_value = 1000
+        self.assertTrue(debouncer.should_record(1, "10.0.0.1", "device-a"))
+
+        mock_monotonic.return_value = 1299
+        self.assertFalse(debouncer.should_record(1, "10.0.0.1", "device-a"))
+
+        mock_monotonic.return_value = 1301
+        self.assertTrue(debouncer.should_record(1, "10.0.0.1", "device-a"))
+
+    def test_evicts_least_recently_used(self):
+        """
+        Test that the cache never holds more than max_size keys.
+        """
+        debouncer = ActivityDebouncer(interval=300, max_size=1)
+        debouncer.should_record(1, "10.0.0.1", "device-a")
+        debouncer.should_record(2, "10.0.0.1", "device-a")
+
+        self.assertTrue(debouncer.should_record(1, "10.0.0.1", "device-a"))
+
+    def test_zero_interval_disables(self):
+        """
+        Test that an interval of 0 records every sighting.
+        """
+        debouncer = ActivityDebouncer(interval=0, max_size=100)
+        self.assertTrue(debouncer.should_record(1, "10.0.0.1", "device-a"))
+        self.assertTrue(debouncer.should_record(1, "10.0.0.1", "device-a"))
+
+    @patch("apps.users.activity.get_redis_client")
+    def test_shared_tier(self, mock_get_client):
+        """
+        Test that a key already claimed by another worker is skipped.
+        """
+        mock_get_client.return_value.set.return_value = None
+        debouncer = ActivityDebouncer(interval=300, max_size=100, shared=True)
+
+        self.assertFalse(debouncer.should_record(1, "10.0.0.1", "device-a"))
+        mock_get_client.return_value.set.assert_called_once_with(
+            "users:activity_seen:1\x1f10.0.0.1\x1fdevice-a", 1, nx=True, ex=300
+        )
+        self.assertEqual(debouncer.stats()["shared_hits"], 1)
+
+    @patch("apps.users.activity.resolve_ip_geolocation.delay")
+    def test_track_activity_skips_database(self, mock_delay):
+        """
+        Test that a debounced sighting does not touch the database.
+        """
+        user = UserFactory()
+        track_activity(user.pk, "10.0.0.1", "device-a")
+
+        with self.assertNumQueries(0):
+            track_activity(user.pk, "10.0.0.1", "device-a")
+
+
+class UserActivityStatsCommandTest(TestCase):
+    """
+    Test the user_activity_stats management command.
+    """
+
+    @patch("apps.users.management.commands.user_activity_stats.get_redis_client")
+    def test_reports_hit_rate(self, mock_get_client):
+        """
+        Test that the aggregated counters are reported.
+        """
+        mock_get_client.return_value.hgetall.return_value = {
+            b"local_hits": b"60",
+            b"shared_hits": b"15",
+            b"misses": b"25",
+        }
+        stdout = StringIO()
+        call_command("user_activity_stats", stdout=stdout)
+
+        self.assertIn("Sightings:        100", stdout.getvalue())
+        self.assertIn("Writes saved:     75.0%", stdout.getvalue())
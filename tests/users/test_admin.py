@@ -40,6 +40,20 @@ class UserAdminTest(TestCase):
             is_blocked=False,
         )
 
+    def test_save_model_keeps_unread_counter(self):
+        """
+        Test that saving a user in the admin does not undo concurrent counter updates.
+        """
+        stale = User.objects.get(pk=self.user.pk)
+        User.objects.filter(pk=self.user.pk).update(unread_notifications=3)
+
+        stale.first_name = "Changed"
+        self.user_admin.save_model(Mock(), stale, Mock(), change=True)
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name, "Changed")
+        self.assertEqual(self.user.unread_notifications, 3)
+
     def test_block_users_and_devices_action(self):
         """
         Test the block_users_and_devices action method of the UserAdmin
@@ -0,0 +1,178 @@
+from django.core.cache import cache, caches
+from django.core.exceptions import ValidationError
+from django.test import TestCase, override_settings
+
+from apps.users.blocklist import (
+    VERSION_KEY,
+    Blocklist,
+    NetworkSet,
+    get_blocklist,
+)
+from apps.users.models import BlockedNetwork, UserIP
+from apps.users.utils import block_ip
+from tests.factories.users import UserDeviceFactory, UserIPFactory
+
+
+class NetworkSetTest(TestCase):
+    """
+    Test matching addresses against sets of networks.
+    """
+
+    def test_exact_addresses(self):
+        """
+        Test that single addresses only match themselves.
+        """
+        networks = NetworkSet(["192.0.2.1", "2001:db8::1"])
+        self.assertIn("192.0.2.1", networks)
+        self.assertIn("2001:db8::1", networks)
+        self.assertNotIn("192.0.2.2", networks)
+        self.assertNotIn("2001:db8::2", networks)
+
+    def test_networks(self):
+        """
+        Test that every address of a network matches, and nothing around it.
+        """
+        networks = NetworkSet(["198.51.100.0/24", "2001:db8:1::/48", "10.0.0.1/31"])
+        self.assertIn("198.51.100.0", networks)
+        self.assertIn("198.51.100.255", networks)
+        self.assertNotIn("198.51.101.0", networks)
+        self.assertIn("2001:db8:1:ffff::1", networks)
+        self.assertNotIn("2001:db8:2::1", networks)
+        # Host bits of a network are ignored
+        self.assertIn("10.0.0.0", networks)
+        self.assertIn("10.0.0.1", networks)
+        self.assertNotIn("10.0.0.2", networks)
+
+    def test_wider_network_covers_narrower(self):
+        """
+        Test that adding a wider network after a narrower one covers both.
+        """
+        networks = NetworkSet(["203.0.113.128/25", "203.0.113.0/24"])
+        self.assertIn("203.0.113.1", networks)
+        self.assertIn("203.0.113.200", networks)
+
+    def test_ipv4_mapped_and_invalid_addresses(self):
+        """
+        Test that IPv4-mapped IPv6 addresses match IPv4 networks and invalid input never matches.
+        """
+        networks = NetworkSet(["192.0.2.0/24", "0.0.0.0/0"])
+        self.assertIn("::ffff:192.0.2.7", networks)
+        self.assertIn("8.8.8.8", networks)
+        self.assertNotIn("2001:db8::1", networks)
+        self.assertNotIn("not-an-ip", networks)
+        self.assertNotIn(None, networks)
+
+
+class BlocklistTest(TestCase):
+    """
+    Test the per-process blocklist snapshot.
+    """
+
+    def setUp(self):
+        """
+        Flag an IP, a device and a network.
+        :return:
+        """
+        UserIPFactory(ip_address="192.0.2.1", is_blocked=True)
+        UserIPFactory(ip_address="192.0.2.2", is_suspicious=True)
+        UserIPFactory(ip_address="192.0.2.3")
+        UserDeviceFactory(device_identifier="blocked-device", is_blocked=True)
+        BlockedNetwork.objects.create(network="198.51.100.7/24", reason="Spam")
+
+    def test_from_database(self):
+        """
+        Test that the snapshot holds flagged IPs, blocked networks and blocked devices.
+        """
+        blocklist = Blocklist.from_database()
+        self.assertTrue(blocklist.is_ip_blocked_or_suspicious("192.0.2.1"))
+        self.assertTrue(blocklist.is_ip_blocked_or_suspicious("192.0.2.2"))
+        self.assertFalse(blocklist.is_ip_blocked_or_suspicious("192.0.2.3"))
+        self.assertTrue(blocklist.is_ip_blocked_or_suspicious("198.51.100.200"))
+        self.assertTrue(blocklist.is_device_blocked("blocked-device"))
+        self.assertFalse(blocklist.is_device_blocked("other-device"))
+
+    def test_network_is_normalised(self):
+        """
+        Test that networks are stored in their canonical form and validated.
+        """
+        self.assertTrue(BlockedNetwork.objects.filter(network="198.51.100.0/24"))
+        with self.assertRaises(ValidationError):
+            BlockedNetwork(network="198.51.100.0/33").full_clean()
+
+    def test_snapshot_is_reused(self):
+        """
+        Test that checks after the first one do not query the database.
+        """
+        get_blocklist()
+        with self.assertNumQueries(0):
+            self.assertTrue(UserIP.objects.is_ip_blocked_or_suspicious("192.0.2.1"))
+            self.assertFalse(UserIP.objects.is_ip_blocked_or_suspicious("192.0.2.3"))
+
+    def test_block_ip_refreshes_snapshot(self):
+        """
+        Test that blocking an IP is visible to the next check.
+        """
+        self.assertFalse(get_blocklist().is_ip_blocked_or_suspicious("192.0.2.3"))
+        block_ip("192.0.2.3")
+        self.assertTrue(get_blocklist().is_ip_blocked_or_suspicious("192.0.2.3"))
+
+    @override_settings(USER_BLOCKLIST_CHECK_INTERVAL=0)
+    def test_version_change_refreshes_snapshot(self):
+        """
+        Test that a change of the shared version, made by another worker, rebuilds the snapshot.
+        """
+        get_blocklist()
+        # Another worker flags an IP without this process knowing
+        UserIP.objects.filter(ip_address="192.0.2.3").update(is_blocked=True)
+        self.assertFalse(get_blocklist().is_ip_blocked_or_suspicious("192.0.2.3"))
+
+        cache.set(VERSION_KEY, "changed-by-another-worker")
+        self.assertTrue(get_blocklist().is_ip_blocked_or_suspicious("192.0.2.3"))
+
+    @override_settings(USER_BLOCKLIST_CHECK_INTERVAL=0)
+    def test_version_is_read_past_local_tier(self):
+        """
+        Test that a version this process still has in its local cache tier does not hide a change.
+        """
+        get_blocklist()
+        cache.get(VERSION_KEY)
+        UserIP.objects.filter(ip_address="192.0.2.3").update(is_blocked=True)
+        caches["shared"].set(VERSION_KEY, "changed-by-another-worker")
+        self.assertTrue(get_blocklist().is_ip_blocked_or_suspicious("192.0.2.3"))
+
+    def test_version_check_is_throttled(self):
+        """
+        Test that the shared version is not read again within the check interval.
+        """
+        get_blocklist()
+        cache.set(VERSION_KEY, "changed-by-another-worker")
+        with self.assertNumQueries(0):
+            get_blocklist()
+
+    def test_deleting_network_refreshes_snapshot(self):
+        """
+        Test that removing a blocked network is visible to the next check.
+        """
+        self.assertTrue(get_blocklist().is_ip_blocked_or_suspicious("198.51.100.1"))
+        BlockedNetwork.objects.all().delete()
+        self.assertFalse(get_blocklist().is_ip_blocked_or_suspicious("198.51.100.1"))
+
+    def test_unflagged_save_keeps_version(self):
+        """
+        Test that saving a row that was never flagged does not invalidate the blocklist.
+        """
+        user_ip = UserIP.objects.get(ip_address="192.0.2.3")
+        version = cache.get(VERSION_KEY)
+        user_ip.city = "Elsewhere"
+        user_ip.save()
+        self.assertEqual(cache.get(VERSION_KEY), version)
+
+    def test_clearing_flag_refreshes_snapshot(self):
+        """
+        Test that clearing the flag of a loaded row is visible to the next check.
+        """
+        self.assertTrue(get_blocklist().is_ip_blocked_or_suspicious("192.0.2.1"))
+        user_ip = UserIP.objects.get(ip_address="192.0.2.1")
+        user_ip.is_blocked = False
+        user_ip.save()
+        self.assertFalse(get_blocklist().is_ip_blocked_or_suspicious("192.0.2.1"))
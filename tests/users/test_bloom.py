@@ -0,0 +1,123 @@
+import secrets
+from io import StringIO
+
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.test import TestCase
+
+from apps.users.bloom import (
+    ENTRY_KEY,
+    GENERATION_KEY,
+    BloomFilter,
+    UsernameFilter,
+    get_username_filter,
+    log_username,
+)
+from tests.factories.users import UserFactory
+
+
+class BloomFilterTest(TestCase):
+    """
+    Test the Bloom filter.
+    """
+
+    def test_no_false_negatives(self):
+        """
+        Test that every added item is reported as present.
+        """
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        items = [f"user{i}" for i in range(1000)]
+        for item in items:
+            bloom.add(item)
+        self.assertTrue(all(item in bloom for item in items))
+        self.assertEqual(bloom.count, 1000)
+
+    def test_false_positive_rate(self):
+        """
+        Test that the false positive rate at capacity stays close to the configured rate.
+        """
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(f"user{i}")
+        hits = sum(secrets.token_hex(8) in bloom for _ in range(10000))
+        self.assertLess(hits / 10000, 0.03)
+        self.assertAlmostEqual(bloom.expected_error_rate, 0.01, delta=0.005)
+
+    def test_sizing(self):
+        """
+        Test that the filter is sized from its capacity and error rate.
+        """
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        self.assertEqual(bloom.size, 9586)
+        self.assertEqual(bloom.hash_count, 7)
+        self.assertEqual(bloom.memory_bytes, 1199)
+        with self.assertRaises(ValueError):
+            BloomFilter(capacity=1000, error_rate=1)
+
+
+class UsernameFilterTest(TestCase):
+    """
+    Test the per-worker username filter.
+    """
+
+    def setUp(self):
+        self.user = UserFactory(username="existing")
+        self.username_filter = UsernameFilter(capacity=100, error_rate=0.01)
+
+    def test_built_from_database(self):
+        """
+        Test that existing usernames are found and the filter is built once.
+        """
+        self.assertTrue(self.username_filter.might_exist("existing"))
+        with self.assertNumQueries(0):
+            self.assertFalse(self.username_filter.might_exist("missing"))
+
+    def test_replays_names_from_other_workers(self):
+        """
+        Test that names logged by another worker are added before answering.
+        """
+        self.username_filter.might_exist("existing")
+        log_username("from-another-worker")
+        with self.assertNumQueries(0):
+            self.assertTrue(self.username_filter.might_exist("from-another-worker"))
+
+    def test_rebuilds_when_log_is_lost(self):
+        """
+        Test that the filter is rebuilt from the database when logged names are missing.
+        """
+        self.username_filter.might_exist("existing")
+        log_username("first")
+        self.username_filter.might_exist("existing")
+        UserFactory(username="evicted")
+        cache.delete(GENERATION_KEY)
+        self.assertTrue(self.username_filter.might_exist("evicted"))
+
+    def test_generation_is_read_past_local_tier(self):
+        """
+        Test that a generation this process still has in its local cache tier does not hide new names.
+        """
+        self.username_filter.might_exist("existing")
+        cache.get(GENERATION_KEY)
+        generation = caches["shared"].incr(GENERATION_KEY)
+        caches["shared"].set(ENTRY_KEY.format(generation), "from-another-worker")
+        with self.assertNumQueries(0):
+            self.assertTrue(self.username_filter.might_exist("from-another-worker"))
+
+    def test_new_user_is_visible_in_process(self):
+        """
+        Test that a user created by this process is found before its transaction commits.
+        """
+        self.assertFalse(get_username_filter().might_exist("newcomer"))
+        UserFactory(username="newcomer")
+        self.assertTrue(get_username_filter().might_exist("newcomer"))
+
+    def test_stats_command(self):
+        """
+        Test that the stats command reports the size and error rates of the filter.
+        """
+        out = StringIO()
+        call_command("username_filter_stats", sample=100, stdout=out)
+        output = out.getvalue()
+        self.assertIn("Usernames:             1", output)
+        self.assertIn("Memory:", output)
+        self.assertIn("Measured error rate:", output)
@@ -0,0 +1,164 @@
+import os
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command, CommandError
+from django.test import TestCase, RequestFactory, override_settings
+
+from apps.users.geoip import MmapGeoResolver, get_geo_resolver, IPInfoGeoResolver
+from apps.users.middleware import TrackUserIPAndDeviceMiddleware
+from apps.users.models import UserIP
+from tests.factories.users import UserFactory
+
+GEOIP_CSV = """start_ip,end_ip,country,region,city
+10.0.0.0,10.0.0.255,US,California,San Francisco
+1.0.0.0,1.0.0.255,AU,Queensland,Brisbane
+203.0.113.0/24,JP,Tokyo,Tokyo
+2001:db8::,2001:db8::ffff,DE,Berlin,Berlin
+"""
+
+
+class GeoIPTestMixin:
+    """
+    Compile a small GeoIP database into a temporary directory.
+    """
+
+    def setUp(self):
+        """
+        Write the CSV and compile it.
+        :return:
+        """
+        super().setUp()
+        self.tmp_dir = (
+            tempfile.TemporaryDirectory()
+        )  # pylint: disable=consider-using-with
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.csv_path = os.path.join(self.tmp_dir.name, "ranges.csv")
+        self.database_path = os.path.join(self.tmp_dir.name, "geoip.bin")
+        with open(self.csv_path, "w", encoding="utf-8") as csv_file:
+            csv_file.write(GEOIP_CSV)
+        call_command(
+            "compile_geoip", self.csv_path, output=self.database_path, stdout=StringIO()
+        )
+
+
+class MmapGeoResolverTest(GeoIPTestMixin, TestCase):
+    """
+    Test the memory-mapped GeoIP resolver.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.resolver = MmapGeoResolver(self.database_path)
+
+    def test_lookup_ipv4(self):
+        """
+        Test lookups at the edges and inside IPv4 ranges.
+        """
+        expected = {"country": "US", "region": "California", "city": "San Francisco"}
+        self.assertEqual(self.resolver.lookup("10.0.0.0"), expected)
+        self.assertEqual(self.resolver.lookup("10.0.0.128"), expected)
+        self.assertEqual(self.resolver.lookup("10.0.0.255"), expected)
+        self.assertEqual(self.resolver.lookup("1.0.0.7")["city"], "Brisbane")
+
+    def test_lookup_cidr_row(self):
+        """
+        Test that rows given in CIDR notation cover the whole network.
+        """
+        self.assertEqual(self.resolver.lookup("203.0.113.200")["country"], "JP")
+
+    def test_lookup_ipv6(self):
+        """
+        Test lookups of IPv6 addresses.
+        """
+        self.assertEqual(self.resolver.lookup("2001:db8::1")["country"], "DE")
+        self.assertEqual(self.resolver.lookup("2001:db8::1:0"), {})
+
+    def test_lookup_ipv4_mapped_ipv6(self):
+        """
+        Test that IPv4-mapped IPv6 addresses are resolved against the IPv4 ranges.
+        """
+        self.assertEqual(self.resolver.lookup("::ffff:10.0.0.1")["country"], "US")
+
+    def test_lookup_misses(self):
+        """
+        Test addresses outside every range and invalid input.
+        """
+        self.assertEqual(self.resolver.lookup("0.0.0.1"), {})
+        self.assertEqual(self.resolver.lookup("10.0.1.0"), {})
+        self.assertEqual(self.resolver.lookup("255.255.255.255"), {})
+        self.assertEqual(self.resolver.lookup("not-an-ip"), {})
+
+
+class CompileGeoIPCommandTest(GeoIPTestMixin, TestCase):
+    """
+    Test the compile_geoip management command.
+    """
+
+    def test_reports_counts(self):
+        """
+        Test that the command reports how many ranges were compiled.
+        """
+        stdout = StringIO()
+        call_command(
+            "compile_geoip", self.csv_path, output=self.database_path, stdout=stdout
+        )
+        self.assertIn("Compiled 3 IPv4 and 1 IPv6 ranges", stdout.getvalue())
+
+    def test_overlapping_ranges(self):
+        """
+        Test that overlapping ranges are rejected.
+        """
+        with open(self.csv_path, "a", encoding="utf-8") as csv_file:
+            csv_file.write("10.0.0.200,10.0.1.10,US,Nevada,Reno\n")
+
+        with self.assertRaises(CommandError):
+            call_command(
+                "compile_geoip",
+                self.csv_path,
+                output=self.database_path,
+                stdout=StringIO(),
+            )
+
+
+class GeoResolverSettingTest(GeoIPTestMixin, TestCase):
+    """
+    Test resolver selection and its use by the tracking middleware.
+    """
+
+    def setUp(self):
+        super().setUp()
+        get_geo_resolver.cache_clear()
+        self.addCleanup(get_geo_resolver.cache_clear)
+
+    def test_default_resolver(self):
+        """
+        Test that the network resolver is used by default.
+        """
+        self.assertIsInstance(get_geo_resolver(), IPInfoGeoResolver)
+
+    @patch("apps.users.activity.resolve_ip_geolocation.delay")
+    @patch("apps.users.middleware.get_client_ip", return_value=("10.0.0.5", True))
+    def test_middleware_resolves_inline_with_local_resolver(
+        self, mock_get_client_ip, mock_delay
+    ):
+        """
+        Test that a local resolver fills the location inline without a task.
+        """
+        user = UserFactory()
+        request = RequestFactory().get("/")
+        request.user = user
+        middleware = TrackUserIPAndDeviceMiddleware(get_response=lambda request: None)
+
+        with override_settings(
+            GEOIP_RESOLVER="apps.users.geoip.MmapGeoResolver",
+            GEOIP_DATABASE_PATH=self.database_path,
+        ):
+            with self.captureOnCommitCallbacks(execute=True):
+                middleware(request)
+
+        user_ip = UserIP.objects.get(user=user, ip_address="10.0.0.5")
+        self.assertEqual(user_ip.country, "US")
+        self.assertEqual(user_ip.city, "San Francisco")
+        mock_delay.assert_not_called()
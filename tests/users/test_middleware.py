@@ -1,7 +1,7 @@
 from unittest.mock import patch
 from django.test import TestCase, RequestFactory
 
-from tests.factories.users import UserFactory
+from tests.factories.users import UserFactory, UserIPFactory
 from apps.users.middleware import TrackUserIPAndDeviceMiddleware
 from apps.users.models import UserIP, UserDevice
 
@@ -28,12 +28,13 @@ class TrackUserIPAndDeviceMiddlewareTest(TestCase):
     @patch(
         "apps.users.middleware.get_device_identifier", return_value="unique-device-id"
     )
-    @patch("apps.users.middleware.requests.get")
+    @patch("apps.users.utils.requests.get")
     def test_middleware_updates_userip_and_userdevice(
         self, mock_get, mock_get_device_identifier, mock_get_client_ip
     ):
         """
         Test that the middleware updates UserIP and UserDevice objects
+        and that the geolocation is backfilled after the request commits.
         :param mock_get:
         :param mock_get_device_identifier:
         :param mock_get_client_ip:
@@ -50,7 +51,8 @@ class TrackUserIPAndDeviceMiddlewareTest(TestCase):
         # Simulate a request
         request = self.factory.get("/")
         request.user = self.user
-        self.middleware(request)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.middleware(request)
 
         # Check that UserIP and UserDevice have been updated
         self.assertTrue(
@@ -68,20 +70,45 @@ class TrackUserIPAndDeviceMiddlewareTest(TestCase):
         self.assertEqual(user_ip.region, "RegionName")
         self.assertEqual(user_ip.city, "CityName")
 
-    @patch("apps.users.middleware.requests.get")
-    def test_get_geolocation_data_failure(self, mock_get):
+    @patch(
+        "apps.users.middleware.get_client_ip", return_value=("123.123.123.123", True)
+    )
+    @patch("apps.users.activity.resolve_ip_geolocation.delay")
+    @patch("apps.users.utils.requests.get")
+    def test_middleware_does_not_resolve_geolocation_inline(
+        self, mock_get, mock_delay, mock_get_client_ip
+    ):
         """
-        Test that get_geolocation_data returns an empty dict when the API call fails.
+        Test that the request path never calls the geolocation provider and
+        only enqueues the lookup once the transaction commits.
         """
-        # Configure the mock to simulate an API failure
-        mock_get.return_value.status_code = 404  # Simulate a failure response
+        request = self.factory.get("/")
+        request.user = self.user
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.middleware(request)
+
+        mock_get.assert_not_called()
+        mock_delay.assert_not_called()
+        self.assertEqual(len(callbacks), 1)
+
+        callbacks[0]()
+        mock_delay.assert_called_once_with("123.123.123.123")
 
-        # Call the method with a sample IP
-        ip = "123.123.123.123"
-        result = self.middleware.get_geolocation_data(ip)
+    @patch(
+        "apps.users.middleware.get_client_ip", return_value=("123.123.123.123", True)
+    )
+    @patch("apps.users.activity.resolve_ip_geolocation.delay")
+    def test_middleware_skips_geolocation_for_known_ip(
+        self, mock_delay, mock_get_client_ip
+    ):
+        """
+        Test that an IP the user has already been seen on is not enqueued again.
+        """
+        UserIPFactory(user=self.user, ip_address="123.123.123.123")
 
-        # Assert that the result is an empty dictionary
-        self.assertEqual(result, {})
+        request = self.factory.get("/")
+        request.user = self.user
+        with self.captureOnCommitCallbacks(execute=True):
+            self.middleware(request)
 
-        # Verify that the requests.get was called correctly
-        mock_get.assert_called_once_with(f"https://ipinfo.io/{ip}/json", timeout=120)
+        mock_delay.assert_not_called()
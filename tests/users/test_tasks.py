@@ -0,0 +1,70 @@
+from unittest.mock import patch
+
+from django.test import TestCase
+
+from apps.users.models import UserIP
+from apps.users.tasks import resolve_ip_geolocation
+from tests.factories.users import UserIPFactory
+
+
+class ResolveIPGeolocationTaskTest(TestCase):
+    """
+    Test the resolve_ip_geolocation task.
+    """
+
+    def setUp(self):
+        """
+        Create two users sharing an unresolved IP address.
+        :return:
+        """
+        self.ip_address = "123.123.123.123"
+        UserIPFactory.create_batch(
+            2, ip_address=self.ip_address, country=None, region=None, city=None
+        )
+
+    @patch("apps.users.geoip.get_geolocation_data")
+    def test_backfills_all_rows_for_ip(self, mock_geolocation):
+        """
+        Test that every unresolved row for the address is backfilled.
+        """
+        mock_geolocation.return_value = {
+            "country": "CountryName",
+            "region": "RegionName",
+            "city": "CityName",
+        }
+
+        self.assertTrue(resolve_ip_geolocation(self.ip_address))
+
+        mock_geolocation.assert_called_once_with(self.ip_address)
+        self.assertEqual(
+            UserIP.objects.filter(
+                ip_address=self.ip_address,
+                country="CountryName",
+                region="RegionName",
+                city="CityName",
+            ).count(),
+            2,
+        )
+
+    @patch("apps.users.geoip.get_geolocation_data")
+    def test_skips_resolved_ip(self, mock_geolocation):
+        """
+        Test that the provider is not called when the address is already resolved.
+        """
+        UserIP.objects.filter(ip_address=self.ip_address).update(country="US")
+
+        self.assertFalse(resolve_ip_geolocation(self.ip_address))
+        mock_geolocation.assert_not_called()
+
+    @patch("apps.users.geoip.get_geolocation_data", return_value={})
+    def test_failed_lookup_marks_rows_as_resolved(self, mock_geolocation):
+        """
+        Test that an empty lookup still marks the rows so they are not retried forever.
+        """
+        resolve_ip_geolocation(self.ip_address)
+
+        self.assertFalse(
+            UserIP.objects.filter(
+                ip_address=self.ip_address, country__isnull=True
+            ).exists()
+        )
@@ -8,6 +8,7 @@ from apps.users.utils import (
     mark_ip_as_suspicious,
     block_ip,
     get_device_identifier,
+    get_geolocation_data,
 )
 from apps.users.models import UserDevice, UserIP, User
 
@@ -83,3 +84,21 @@ class UtilsTest(TestCase):
         expected_identifier = hashlib.sha256("Mozilla/5.0en-US".encode()).hexdigest()
 
         self.assertEqual(device_identifier, expected_identifier)
+
+    @patch("apps.users.utils.requests.get")
+    def test_get_geolocation_data_failure(self, mock_get):
+        """
+        Test that get_geolocation_data returns an empty dict when the API call fails.
+        """
+        # Configure the mock to simulate an API failure
+        mock_get.return_value.status_code = 404  # Simulate a failure response
+
+        # Call the function with a sample IP
+        ip = "123.123.123.123"
+        result = get_geolocation_data(ip)
+
+        # Assert that the result is an empty dictionary
+        self.assertEqual(result, {})
+
+        # Verify that the requests.get was called correctly
+        mock_get.assert_called_once_with(f"https://ipinfo.io/{ip}/json", timeout=120)
@@ -191,3 +191,15 @@ class CheckUsernameViewTest(BaseTestCase):
         self.assertIn(
             b'<div class="text-red-500">That username is taken.</div>', response.content
         )
+
+    def test_check_username_available_skips_database(self):
+        """
+        Test that a name the username filter has never seen is reported as available without a query.
+        """
+        self.client.post(reverse("check_username"), {"username": "newuser"})
+        # Only the savepoint pair of ATOMIC_REQUESTS
+        with self.assertNumQueries(2):
+            response = self.client.post(
+                reverse("check_username"), {"username": "otheruser"}
+            )
+        self.assertIn(b"That username is available.", response.content)